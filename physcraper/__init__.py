@@ -9,35 +9,53 @@ import os
 import csv
 import subprocess
 import datetime
+import time
 import glob
+import itertools
 import json
 import configparser
 import pickle
 import random
 from copy import deepcopy
-from ete2 import NCBITaxa
-import physcraper.AWSWWW as AWSWWW
-from Bio.Blast import NCBIXML
-from Bio import Entrez
 from dendropy import Tree, DnaCharacterMatrix, DataSet, datamodel
-from peyotl.api.phylesystem_api import PhylesystemAPI, APIWrapper
-from peyotl.sugar import tree_of_life, taxomachine
-from peyotl.nexson_syntax import (
-    extract_tree,
-    get_subtree_otus,
-    extract_otu_nexson,
-    PhyloSchema,
-)
 
 # extension functions
+from . import lazy_import  # ete2, Biopython and peyotl are imported on first use
 from . import concat  # is the local concat class
 from . import ncbi_data_parser  # is the ncbi data parser class and associated functions
 from . import local_blast
+from . import blast_parser
+from . import records
+from . import seq_store
+from . import blast_scheduler
+from . import blast_pool
+from . import blast_jobs
+from . import containment
+from . import minhash
+from . import aln_matrix
+from . import aln_memmap
+from . import journal
+from . import checkpoint
+from . import aln_io
+
+NCBITaxa = lazy_import.attribute("ete2", "NCBITaxa")
+AWSWWW = lazy_import.module("physcraper.AWSWWW")
+Entrez = lazy_import.module("Bio.Entrez")
+PhylesystemAPI = lazy_import.attribute("peyotl.api.phylesystem_api", "PhylesystemAPI")
+APIWrapper = lazy_import.attribute("peyotl.api.phylesystem_api", "APIWrapper")
+tree_of_life = lazy_import.attribute("peyotl.sugar", "tree_of_life")
+taxomachine = lazy_import.attribute("peyotl.sugar", "taxomachine")
+extract_tree = lazy_import.attribute("peyotl.nexson_syntax", "extract_tree")
+get_subtree_otus = lazy_import.attribute("peyotl.nexson_syntax", "get_subtree_otus")
+extract_otu_nexson = lazy_import.attribute("peyotl.nexson_syntax", "extract_otu_nexson")
+PhyloSchema = lazy_import.attribute("peyotl.nexson_syntax", "PhyloSchema")
 
 if sys.version_info < (3,):
     from urllib2 import HTTPError
+    _STRING_TYPES = (str, unicode)
 else:
     from urllib.error import HTTPError
+    _STRING_TYPES = (str,)
 
 
 _DEBUG = 0
@@ -46,6 +64,9 @@ _deep_debug = 0
 
 _VERBOSE = 0
 
+# fields of an otu_dict entry that get_sp_id_of_otulabel() uses, the first one needs to be the ott name
+_SP_ID_FIELDS = ("^ot:ottTaxonName", "^user:TaxonName", "^ncbi:taxon", "^ot:ottId", "^ncbi:accession")
+
 
 def debug(msg):
     """short debugging command
@@ -70,6 +91,21 @@ def is_number(s):
         return False
 
 
+def taxon_id_as_int(taxon_id):
+    """Normalizes an ncbi taxon id, local blast results store staxids as string, e.g. '9606' or '9606;63221'.
+
+    :param taxon_id: ncbi taxon id as int or string, or None
+    :return: the (first) id as int, None if there is no numeric id
+    """
+    if type(taxon_id) is int:
+        return taxon_id
+    if isinstance(taxon_id, _STRING_TYPES):
+        first = taxon_id.split(";")[0].strip()
+        if first.isdigit():
+            return int(first)
+    return None
+
+
 # which python physcraper file do I use?
 debug("Current --init-- version number: 10-15-2018.0")
 debug(os.path.realpath(__file__))
@@ -108,11 +144,21 @@ class ConfigObj(object):
       * **self.e_value_thresh**: the defined threshold for the e-value during Blast searches, check out: https://blast.ncbi.nlm.nih.gov/Blast.cgi?CMD=Web&PAGE_TYPE=BlastDocs&DOC_TYPE=FAQ
       * **self.hitlist_size**: the maximum number of sequences retrieved by a single blast search
       * **self.seq_len_perc**: value from 0 to 1. Defines how much shorter new seq can be compared to input
+      * **self.near_identical**: optional, value from 0 to 1. New seqs with at least this identity to a kept seq
+        of the same taxon are not added, see minhash.py. None if not set.
+      * **self.num_processes**: optional, number of processes used by remove_identical_seqs() to compare the
+        new seqs to the alignment. None if not set, the comparisons are then made in this process.
+      * **self.aln_memmap**: True/False, default False. If True, the alignment is kept in a memory-mapped file
+        in the workdir instead of memory, see AlignTreeTax.use_memmap().
+      * **self.blast_max_queries**: optional, maximum number of blast searches per round, the remaining OTUs
+        are blasted in the next round, see run_blast_wrapper(). None if not set.
+      * **self.blast_max_seconds**: optional, no new blast search is started after that many seconds of a round.
+        None if not set.
       * **self.get_ncbi_taxonomy**: Path to sh file doing something...
       * **self.ncbi_dmp**: path to file that has gi numbers and the corresponding ncbi tax id's
       * **self.phylesystem_loc**: defines which phylesystem for OpenTree datastore is used. The default is api, but can run on local version too. 
       * **self.ott_ncbi**: file containing OTT id, ncbi and taxon name (??)
-      * **self.id_pickle**: path to pickle file
+      * **self.id_pickle**: path to pickle file, the IdDicts checkpoint is written to the same path without ".p"
       * **self.email**: email address used for blast queries
       * **self.blast_loc**: defines which blasting method to use:
 
@@ -123,6 +169,9 @@ class ConfigObj(object):
 
           * if blastloc == remote: it defines the url for the blast queries.
           * if blastloc == local: url_base = None
+          * the config file can list several endpoints, see blast_pool.py. url_base is then the first one.
+      * **self.blast_endpoints**: list of tuples (url, concurrency) of the web blast endpoints, queries are
+        distributed over them if there is more than one
       * **self.unmapped**: used for OToL original tips that can not be assigned to a taxon
 
           * keep: keep the unmapped taxa and asign them to life
@@ -156,6 +205,31 @@ class ConfigObj(object):
         assert 0 < self.seq_len_perc < 1, (
             "value `%s` is not between 0 and 1" % self.seq_len_perc
         )
+        self.near_identical = config["physcraper"].get("near_identical")
+        if self.near_identical is not None:
+            self.near_identical = float(self.near_identical)
+            assert 0 < self.near_identical <= 1, (
+                "value `%s` is not between 0 and 1" % self.near_identical
+            )
+        self.num_processes = config["physcraper"].get("num_processes")
+        if self.num_processes is not None:
+            self.num_processes = int(self.num_processes)
+            assert self.num_processes > 0, (
+                "value `%s` is not larger than 0" % self.num_processes
+            )
+        self.aln_memmap = config["physcraper"].get("aln_memmap", "False") in ["True", "true"]
+        self.blast_max_queries = config["blast"].get("blast_max_queries")
+        if self.blast_max_queries is not None:
+            self.blast_max_queries = int(self.blast_max_queries)
+            assert self.blast_max_queries > 0, (
+                "value `%s` is not larger than 0" % self.blast_max_queries
+            )
+        self.blast_max_seconds = config["blast"].get("blast_max_seconds")
+        if self.blast_max_seconds is not None:
+            self.blast_max_seconds = float(self.blast_max_seconds)
+            assert self.blast_max_seconds > 0, (
+                "value `%s` is not larger than 0" % self.blast_max_seconds
+            )
         self.phylesystem_loc = config["phylesystem"]["location"]
         assert self.phylesystem_loc in [
             "local",
@@ -181,8 +255,12 @@ class ConfigObj(object):
             self.url_base = None
             self.ncbi_parser_nodes_fn = config["ncbi_parser"]["nodes_fn"]
             self.ncbi_parser_names_fn = config["ncbi_parser"]["names_fn"]
+        self.blast_endpoints = []
         if self.blast_loc == "remote":
             self.url_base = config["blast"].get("url_base")
+            if self.url_base:
+                self.blast_endpoints = blast_pool.parse_endpoints(self.url_base)
+                self.url_base = self.blast_endpoints[0][0]
         self.gb_id_filename = config["blast"].get("gb_id_filename", False)
         if self.gb_id_filename is not False:
             if self.gb_id_filename == "True" or self.gb_id_filename == "true":
@@ -210,6 +288,14 @@ class ConfigObj(object):
             if self.blast_loc == "local":
                 sys.stdout.write("local blast db {}\n".format(self.blastdb))
 
+    def __setstate__(self, state):
+        """Unpickling: pickles of older physcraper versions lack the newer options, they get the defaults."""
+        self.__dict__.update(state)
+        for attr, default in [("near_identical", None), ("num_processes", None), ("aln_memmap", False),
+                              ("blast_endpoints", []), ("blast_max_queries", None), ("blast_max_seconds", None)]:
+            if attr not in state:
+                setattr(self, attr, default)
+
     def _download_localblastdb(self):
         """Check if files are present and if they are uptodate.
         If not files will be downloaded.
@@ -424,18 +510,10 @@ def generate_ATT_from_files(seqaln,
     :return: object of class ATT
     """
 
-    # replace ? in seqaln with - : papara handles them as different characters
-    with open(seqaln, "r") as fin:
-        filedata = fin.read()
-    filedata = filedata.replace("?", "-")
-    # Write the file out again
     if not os.path.exists(workdir):
         os.makedirs(workdir)
-    new_seq_file = "{}/replaced_inputaln.fasta".format(workdir)
-    with open("{}/replaced_inputaln.fasta".format(workdir), "w") as aln_file:
-        aln_file.write(filedata)
-    # use replaced aln as input
-    aln = DnaCharacterMatrix.get(path=new_seq_file, schema=mattype)
+    # replace ? in seqaln with - while reading: papara handles them as different characters
+    aln = aln_io.read_matrix(seqaln, mattype)
     assert aln.taxon_namespace
     for tax in aln.taxon_namespace:
         tax.label = tax.label.replace(" ", "_")  # Forcing all spaces to underscore UGH
@@ -596,6 +674,8 @@ class AlignTreeTax(object):
                          * this century = blasted and added.
                     * '^user:TaxonName': optional, user given label from OtuJsonDict
                     * "^ot:originalLabel" optional, user given tip label of phylogeny
+                    * '^physcraper:last_yield': optional, number of new sequences found by the last blast search,
+                      used to prioritize the blast searches
           * **self.ps_otu**: iterator for new otu IDs, is used as key for self.otu_dict
           * **self.workdir**: contains the path to the working directory, if folder does not exists it is generated.
           * **self.ott_mrca**: OToL taxon Id for the most recent common ancestor of the ingroup
@@ -611,18 +691,26 @@ class AlignTreeTax(object):
                     * 'pident': Blast  percentage of identical matches
                     * 'evalue': Blast e-value
                     * 'bitscore': Blast bitscore, used for FilterBlast
-                    * 'sseq': corresponding sequence
                     * 'title': title of Genbank sequence submission
+                * the sequences themselves are kept in PhyscraperScrape.new_seqs (see seq_store.py)
                 * key - values for web-query:
                     * 'accession':Genbank accession number
                     * 'length': length of sequence
+                    * '^ncbi:gi': GenBank sequence identifier
                     * 'title': string combination of hit_id and hit_def
-                    * 'hit_id': string combination of gi id and accession number
-                    * 'hsps': Bio.Blast.Record.HSP object
-                    * 'hit_def': title from GenBank sequence
+                    * 'evalue': Blast e-value of the best hsp
+                    * 'bitscore': Blast bitscore of the best hsp
                 * optional key - value pairs for unpublished option:
                     * 'localID': local sequence identifier
           * **self._reconciled**: True/False,
+          * **self._aln_matrix**: AlnMatrix with the column and row statistics of self.aln, kept up to date by
+            trim() and remove_taxa(), see aln_matrix(). Its rows are the otu_id: alignment row index.
+          * **self.aln_memmap**: None, or path of a file. If set, self.aln is a MemmapDnaMatrix, the sequences are
+            kept in this memory-mapped file instead of memory, for very large alignments. See use_memmap().
+          * **self._label_index**: list of [taxon_namespace, size, dictionary label: Taxon] for the namespaces
+            of self.aln and self.tre, see taxa_by_label()
+          * **self._otu_journal**: OtuJournal, append-only journal of the changes of self.otu_dict in workdir/otu_journal,
+            written by the checkpoints, see otu_journal() and journal.py
           * **self.unpubl_otu_json**: optional, will contain the OTU-dict for unpublished data, if that option is used
 
         Following functions are called during the init-process:
@@ -652,7 +740,7 @@ class AlignTreeTax(object):
         assert (self.tre.taxon_namespace is self.aln.taxon_namespace)
         assert isinstance(self.aln, datamodel.charmatrixmodel.DnaCharacterMatrix)
         assert isinstance(otu_dict, dict)
-        self.otu_dict = otu_dict
+        self.otu_dict = records.compact_otu_dict(otu_dict)
         self.ps_otu = 1  # iterator for new otu IDs
         self._reconcile_names()
         self.workdir = os.path.abspath(workdir)
@@ -664,6 +752,20 @@ class AlignTreeTax(object):
         self.gb_dict = {}  # has all info about new blast seq
         self._reconciled = False
         self.unpubl_otu_json = None
+        self._aln_matrix = None  # AlnMatrix of self.aln, see aln_matrix()
+        self.aln_memmap = None  # optional path, to keep the sequences on disk, see use_memmap()
+        self._label_index = []  # [namespace, size, {label: Taxon}], see taxa_by_label()
+        self._otu_journal = None  # see otu_journal()
+
+    def __setstate__(self, state):
+        """Unpickling: objects pickled by older physcraper versions get the attributes that were added since."""
+        self.__dict__.update(state)
+        for attr, default in [("_aln_matrix", None), ("aln_memmap", None), ("_otu_journal", None)]:
+            if attr not in state:
+                setattr(self, attr, default)
+        if "_label_index" not in state:
+            self._label_index = []
+        records.compact_otu_dict(self.otu_dict)
 
     def _reconcile_names(self):
         """Taxa that are only found in the tree, or only in the alignment are deleted.
@@ -699,34 +801,113 @@ class AlignTreeTax(object):
         # debug(del_tre)
         self.aln.remove_sequences(del_aln)  
         self.tre.prune_taxa(del_tre)     
+        # original label: otu_ids, in the order of the otu_dict
+        by_original = {}
+        for pos, otu in enumerate(self.otu_dict):
+            by_original.setdefault(self.otu_dict[otu].get(u'^ot:originalLabel'), []).append((pos, otu))
         for tax in prune:
-            # potentially slow at large number of taxa and large numbers to be pruned
-            found = 0
-            for otu in self.otu_dict:
-                if self.otu_dict[otu][u'^ot:originalLabel'] == tax.label:
-                    self.otu_dict[otu]['^physcraper:status'] = "deleted in name reconciliation"
-                    found = 1
-            if found == 0:
+            matches = by_original.get(tax.label, [])
+            for pos, otu in matches:
+                self.otu_dict[otu]['^physcraper:status'] = "deleted in name reconciliation"
+            if not matches:
                 sys.stderr.write("lost taxon {} in name reconcilliation \n".format(tax.label))
             self.aln.taxon_namespace.remove_taxon(tax)
         assert self.aln.taxon_namespace == self.tre.taxon_namespace
         for tax in self.aln.taxon_namespace:
-            if tax.label in self.otu_dict.keys():
+            if tax.label in self.otu_dict:
                 pass
             else:
-                found_label = 0
                 match = re.match("'n[0-9]{1,3}", tax.label)
                 newname = ""
                 if match:
                     newname = tax.label[2:]
                     newname = newname[:-1]
-                for otu in self.otu_dict:
+                matches = sorted(by_original.get(tax.label, []) + by_original.get(newname, []))
+                for pos, otu in matches:  # same order and comparisons as a loop over the otu_dict
                     original = self.otu_dict[otu].get("^ot:originalLabel")
                     if original == tax.label or original == newname:
                         tax.label = otu
-                        found_label = 1
-                if found_label == 0:
+                if not matches:
                     sys.stderr.write("could not match tiplabel {} or {} to an OTU\n".format(tax.label, newname))
+        self.invalidate_label_index()
+
+    def invalidate_label_index(self):
+        """Drops the label index of taxa_by_label(), needs to be called after taxa were relabelled."""
+        self._label_index = []
+
+    def taxa_by_label(self, namespace=None):
+        """Index of a taxon namespace, dendropy looks up labels with a linear scan.
+
+        The index is built again if the namespace was replaced or changed its size outside of remove_taxa().
+        Relabelling a taxon does not change the size, code that sets Taxon.label calls invalidate_label_index().
+
+        :param namespace: TaxonNamespace, default is the one of self.aln
+        :return: dictionary, key: taxon label, value: Taxon
+        """
+        if namespace is None:
+            namespace = self.aln.taxon_namespace
+        entries = getattr(self, "_label_index", None)
+        if entries is None:
+            entries = self._label_index = []
+        for entry in entries:
+            if entry[0] is namespace:
+                if entry[1] == len(namespace):
+                    return entry[2]
+                entries.remove(entry)
+                break
+        entry = [namespace, len(namespace), dict((tax.label, tax) for tax in namespace)]
+        # only the namespaces of aln and tre are kept
+        entries[:] = [item for item in entries
+                      if item[0] is self.aln.taxon_namespace or item[0] is self.tre.taxon_namespace]
+        entries.append(entry)
+        return entry[2]
+
+    def get_taxon(self, label, namespace=None):
+        """Taxon with the given label.
+
+        :param label: taxon label (otu_id)
+        :param namespace: TaxonNamespace, default is the one of self.aln
+        :return: Taxon, None if the label is not in the namespace
+        """
+        tax = self.taxa_by_label(namespace).get(label)
+        if tax is not None and tax.label != label:  # was relabelled since the index was built
+            self.invalidate_label_index()
+            tax = self.taxa_by_label(namespace).get(label)
+        return tax
+
+    def has_taxon(self, label):
+        """True if the label is in the taxon namespace of self.aln or of self.tre"""
+        return self.get_taxon(label) is not None or self.get_taxon(label, self.tre.taxon_namespace) is not None
+
+    def use_memmap(self, path):
+        """Moves the sequences of self.aln into a memory-mapped file, for very large alignments.
+
+        self.aln is then a aln_memmap.MemmapDnaMatrix with the same taxa, it reads the sequences from the file.
+        The alignments after papara are written to the same file (see PhyscraperScrape.align_query_seqs()).
+
+        :param path: path of the matrix file
+        """
+        self.aln_memmap = os.path.abspath(path)
+        if not isinstance(self.aln, aln_memmap.MemmapDnaMatrix):
+            self.aln = aln_memmap.MemmapDnaMatrix.from_aln(self.aln_memmap, self.aln)
+            self._aln_matrix = None
+
+    def aln_matrix(self):
+        """Returns the AlnMatrix of self.aln, it is only built again if self.aln was replaced.
+
+        The statistics are updated in remove_taxa() and trim(), a new alignment (e.g. after papara)
+        is a new object and gets a new matrix.
+
+        :return: AlnMatrix, or the MemmapAlignment of self.aln if it is a MemmapDnaMatrix
+        """
+        if isinstance(self.aln, aln_memmap.MemmapDnaMatrix):
+            return self.aln.alignment
+        matrix = getattr(self, "_aln_matrix", None)
+        if matrix is None or matrix.source is not self.aln or matrix.num_rows() != len(self.aln):
+            matrix = aln_matrix.AlnMatrix.from_aln(self.aln)
+            matrix.source = self.aln
+            self._aln_matrix = matrix
+        return matrix
 
     def prune_short(self, min_seqlen_perc=0.75):
         """Prunes sequences from alignment if they are shorter than 75%, or if tip is only present in tre.
@@ -739,19 +920,19 @@ class AlignTreeTax(object):
         :param min_seqlen_perc: minimum length of seq
         :return: prunes aln and tre
         """
+        matrix = self.aln_matrix()
         if sum(self.orig_seqlen) != 0:
             avg_seqlen = sum(self.orig_seqlen) / len(self.orig_seqlen)
             seq_len_cutoff = avg_seqlen * min_seqlen_perc
         else:
-            for tax, seq in self.aln.items():
-                seqlen = len(self.aln[tax].symbols_as_string())
-                break
+            seqlen = matrix.seq_lengths[0]
             seq_len_cutoff = seqlen * min_seqlen_perc
         prune = []
         aln_ids = set()
-        for tax, seq in self.aln.items():
+        row_lengths = matrix.row_lengths()
+        for tax in self.aln:
             aln_ids.add(tax.label)
-            if len(seq.symbols_as_string().translate(None, "-?")) <= seq_len_cutoff:
+            if row_lengths[tax.label] <= seq_len_cutoff:
                 prune.append(tax)
         treed_taxa = set()
         for leaf in self.tre.leaf_nodes():
@@ -761,15 +942,14 @@ class AlignTreeTax(object):
             fi.write("Taxa pruned from tree and alignment in prune short "
                      "step due to sequence shorter than {}\n".format(seq_len_cutoff))
             for tax in prune:
-                self.remove_taxa_aln_tre(tax.label)
                 fi.write("{}, {}\n".format(tax.label, self.otu_dict[tax.label].get('^ot:originalLabel')))
             fi.close()
-        for tax in prune:
-            self.otu_dict[tax.label]["^physcraper:status"] = "deleted in prune short"
+            self.remove_taxa([tax.label for tax in prune], status="deleted in prune short")
         # out-comented next line, as this does not run if we prune aln before placing new seq in tre
         # assert self.aln.taxon_namespace == self.tre.taxon_namespace
         assert treed_taxa.issubset(aln_ids)
-        self.orig_seqlen = [len(self.aln[tax].symbols_as_string().replace("-", "").replace("N", "")) for tax in self.aln]
+        orig_seqlen = matrix.row_lengths(ignore=("-", "N"))
+        self.orig_seqlen = [orig_seqlen[tax.label] for tax in self.aln]
         self.trim()
         self._reconciled = 1
 
@@ -784,40 +964,18 @@ class AlignTreeTax(object):
         :param taxon_missingness: defines how many sequences need to have a base at the start/end of an alignment
         """
         # debug('in trim')
-        i = 0
-        seqlen = len(self.aln[i])
-        while seqlen == 0:
-            i = i + 1
-            seqlen = len(self.aln[i])
-        for tax in self.aln:
-            if len(self.aln[tax]) != seqlen:
-                sys.stderr.write("can't trim un-aligned inputs, moving on")
-                return
-        start = 0
-        stop = seqlen
-        cutoff = len(self.aln) * taxon_missingness
-        for i in range(seqlen):
-            counts = {"?": 0, "-": 0}
-            for tax in self.aln:
-                call = self.aln[tax][i].label
-                if call in ["?", "-"]:
-                    counts[call] += 1
-            if counts["?"] + counts["-"] <= cutoff:
-                start = i
-                break
-        for i in range(seqlen, 0, -1):
-            counts = {"?": 0, "-": 0}
-            for tax in self.aln:
-                call = self.aln[tax][i - 1].label
-                if call in ["?", "-"]:
-                    counts[call] += 1
-            if counts["?"] + counts["-"] <= cutoff:
-                stop = i
-                break
+        matrix = self.aln_matrix()
+        if not matrix.aligned:
+            sys.stderr.write("can't trim un-aligned inputs, moving on")
+            return
+        start, stop = matrix.trim_bounds(taxon_missingness)
         aln_ids = set()
+        in_file = isinstance(self.aln, aln_memmap.MemmapDnaMatrix)  # the rows are cut in the file by slice()
         for taxon in self.aln:
-            self.aln[taxon] = self.aln[taxon][start:stop]
+            if not in_file:
+                self.aln[taxon] = self.aln[taxon][start:stop]
             aln_ids.add(taxon.label)
+        matrix.slice(start, stop)
         assert aln_ids.issubset(self.otu_dict.keys())
         treed_taxa = set()
         for leaf in self.tre.leaf_nodes():
@@ -893,7 +1051,7 @@ class AlignTreeTax(object):
             ott_name = ids_obj.ott_to_name.get(ott_id)
         else:
             ott_name = tax_name
-        self.otu_dict[otu_id] = {}
+        self.otu_dict[otu_id] = records.OtuRecord()
         self.otu_dict[otu_id]["^ncbi:title"] = self.gb_dict[gb_id]["title"]
         self.otu_dict[otu_id]["^ncbi:taxon"] = ncbi_id
         self.otu_dict[otu_id]["^ot:ottId"] = ott_id
@@ -941,9 +1099,8 @@ class AlignTreeTax(object):
 
     def write_labelled(self, label, treepath=None, alnpath=None, norepeats=True, add_gb_id=False):
         """output tree and alignment with human readable labels
-        Jumps through a bunch of hoops to make labels unique.
-
-        NOT MEMORY EFFICIENT AT ALL
+        Labels are made unique in one pass. The taxa are relabelled in place while the tree and alignment
+        are written and get their original labels back afterwards, nothing is copied.
 
         Has different options available for different desired outputs
 
@@ -961,44 +1118,75 @@ class AlignTreeTax(object):
         if alnpath is None:
             alnpath = "{}/{}".format(self.workdir, 'labelled.aln')
         assert label in ['^ot:ottTaxonName', '^user:TaxonName', "^ot:originalLabel", "^ot:ottId", "^ncbi:taxon"]
-        tmp_newick = self.tre.as_string(schema="newick")
-        tmp_tre = Tree.get(data=tmp_newick,
-                           schema="newick",
-                           preserve_underscores=True)
-        tmp_fasta = self.aln.as_string(schema="fasta")
-        tmp_aln = DnaCharacterMatrix.get(data=tmp_fasta,
-                                         schema="fasta",
-                                         taxon_namespace=tmp_tre.taxon_namespace)
+        # labels are computed for the tips of the tree first, then for the sequences that are not in the tree
+        old_labels = []
+        seen = set()
+        taxa = {}  # id: taxon, every taxon object that is written out
+        for leaf in self.tre.leaf_node_iter():
+            if leaf.taxon is not None:
+                taxa[id(leaf.taxon)] = leaf.taxon
+                if leaf.taxon.label not in seen:
+                    seen.add(leaf.taxon.label)
+                    old_labels.append(leaf.taxon.label)
+        for taxon in self.aln:
+            taxa[id(taxon)] = taxon
+            if taxon.label not in seen:
+                seen.add(taxon.label)
+                old_labels.append(taxon.label)
+        new_labels = {}  # old label: new label
         new_names = set()
-        for taxon in tmp_tre.taxon_namespace:
-            new_label = self.otu_dict[taxon.label].get(label, None)
+        counter = {}  # label: number of times it was used, for the add_gb_id suffixes
+        for old_label in old_labels:
+            new_label = self.otu_dict[old_label].get(label, None)
             if new_label is None:
-                if self.otu_dict[taxon.label].get("^ot:originalLabel"):
-                    new_label = "orig_{}".format(self.otu_dict[taxon.label]["^ot:originalLabel"])
+                if self.otu_dict[old_label].get("^ot:originalLabel"):
+                    new_label = "orig_{}".format(self.otu_dict[old_label]["^ot:originalLabel"])
                 else:
-                    new_label = "ncbi_{}_ottname_{}".format(self.otu_dict[taxon.label].get("^ncbi:taxon", "unk"),
-                                                            self.otu_dict[taxon.label].get('^ot:ottTaxonName', "unk"))
+                    new_label = "ncbi_{}_ottname_{}".format(self.otu_dict[old_label].get("^ncbi:taxon", "unk"),
+                                                            self.otu_dict[old_label].get('^ot:ottTaxonName', "unk"))
             new_label = str(new_label).replace(' ', '_')
             if add_gb_id:
-                gb_id = self.otu_dict[taxon.label].get('^ncbi:accession')
+                gb_id = self.otu_dict[old_label].get('^ncbi:accession')
                 if gb_id is None:
-                    gb_id = self.otu_dict[taxon.label].get("^ot:originalLabel")
+                    gb_id = self.otu_dict[old_label].get("^ot:originalLabel")
                 new_label = "_".join([new_label, str(gb_id)])
-                sp_counter = 2
                 if new_label in new_names and norepeats:
-                    new_label = "_".join([new_label, str(sp_counter)])
-                    sp_counter += 1
+                    base_label = new_label
+                    while new_label in new_names:
+                        counter[base_label] = counter.get(base_label, 1) + 1
+                        new_label = "_".join([base_label, str(counter[base_label])])
             else:
                 if new_label in new_names and norepeats:
-                    new_label = "_".join([new_label, taxon.label])
-            taxon.label = new_label
+                    new_label = "_".join([new_label, old_label])
+            new_labels[old_label] = new_label
             new_names.add(new_label)
-        tmp_tre.write(path=treepath,
-                      schema="newick",
-                      unquoted_underscores=True,
-                      suppress_edge_lengths=False)
-        tmp_aln.write(path=alnpath,
-                      schema="fasta")
+        # relabel in place for writing, the original labels are restored afterwards
+        relabelled = []
+        try:
+            for taxon in taxa.values():
+                relabelled.append((taxon, taxon.label))
+                taxon.label = new_labels[taxon.label]
+            self.tre.write(path=treepath,
+                           schema="newick",
+                           unquoted_underscores=True,
+                           suppress_edge_lengths=False)
+            self.aln.write(path=alnpath,
+                           schema="fasta")
+        finally:
+            for taxon, old_label in relabelled:
+                taxon.label = old_label
+            self.invalidate_label_index()
+
+    def otu_journal(self):
+        """Returns the OtuJournal of self.otu_dict, it is created in workdir/otu_journal when first needed.
+
+        :return: OtuJournal
+        """
+        otu_journal = getattr(self, "_otu_journal", None)
+        if otu_journal is None:
+            otu_journal = journal.OtuJournal("{}/otu_journal".format(self.workdir))
+            self._otu_journal = otu_journal
+        return otu_journal
 
     def write_otus(self, filename, schema="table"):
         """Writes out OTU dict as json.
@@ -1009,7 +1197,7 @@ class AlignTreeTax(object):
         """
         assert schema in ["table", "json"]
         with open("{}/{}".format(self.workdir, filename), "w") as outfile:
-            json.dump(self.otu_dict, outfile)
+            json.dump(self.otu_dict, outfile, default=records.to_dict)
 
     def remove_taxa_aln_tre(self, taxon_label):
         """Removes taxa from aln and tre and updates otu_dict,
@@ -1020,18 +1208,56 @@ class AlignTreeTax(object):
         :param taxon_label: taxon_label from dendropy object - aln or phy
         :return: removes information/data from taxon_label
         """
-        tax = self.aln.taxon_namespace.get_taxon(taxon_label)
-        tax2 = self.tre.taxon_namespace.get_taxon(taxon_label)
-        if tax:
-            self.aln.remove_sequences([tax])
-            self.aln.taxon_namespace.remove_taxon_label(taxon_label)  # raises an error if label not found
-            # the first prune does not remove it sometimes...
-            self.tre.prune_taxa([tax2])
-            self.tre.prune_taxa_with_labels([taxon_label])
-            self.tre.prune_taxa_with_labels([tax2])
-            self.otu_dict[tax.label]['^physcraper:status'] = "deleted"
-        else:
-            self.otu_dict[taxon_label]['^physcraper:status'] = "deleted, updated otu_dict but was never in tre or aln!"
+        self.remove_taxa([taxon_label])
+
+    def remove_taxa(self, taxon_labels, status="deleted"):
+        """Removes several taxa from aln and tre at once and updates otu_dict.
+
+        The sequences are removed in one call, the tree is pruned in one traversal.
+
+        note: has test, test_remove_taxa_aln_tre.py
+
+        :param taxon_labels: list of taxon labels (otu_ids)
+        :param status: new '^physcraper:status' of the removed taxa, None keeps the current status of all taxa
+        :return: removes information/data from taxon_labels
+        """
+        by_label = self.taxa_by_label()
+        labels = []
+        taxa = []
+        seen = set()
+        for taxon_label in taxon_labels:
+            if taxon_label in seen:
+                continue
+            seen.add(taxon_label)
+            tax = by_label.get(taxon_label)
+            if tax is not None:
+                labels.append(taxon_label)
+                taxa.append(tax)
+            elif status is not None:
+                self.otu_dict[taxon_label]['^physcraper:status'] = "deleted, updated otu_dict but was never in " \
+                                                                  "tre or aln!"
+        if not taxa:
+            return
+        matrix = getattr(self, "_aln_matrix", None)
+        # a MemmapDnaMatrix removes the rows from its file itself
+        if matrix is not None and matrix.source is self.aln and not isinstance(self.aln, aln_memmap.MemmapDnaMatrix):
+            for taxon_label in labels:
+                if taxon_label in matrix.rows:
+                    matrix.remove(taxon_label)
+        self.aln.remove_sequences(taxa)
+        # the first prune does not remove it sometimes...
+        self.tre.prune_taxa(taxa)
+        self.tre.prune_taxa_with_labels(labels)
+        for tax in taxa:
+            self.aln.taxon_namespace.remove_taxon(tax)
+        for entry in self._label_index:
+            if entry[0] is self.aln.taxon_namespace:
+                for taxon_label in labels:
+                    entry[2].pop(taxon_label, None)
+                entry[1] = len(entry[0])
+        if status is not None:
+            for taxon_label in labels:
+                self.otu_dict[taxon_label]['^physcraper:status'] = status
 
     def dump(self, filename=None):
         """writes pickled files from att class"""
@@ -1043,6 +1269,16 @@ class AlignTreeTax(object):
             ofi = open("{}/att_checkpoint.p".format(self.workdir), "wb")
         pickle.dump(self, ofi)
 
+    def checkpoint(self, path=None):
+        """Writes the att class as checkpoint directory, see checkpoint.py.
+
+        :param path: optional, checkpoint directory, default is workdir/att_checkpoint
+        :return: writes the checkpoint, load it with checkpoint.Checkpoint(path).data
+        """
+        if path is None:
+            path = "{}/att_checkpoint".format(self.workdir)
+        checkpoint.save(path, self)
+
 
 #####################################
 def get_nexson(study_id, phylesystem_loc):
@@ -1173,16 +1409,7 @@ class IdDicts(object):
         self.mrca_ott = mrca  # mrca_list
         assert type(self.mrca_ott) in [int, list] or self.mrca_ott is None
         self.mrca_ncbi = set()  # corresponding ids for mrca_ott list
-        fi = open(config_obj.ott_ncbi)
-        for lin in fi:
-            lii = lin.split(",")
-            self.ott_to_ncbi[int(lii[0])] = int(lii[1])
-            self.ncbi_to_ott[int(lii[1])] = int(lii[0])
-            self.ott_to_name[int(lii[0])] = lii[2].strip()
-            assert len(self.ott_to_ncbi) > 0
-            assert len(self.ncbi_to_ott) > 0
-            assert len(self.ott_to_name) > 0
-        fi.close()
+        self.read_ott_ncbi()
         if os.path.isfile("{}/id_map.txt".format(workdir)):  # todo config?!
             fi = open("{}/id_map.txt".format(workdir))
             for lin in fi:
@@ -1195,6 +1422,25 @@ class IdDicts(object):
         if self.mrca_ott is not None:
             self.get_ncbi_mrca()
 
+    def read_ott_ncbi(self):
+        """Fills ott_to_ncbi, ncbi_to_ott and ott_to_name from the taxonomy file config.ott_ncbi.
+
+        Is also used when the IdDicts are loaded from a checkpoint, which does not contain these dictionaries.
+        """
+        self.ott_to_ncbi = {}
+        self.ncbi_to_ott = {}
+        self.ott_to_name = {}
+        fi = open(self.config.ott_ncbi)
+        for lin in fi:
+            lii = lin.split(",")
+            self.ott_to_ncbi[int(lii[0])] = int(lii[1])
+            self.ncbi_to_ott[int(lii[1])] = int(lii[0])
+            self.ott_to_name[int(lii[0])] = lii[2].strip()
+            assert len(self.ott_to_ncbi) > 0
+            assert len(self.ncbi_to_ott) > 0
+            assert len(self.ott_to_name) > 0
+        fi.close()
+
     def get_ncbi_mrca(self):
         """ get the ncbi tax ids from a list of mrca.
         """
@@ -1428,6 +1674,16 @@ class IdDicts(object):
             ofi = open("{}/id_pickle.p".format(self.workdir, filename), "wb")
         pickle.dump(self, ofi)
 
+    def checkpoint(self, path=None):
+        """Writes the IdDicts as checkpoint directory, see checkpoint.py.
+
+        :param path: optional, checkpoint directory, default is the id_pickle of the config without ".p"
+        :return: writes the checkpoint, load it with checkpoint.Checkpoint(path).ids
+        """
+        if path is None:
+            path = checkpoint.checkpoint_path(self.config.id_pickle)
+        checkpoint.save(path, None, ids=self)
+
 
 class PhyscraperScrape(object):
     """
@@ -1445,33 +1701,49 @@ class PhyscraperScrape(object):
           * **self.data**: ATT object
           * **self.ids**: IdDict object
           * **self.config**: Config object
-          * **self.new_seqs**: dictionary that contains the newly found seq using blast:
+          * **self.new_seqs**: SeqStore (dictionary-like, see seq_store.py) that contains the newly found seq using blast:
             
             * key: gi id
             * value: corresponding seq
-          * **self.new_seqs_otu_id**: dictionary that contains the new sequences that passed the remove_identical_seq() step:
+          * **self.new_seqs_otu_id**: SeqStore that contains the new sequences that passed the remove_identical_seq() step:
             
             * key: otu_id
             * value: see otu_dict, is a subset of the otu_dict, all sequences that will be newly added to aln and tre
+          * **self.seq_file**: SeqFile, the append-only fasta file (workdir/seq_store.fasta) that holds the sequences
+            of the SeqStores. Only the position of the sequences in the file are kept in memory.
           * **self.otu_by_gi**: dictionary that contains ????:
             
             * key:
             * value:
-          * **self._to_be_pruned**: list that contains ????
+          * **self._to_be_pruned**: list of otu_ids that seq_dict_build() removes from aln and tre, they are removed
+            together at the end of remove_identical_seqs(), see prune_later()
+          * **self._ingroup_cache**: dictionary, key: ncbi taxon id, value: True/False if it belongs to the ingroup mrca.
+          * **self._ingroup_rejected**: set of accessions of blast hits that were rejected as not part of the ingroup,
+            they are listed in workdir/blast_ingroup_rejected.csv
+          * **self.seq_digests**: DigestMap, md5 digests and species of the gap-free sequences that are kept in the
+            alignment. Used by seq_dict_build() to reject exact duplicates without the containment search.
+          * **self._sp_id_cache**: dictionary, key: otu_id, value: tuple of the taxonomy fields of the otu_dict entry
+            and the ncbi id resolved from them, see get_sp_id_of_otulabel()
           * **self.mrca_ncbi**: ncbi identifier of mrca
 
           * **self.tmpfi**: path to a file or folder???
           * **self.blast_subdir**: path to folder that contains the files writen during blast
+          * **self.blast_jobs**: BlastJobs, table of all blast searches with state, attempts, timings and checksum
+            of the result file (workdir/blast_jobs.db), used to resume a killed run (see blast_jobs.py)
+          * **self._blast_postponed**: number of OTUs whose blast search the budget of the last run_blast_wrapper()
+            postponed to the next round. While there are any, generate_streamed_alignment() keeps self.repeat = 1.
 
           * **self.newseqs_file**: filename of files that contains the sequences from self.new_seqs_otu_id
           * **self.date**: Date of the run - may lag behind real date!
-          * **self.repeat**: either 1 or 0, it is used to determine if we continue updating the tree, no new seqs found = 0
+          * **self.repeat**: either 1 or 0, it is used to determine if we continue updating the tree, no new seqs found
+            and no postponed blast searches = 0
           * **self.newseqs_acc**: list of all gi_ids that were passed into remove_identical_seq(). Used to speed up adding process
           * **self.blacklist**: list of gi_id of sequences that shall not be added or need to be removed. Supplied by user.
           * **self.acc_list_mrca**: list of all gi_ids available on GenBank for a given mrca. Used to limit possible seq to add.
           * **self.seq_filter**: list of words that may occur in otu_dict.status and which shall not be used in the building of FilterBlast.sp_d (that's the main function), but it is also used as assert statement to make sure unwanted seqs are not added.
           * **self.unpublished**: True/False. Used to look for local unpublished seq that shall be added if True.
           * **self.path_to_local_seq:** Usually False, contains path to unpublished sequences if option is used.
+          * **self.unpubl_blast_fn:** name of the tabular blast output for unpublished sequences, in workdir/blast.
 
         Following functions are called during the init-process:
 
@@ -1496,15 +1768,24 @@ class PhyscraperScrape(object):
         self.data = data_obj
         self.ids = ids_obj
         self.config = self.ids.config
-        self.new_seqs = {}  # all new seq after read_blast_wrapper
-        self.new_seqs_otu_id = {}  # only new seq which passed remove_identical
         self.otu_by_gi = {}
         self._to_be_pruned = []
+        self._ingroup_cache = {}  # ncbi taxon id: True/False, filled by is_ingroup()
+        self._ingroup_rejected = set()  # accessions written to the rejection log
+        self.seq_digests = containment.DigestMap()  # digests of the kept sequences, see seq_dict_build()
+        self._sp_id_cache = {}  # otu_id: (taxonomy fields, ncbi id), filled by get_sp_id_of_otulabel()
         self.mrca_ncbi = ids_obj.ott_to_ncbi[data_obj.ott_mrca]
         self.tmpfi = "{}/physcraper_run_in_progress".format(self.workdir)
         self.blast_subdir = "{}/current_blast_run".format(self.workdir)
         if not os.path.exists(self.workdir):
             os.makedirs(self.workdir)
+        self.seq_file = seq_store.SeqFile("{}/seq_store.fasta".format(self.workdir))
+        self.blast_jobs = blast_jobs.BlastJobs("{}/blast_jobs.db".format(self.workdir))
+        self._blast_postponed = 0  # set by run_blast_wrapper()
+        if self.config.aln_memmap:
+            self.data.use_memmap("{}/aln_memmap.bin".format(self.workdir))
+        self.new_seqs = seq_store.SeqStore(self.seq_file)  # all new seq after read_blast_wrapper
+        self.new_seqs_otu_id = seq_store.SeqStore(self.seq_file)  # only new seq which passed remove_identical
         self.newseqs_file = "tmp.fasta"
         self.date = str(datetime.date.today())  # Date of the run - may lag behind real date!
         self.repeat = 1  # used to determine if we continue updating the tree
@@ -1514,6 +1795,7 @@ class PhyscraperScrape(object):
         self.reset_markers()
         self.unpublished = False  # used to look for local unpublished seq that shall be added.
         self.path_to_local_seq = False  # path to unpublished seq.
+        self.unpubl_blast_fn = "unpublished_blast.txt"  # results of local_blast_for_unpublished(), in workdir/blast
         self.backbone = False
         self.OToL_unmapped_tips()  # added to do stuff with un-mapped tips from OToL
         self.ids.ingroup_mrca = data_obj.ott_mrca  # added for mrca ingroup list
@@ -1521,6 +1803,37 @@ class PhyscraperScrape(object):
         if _deep_debug == 1:
             self.newadd_gi_otu = {}  # search for doubles!
 
+    def __setstate__(self, state):
+        """Unpickling: objects pickled by older physcraper versions get the attributes that were added since.
+
+        Their new_seqs, new_seqs_otu_id and filtered_seq are plain dicts, they are moved to self.seq_file.
+        """
+        self.__dict__.update(state)
+        if "_to_be_pruned" not in state:
+            self._to_be_pruned = []
+        if "_ingroup_cache" not in state:
+            self._ingroup_cache = {}
+        if "_ingroup_rejected" not in state:
+            self._ingroup_rejected = set()
+        if "_sp_id_cache" not in state:
+            self._sp_id_cache = {}
+        if "seq_digests" not in state:
+            self.seq_digests = containment.DigestMap()
+        if "unpubl_blast_fn" not in state:
+            self.unpubl_blast_fn = "unpublished_blast.txt"
+        if "_blast_postponed" not in state:
+            self._blast_postponed = 0
+        if "seq_file" not in state or "blast_jobs" not in state:
+            if not os.path.exists(self.workdir):
+                os.makedirs(self.workdir)
+        if "seq_file" not in state:
+            self.seq_file = seq_store.SeqFile("{}/seq_store.fasta".format(self.workdir))
+        if "blast_jobs" not in state:
+            self.blast_jobs = blast_jobs.BlastJobs("{}/blast_jobs.db".format(self.workdir))
+        for attr in ["new_seqs", "new_seqs_otu_id", "filtered_seq"]:
+            if isinstance(state.get(attr), dict):
+                setattr(self, attr, seq_store.SeqStore(self.seq_file, state[attr]))
+
     # TODO is this the right place for this?
     def reset_markers(self):
         self._blasted = 0
@@ -1537,11 +1850,13 @@ class PhyscraperScrape(object):
         """
         debug("OTOL unmapped")
         if self.config.unmapped == "remove":
+            unmapped = []
             for key in self.data.otu_dict:
                 if "^ot:ottId" not in self.data.otu_dict[key]:
                     # second condition for OToL unmapped taxa, not present in own_data
                     if u"^ot:treebaseOTUId" in self.data.otu_dict[key]:
-                        self.data.remove_taxa_aln_tre(key)
+                        unmapped.append(key)
+            self.data.remove_taxa(unmapped)
         else:
             i = 1
             for key in self.data.otu_dict:
@@ -1564,7 +1879,7 @@ class PhyscraperScrape(object):
         :param taxon_label: corresponding taxon name for query sequence
         :param fn_path: path to output file for blast query result
 
-        :return: runs local blast query and writes it to file
+        :return: runs local blast query and writes it to file, raises RuntimeError if blastn fails
         """
         abs_blastdir = os.path.abspath(self.blast_subdir)
         abs_fn = os.path.abspath(fn_path)
@@ -1579,47 +1894,63 @@ class PhyscraperScrape(object):
         outfmt = " -outfmt '6 sseqid staxids sscinames pident evalue bitscore sseq stitle'"
         # outfmt = " -outfmt 5"  # format for xml file type
         # TODO query via stdin
+        # written to a temporary file first, so that a killed run leaves no truncated result behind
         blastcmd = "blastn -query " + "{}/tmp.fas".format(abs_blastdir) + \
-                   " -db {}nt -out ".format(self.config.blastdb) + abs_fn + \
+                   " -db {}nt -out ".format(self.config.blastdb) + blast_jobs.tmp_path(abs_fn) + \
                    " {} -num_threads {}".format(outfmt, self.config.num_threads) + \
                    " -max_target_seqs {} -max_hsps {}".format(self.config.hitlist_size,
                                                               self.config.hitlist_size)
-        os.system(blastcmd)
-        os.chdir(cwd)
-
-    def local_blast_for_unpublished(self, query, taxon):
+        try:
+            returncode = subprocess.call(blastcmd, shell=True)
+        finally:
+            os.chdir(cwd)
+        if returncode != 0:
+            # the output of a failed run may be truncated, run_blast_job() records the search as failed
+            blast_jobs.discard_tmp_file(abs_fn)
+            sys.stderr.write("blastn exited with status {} for {}\n".format(returncode, taxon_label))
+            raise RuntimeError("blastn exited with status {}".format(returncode))
+        blast_jobs.commit_tmp_file(abs_fn)
+
+    def local_blast_for_unpublished(self, queries):
         """
         Run a local blast search if the data is unpublished.
 
-        :param query: query sequence
-        :param taxon: taxon.label used as identifier for the sequences
-        :return: xml files with the results of the local blast
+        All queries are blasted in one batched blastn run against the database written by write_unpubl_blastdb(),
+        the tabular output is read by read_unpublished_blast_query().
+
+        :param queries: list of tuples of taxon.label (used as identifier for the sequences) and query sequence
+        :return: tabular file with the results of the local blast: workdir/blast/unpublished_blast.txt
         """
         debug("run against local unpublished data")
-        toblast = open("{}/tmp.fas".format(self.blast_subdir), "w")
-        toblast.write(">{}\n".format(taxon))
-        toblast.write("{}\n".format(query))
-        toblast.close()
-        blast_db = "local_unpubl_seq_db"
-        output = "tst_fn"
-        blastcmd = "blastn -query {}/tmp.fas -db {} -out output_{}.xml " \
-                   "-outfmt 5".format(self.blast_subdir, blast_db, output)
+        blast_dir = os.path.abspath(os.path.join(self.workdir, "blast"))
+        query_fn = "{}/unpublished_queries.fas".format(blast_dir)
+        with open(query_fn, "w") as toblast:
+            for taxon, query in queries:
+                toblast.write(">{}\n".format(taxon))
+                toblast.write("{}\n".format(query))
+        blast_db = "{}/local_unpubl_seq_db".format(blast_dir)
+        outfmt = " -outfmt '6 qseqid sseqid stitle evalue bitscore sseq'"
+        blastcmd = "blastn -query {} -db {} -out {}/{}".format(query_fn, blast_db, blast_dir, self.unpubl_blast_fn) + \
+                   " {} -num_threads {}".format(outfmt, self.config.num_threads)
         os.system(blastcmd)
 
-    def run_web_blast_query(self, query, equery, fn_path):
+    def run_web_blast_query(self, query, equery, fn_path, url_base=None):
         """Equivalent to run_local_blast_cmd() but for webqueries, 
         that need to be implemented differently.
 
         :param query: query sequence
         :param equery: method to limit blast query to mrca
         :param fn_path: path to output file for blast query result
+        :param url_base: optional, endpoint to use instead of self.config.url_base
         :return: runs web blast query and writes it to file
         """
-        if self.config.url_base:
+        if url_base is None:
+            url_base = self.config.url_base
+        if url_base:
             result_handle = AWSWWW.qblast("blastn",
                                           "nt",
                                           query,
-                                          url_base=self.config.url_base,
+                                          url_base=url_base,
                                           entrez_query=equery,
                                           hitlist_size=self.config.hitlist_size,
                                           num_threads=self.config.num_threads)
@@ -1630,15 +1961,52 @@ class PhyscraperScrape(object):
                                           query,
                                           entrez_query=equery,
                                           hitlist_size=self.config.hitlist_size)
-        save_file = open(fn_path, "w")
-        save_file.write(result_handle.read())
+        blast_jobs.atomic_write(fn_path, result_handle.read())
         result_handle.close()
-        save_file.close()
 
-    def run_blast_wrapper(self, delay=14):
+    def blast_queue(self, delay=14):
+        """Collects the OTUs that are due to be blasted again and orders them by their expected yield.
+
+        See blast_scheduler.py for the ranking.
+
+        :param delay: number that determines when a previously blasted sequence is reblasted - time is in days
+        :return: list of dicts with 'otu_id', 'taxon', 'seq', 'age', 'last_yield', 'density', best query first
+        """
+        today = datetime.datetime.strptime(str(datetime.date.today()).replace("-", "/"), "%Y/%m/%d")
+        density = {}
+        taxon_keys = {}
+        for taxon in self.data.aln:
+            otu = self.data.otu_dict.get(taxon.label, {})
+            taxon_key = otu.get('^ot:ottId') or otu.get('^ncbi:taxon') or taxon.label
+            taxon_keys[taxon.label] = taxon_key
+            density[taxon_key] = density.get(taxon_key, 0) + 1
+        candidates = []
+        for taxon, seq in self.data.aln.items():
+            otu_id = taxon.label
+            if otu_id in self.data.otu_dict:
+                last_blast = self.data.otu_dict[otu_id]['^physcraper:last_blasted']
+                time_passed = abs((today - datetime.datetime.strptime(last_blast, "%Y/%m/%d")).days)
+                if time_passed > delay:
+                    candidates.append({'otu_id': otu_id, 'taxon': taxon, 'seq': seq, 'age': time_passed,
+                                       'last_yield': self.data.otu_dict[otu_id].get('^physcraper:last_yield'),
+                                       'density': density[taxon_keys[otu_id]]})
+                else:
+                    if _VERBOSE:
+                        sys.stdout.write("otu {} was last blasted {} days ago and is not being re-blasted. "
+                                         "Use run_blast_wrapper(delay = 0) to force a search.\n".format(otu_id, last_blast))
+        return blast_scheduler.rank_queries(candidates, delay)
+
+    def run_blast_wrapper(self, delay=14, max_queries=None, max_seconds=None):
         """generates the blast queries and saves them depending on the blasting method to different file formats
 
+        The queries are run in the order of their expected yield (see blast_queue()). If a budget is given,
+        the remaining queries are postponed to the next cycle, they keep their last_blasted date. Their number is
+        stored in self._blast_postponed, if at least one search of this run was successful.
+
         :param delay: number that determines when a previously blasted sequence is reblasted - time is in days
+        :param max_queries: optional, maximum number of blast searches in this run, e.g. config.blast_max_queries
+        :param max_seconds: optional, no new blast search is started after that many seconds,
+                            e.g. config.blast_max_seconds
         :return: writes blast queries to file
         """
         debug("run_blast_wrapper")
@@ -1647,64 +2015,177 @@ class PhyscraperScrape(object):
             os.makedirs(self.blast_subdir)
         with open(self.logfile, "a") as log:
             log.write("Blast run {} \n".format(datetime.date.today()))
-        for taxon, seq in self.data.aln.items():
-            otu_id = taxon.label
-            if otu_id in self.data.otu_dict:
-                if _VERBOSE:
-                    sys.stdout.write("blasting {}\n".format(otu_id))
-                last_blast = self.data.otu_dict[otu_id]['^physcraper:last_blasted']
-                today = str(datetime.date.today()).replace("-", "/")
-                time_passed = abs((datetime.datetime.strptime(today, "%Y/%m/%d") - datetime.datetime.strptime(last_blast, "%Y/%m/%d")).days)
-                query = seq.symbols_as_string().replace("-", "").replace("?", "")
-                if self.unpublished:
-                    self.local_blast_for_unpublished(query, taxon.label)
+        today = str(datetime.date.today()).replace("-", "/")
+        self._blast_postponed = 0
+        if self.unpublished:
+            queries = []
+            for taxon, seq in self.data.aln.items():
+                otu_id = taxon.label
+                if otu_id in self.data.otu_dict:
+                    if _VERBOSE:
+                        sys.stdout.write("blasting {}\n".format(otu_id))
+                    queries.append((otu_id, seq.symbols_as_string().replace("-", "").replace("?", "")))
                     if self.backbone is True:
                         self.data.otu_dict[otu_id]["^physcraper:last_blasted"] = today
-                else:
-                    if time_passed > delay:
-                        if self.config.blast_loc == "local":
-                            file_ending = "txt"
-                        else:
-                            file_ending = "xml"
-                        if self.config.gb_id_filename is True:
-                            fn = self.data.otu_dict[taxon.label].get('^ncbi:accession', taxon.label)
-                            fn_path = "{}/{}.{}".format(self.blast_subdir, fn, file_ending)
-                        else:
-                            fn_path = "{}/{}.{}".format(self.blast_subdir, taxon.label, file_ending)
-                        if _DEBUG:
-                            sys.stdout.write("attempting to write {}\n".format(fn_path))
-                        if not os.path.isfile(fn_path):
-                            if _VERBOSE:
-                                sys.stdout.write("blasting seq {}\n".format(taxon.label))
-                            if self.config.blast_loc == 'local':
-                                self.run_local_blast_cmd(query, taxon.label, fn_path)
-                            if self.config.blast_loc == 'remote':
-                                if len(self.ids.mrca_ncbi) >= 2:
-                                    len_ncbi = len(self.ids.mrca_ncbi)
-                                    equery = ''
-                                    for ncbi_id in self.ids.mrca_ncbi:
-                                        if len_ncbi >= 2:
-                                            equery = equery + "txid{}[orgn] OR ".format(ncbi_id)
-                                            len_ncbi = len_ncbi - 1
-                                        else:
-                                            equery = equery + "txid{}[orgn]) ".format(ncbi_id)
-                                    equery = "(" + equery + "AND {}:{}[mdat]".format(last_blast, today)
-                                else:
-                                    equery = "txid{}[orgn] AND {}:{}[mdat]".format(self.mrca_ncbi, last_blast, today)
-                                    self.run_web_blast_query(query, equery, fn_path)
-                            self.data.otu_dict[otu_id]['^physcraper:last_blasted'] = today
-                        else:
-                            if _DEBUG:
-                                sys.stdout.write("file {} exists in current blast run. Will not blast, "
-                                                 "delete file to force\n".format(fn_path))
-                            if _DEBUG_MK == 1:
-                                self.data.otu_dict[otu_id]['^physcraper:last_blasted'] = today
+            self.local_blast_for_unpublished(queries)
+            self._blasted = 1
+            return
+        num_interrupted = self.blast_jobs.reset_running()
+        if num_interrupted:
+            with open(self.logfile, "a") as log:
+                log.write("{} blast searches of an interrupted run will be repeated\n".format(num_interrupted))
+        start_time = time.time()
+        num_queries = 0
+        num_blasted = 0
+        num_postponed = 0
+        pool = None
+        pool_jobs = []
+        if self.config.blast_loc == 'remote' and sum(item[1] for item in self.config.blast_endpoints) > 1:
+            pool = blast_pool.EndpointPool(self.config.blast_endpoints)
+        queue = self.blast_queue(delay)
+        for pos, cand in enumerate(queue):
+            if (max_queries is not None and num_queries >= max_queries) or \
+                    (max_seconds is not None and time.time() - start_time > max_seconds):
+                num_postponed = len(queue) - pos
+                with open(self.logfile, "a") as log:
+                    log.write("Blast budget used up after {} searches, {} OTUs postponed\n".format(num_queries,
+                                                                                              num_postponed))
+                break
+            otu_id = cand['otu_id']
+            taxon = cand['taxon']
+            if _VERBOSE:
+                sys.stdout.write("blasting {}\n".format(otu_id))
+            last_blast = self.data.otu_dict[otu_id]['^physcraper:last_blasted']
+            query = cand['seq'].symbols_as_string().replace("-", "").replace("?", "")
+            if self.config.blast_loc == "local":
+                file_ending = "txt"
+            else:
+                file_ending = "xml"
+            if self.config.gb_id_filename is True:
+                fn = self.data.otu_dict[taxon.label].get('^ncbi:accession', taxon.label)
+                fn_path = "{}/{}.{}".format(self.blast_subdir, fn, file_ending)
+            else:
+                fn_path = "{}/{}.{}".format(self.blast_subdir, taxon.label, file_ending)
+            if _DEBUG:
+                sys.stdout.write("attempting to write {}\n".format(fn_path))
+            if not self.blast_result_done(fn_path):
+                if _VERBOSE:
+                    sys.stdout.write("blasting seq {}\n".format(taxon.label))
+                if self.config.blast_loc == 'local':
+                    blasted = self.run_blast_job(otu_id, fn_path, self.run_local_blast_cmd,
+                                                 query, taxon.label, fn_path)
+                if self.config.blast_loc == 'remote':
+                    if len(self.ids.mrca_ncbi) >= 2:
+                        len_ncbi = len(self.ids.mrca_ncbi)
+                        equery = ''
+                        for ncbi_id in self.ids.mrca_ncbi:
+                            if len_ncbi >= 2:
+                                equery = equery + "txid{}[orgn] OR ".format(ncbi_id)
+                                len_ncbi = len_ncbi - 1
+                            else:
+                                equery = equery + "txid{}[orgn]) ".format(ncbi_id)
+                        equery = "(" + equery + "AND {}:{}[mdat]".format(last_blast, today)
                     else:
-                        if _VERBOSE:
-                            sys.stdout.write("otu {} was last blasted {} days ago and is not being re-blasted. "
-                                             "Use run_blast_wrapper(delay = 0) to force a search.\n".format(otu_id, last_blast))
+                        equery = "txid{}[orgn] AND {}:{}[mdat]".format(self.mrca_ncbi, last_blast, today)
+                    if pool is not None:
+                        pool_jobs.append((otu_id, query, equery, fn_path))
+                        num_queries += 1
+                        continue
+                    blasted = self.run_blast_job(otu_id, fn_path, self.run_web_blast_query, query, equery, fn_path)
+                if blasted:
+                    self.data.otu_dict[otu_id]['^physcraper:last_blasted'] = today
+                    num_blasted += 1
+                num_queries += 1
+            else:
+                if _DEBUG:
+                    sys.stdout.write("file {} exists in current blast run. Will not blast, "
+                                     "delete file to force\n".format(fn_path))
+                if _DEBUG_MK == 1:
+                    self.data.otu_dict[otu_id]['^physcraper:last_blasted'] = today
+        if pool is not None:
+            pool_blasted, pool_postponed = self.run_web_blast_pool(pool, pool_jobs, start_time, max_seconds)
+            num_blasted += pool_blasted
+            num_postponed += pool_postponed
+        # without a successful search the next round would only repeat the failing ones
+        if num_blasted > 0:
+            self._blast_postponed = num_postponed
+        with open(self.logfile, "a") as log:
+            log.write("Blast jobs: {}\n".format(self.blast_jobs.summary()))
         self._blasted = 1
 
+    def blast_result_done(self, fn_path):
+        """Tests if the blast search for fn_path does not need to be run (again).
+
+        :param fn_path: path to the blast result file
+        :return: True if the job is done and its file unchanged, or for files without a job entry
+                (e.g. from a shared blast folder or an older physcraper version) if the file exists.
+        """
+        if self.blast_jobs.state(fn_path) is None:
+            return os.path.isfile(fn_path)
+        return self.blast_jobs.is_done(fn_path)
+
+    def run_blast_job(self, otu_id, fn_path, search, *args):
+        """Runs a single blast search and records it in self.blast_jobs.
+
+        Errors are recorded and reported, but do not stop the run, the search is repeated in the next run.
+
+        :param otu_id: otu_id of the query
+        :param fn_path: path to the blast result file
+        :param search: function that runs the search, e.g. self.run_local_blast_cmd
+        :param args: arguments of search
+        :return: True if the search was successful
+        """
+        self.blast_jobs.start(fn_path, otu_id)
+        try:
+            search(*args)
+            if not os.path.isfile(fn_path):
+                raise IOError("no blast result written to {}".format(fn_path))
+        except Exception as err:
+            self.blast_jobs.fail(fn_path, err)
+            sys.stderr.write("blast search of {} failed: {}\n".format(otu_id, err))
+            return False
+        self.blast_jobs.finish(fn_path)
+        return True
+
+    def run_web_blast_pool(self, pool, jobs, start_time=None, max_seconds=None):
+        """Runs the web blast queries concurrently on the endpoints of the pool (see blast_pool.py).
+
+        :param pool: blast_pool.EndpointPool
+        :param jobs: list of tuples (otu_id, query, equery, fn_path)
+        :param start_time: optional, time.time() at the start of the blast run, used for the budget
+        :param max_seconds: optional, no new blast search is started after that many seconds
+        :return: tuple of the number of successful and of postponed searches. Runs web blast queries, writes
+                 them to file and updates last_blasted of the successful ones
+        """
+        today = str(datetime.date.today()).replace("-", "/")
+
+        def search(url_base, otu_id, query, equery, fn_path):
+            if max_seconds is not None and time.time() - start_time > max_seconds:
+                return False
+            self.blast_jobs.start(fn_path, otu_id)  # every attempt is counted
+            self.run_web_blast_query(query, equery, fn_path, url_base=url_base)
+            return True
+
+        results = pool.map(search, jobs)
+        num_blasted = 0
+        num_postponed = 0
+        for job, (blasted, error) in zip(jobs, results):
+            if error is not None:
+                self.blast_jobs.fail(job[3], error)
+                sys.stderr.write("blast query of {} failed on all endpoints: {}\n".format(job[0], error))
+            elif blasted:
+                self.blast_jobs.finish(job[3])
+                self.data.otu_dict[job[0]]['^physcraper:last_blasted'] = today
+                num_blasted += 1
+            else:
+                num_postponed += 1
+        with open(self.logfile, "a") as log:
+            for endpoint in pool.endpoints:
+                log.write("{}: {} searches, {} failed\n".format(endpoint.url, endpoint.num_done, endpoint.num_failed))
+            if num_postponed:
+                log.write("Blast budget used up, {} OTUs postponed\n".format(num_postponed))
+        return num_blasted, num_postponed
+
     # def get_all_acc_mrca(self):
     #     """get all available acc numbers from Genbank for mrca.
     #
@@ -1737,9 +2218,61 @@ class PhyscraperScrape(object):
     #         acc_l.append(str(acc_id))
     #     return acc_l
 
+    def is_ingroup(self, ncbi_id):
+        """Tests if a ncbi taxon id belongs to the ingroup (self.mrca_ncbi), using the local ncbi taxonomy.
+
+        The taxon is moved up to the rank of the mrca, it is part of the ingroup if it ends up at the mrca.
+        Results are cached per taxon id, as most blast hits belong to a few taxa.
+
+        Taxon ids that are not in the local taxonomy are reported once, the result is None. The callers keep
+        these hits.
+
+        :param ncbi_id: ncbi taxon id
+        :return: True/False, None if it cannot be decided
+        """
+        if ncbi_id in self._ingroup_cache:
+            return self._ingroup_cache[ncbi_id]
+        if self.config.blast_loc == "remote":
+            return None
+        if type(self.mrca_ncbi) is int:
+            mrca_ids = [self.mrca_ncbi]
+        else:
+            mrca_ids = list(self.mrca_ncbi)
+        ingroup = False
+        try:
+            for mrca_ncbi in mrca_ids:
+                rank_mrca_ncbi = self.ids.ncbi_parser.get_rank(mrca_ncbi)
+                input_rank_id = self.ids.ncbi_parser.get_downtorank_id(ncbi_id, rank_mrca_ncbi)
+                if input_rank_id == mrca_ncbi:
+                    ingroup = True
+                    break
+        except IndexError:  # taxon id not in the local taxonomy
+            sys.stderr.write("ncbi id {} not found in the local taxonomy, its sequences are kept\n".format(ncbi_id))
+            ingroup = None
+        self._ingroup_cache[ncbi_id] = ingroup
+        return ingroup
+
+    def reject_hit(self, gb_acc, ncbi_id):
+        """Writes a blast hit, that is not part of the ingroup, to the rejection log.
+
+        Every accession is only written once, the hits are not stored in self.new_seqs or self.data.gb_dict.
+
+        :param gb_acc: accession of the hit
+        :param ncbi_id: ncbi taxon id of the hit
+        :return: updates self._ingroup_rejected and writes to workdir/blast_ingroup_rejected.csv
+        """
+        if gb_acc in self._ingroup_rejected:
+            return
+        self._ingroup_rejected.add(gb_acc)
+        with open("{}/blast_ingroup_rejected.csv".format(self.workdir), "a") as rejected:
+            rejected.write("{},{}\n".format(gb_acc, ncbi_id))
+
     def read_local_blast_query(self, fn_path):
         """ Implementation to read in results of local blast searches.
 
+        Hits that do not belong to the ingroup (see is_ingroup()) are not stored, but written to
+        workdir/blast_ingroup_rejected.csv.
+
         :param fn_path: path to file containing the local blast searches
         :return: updated self.new_seqs and self.data.gb_dict dictionaries
         """
@@ -1765,6 +2298,13 @@ class PhyscraperScrape(object):
                 self.ids.spn_to_ncbiid[sscinames] = staxids
                 if gb_acc not in self.ids.acc_ncbi_dict:  # fill up dict with more information.
                     self.ids.acc_ncbi_dict[gb_acc] = staxids
+                if gb_acc in self._ingroup_rejected:
+                    continue
+                # filter hits here, so that they are never stored; hits above the e-value threshold are only
+                # logged below and do not need the taxonomy lookup
+                if evalue < float(self.config.e_value_thresh) and self.is_ingroup(staxids) is False:
+                    self.reject_hit(gb_acc, staxids)
+                    continue
                 if gb_acc not in query_dict and gb_acc not in self.newseqs_acc:
                     query_dict[gb_acc] = {'^ncbi:gi': gi_id, 'accession': gb_acc, 'staxids': staxids,
                                          'sscinames': sscinames, 'pident': pident, 'evalue': evalue,
@@ -1774,8 +2314,9 @@ class PhyscraperScrape(object):
             if float(query_dict[key]["evalue"]) < float(self.config.e_value_thresh):
                 gb_acc = query_dict[key]["accession"]
                 if gb_acc not in self.data.gb_dict:  # skip ones we already have
-                    self.new_seqs[gb_acc] = query_dict[key]["sseq"]
-                    self.data.gb_dict[gb_acc] = query_dict[key]
+                    # the sequence is only kept in self.new_seqs, which writes it to the seq_store file
+                    self.new_seqs[gb_acc] = query_dict[key].pop("sseq")
+                    self.data.gb_dict[gb_acc] = records.HitRecord(query_dict[key])
             else:
                 fn = open("{}/blast_threshold_not_passed.csv".format(self.workdir), "a")
                 fn.write("blast_threshold_not_passed:\n")
@@ -1784,60 +2325,63 @@ class PhyscraperScrape(object):
 
     def read_unpublished_blast_query(self):
         """
-        Reads in the blast files generated during local_blast_for_unpublished() and adds seq to self.data.gb_dict and
-        self.new_seqs.
+        Reads in the blast file generated during local_blast_for_unpublished() and adds seq to self.data.gb_dict and
+        self.new_seqs. Sequences with a ncbi taxon id outside of the ingroup are not added (see is_ingroup()).
 
+        The tabular file is read line by line, the hits are grouped by query (the otu_id of the blasted sequence).
+        As blast sorts the hits of a query by evalue, the first hsp of every unpublished sequence is the best one.
         """
-        output_blast = "output_tst_fn.xml"
-        gb_counter = 1
-        general_wd = os.getcwd()
-        os.chdir(os.path.join(self.workdir, "blast"))
-        xml_file = open(output_blast)
-        os.chdir(general_wd)
-        blast_out = NCBIXML.parse(xml_file)
-        for blast_record in blast_out:
-            for alignment in blast_record.alignments:
-                for hsp in alignment.hsps:
-                    if float(hsp.expect) < float(self.config.e_value_thresh):
-                        local_id = alignment.title.split("|")[-1].split(" ")[-1]
-                        if local_id not in self.data.gb_dict:  # skip ones we already have
-                            unpbl_local_id = "unpubl_{}".format(local_id)
-                            self.new_seqs[unpbl_local_id] = hsp.sbjct
-                            self.data.gb_dict[unpbl_local_id] = {'title': "unpublished", 'localID': local_id}
-                            debug(self.data.unpubl_otu_json)
+        fn_path = os.path.join(self.workdir, "blast", self.unpubl_blast_fn)
+        if not os.path.isfile(fn_path):
+            sys.stderr.write("{} not found, no unpublished sequences read\n".format(fn_path))
+            return
+        with open(fn_path) as infile:
+            query_lines = itertools.groupby(infile, key=lambda lin: lin.split("\t", 1)[0])
+            for qseqid, lines in query_lines:
+                num_new_seqs = len(self.new_seqs)
+                for lin in lines:
+                    qseqid, sseqid, stitle, evalue, bitscore, sseq = lin.rstrip("\n").split("\t")
+                    if float(evalue) < float(self.config.e_value_thresh):
+                        # title is combined as in the xml output: "gnl|BL_ORD_ID|0 local_id"
+                        local_id = "{} {}".format(sseqid, stitle).split("|")[-1].split(" ")[-1]
+                        unpbl_local_id = "unpubl_{}".format(local_id)
+                        if unpbl_local_id not in self.data.gb_dict:  # skip ones we already have
+                            ncbi_id = self.data.unpubl_otu_json['otu{}'.format(local_id)].get(u"^ncbi:taxon")
+                            if ncbi_id is not None and self.is_ingroup(ncbi_id) is False:
+                                self.reject_hit(unpbl_local_id, ncbi_id)
+                                continue
+                            self.new_seqs[unpbl_local_id] = sseq.replace("-", "")
+                            self.data.gb_dict[unpbl_local_id] = records.HitRecord(title="unpublished",
+                                                                                  localID=local_id)
                             self.data.gb_dict[unpbl_local_id].update(
                                 self.data.unpubl_otu_json['otu{}'.format(local_id)])
-                            gb_counter += 1
+                if qseqid in self.data.otu_dict:
+                    self.data.otu_dict[qseqid]['^physcraper:last_yield'] = len(self.new_seqs) - num_new_seqs
 
     def read_webbased_blast_query(self, fn_path):
         """ Implementation to read in results of web blast searches.
 
+        The xml file is streamed with blast_parser.iter_blast_xml_hits(), which only keeps the information of
+        the best hsp per hit instead of the complete Bio.Blast records.
+
         :param fn_path: path to file containing the local blast searches
         :return: updated self.new_seqs and self.data.gb_dict dictionaries
         """
-        result_handle = open(fn_path)
+        if _VERBOSE:
+            sys.stdout.write(".")
         try:
-            if _VERBOSE:
-                sys.stdout.write(".")
-            blast_records = NCBIXML.parse(result_handle)
-            for blast_record in blast_records:
-                for alignment in blast_record.alignments:
-                    for hsp in alignment.hsps:
-                        if float(hsp.expect) < float(self.config.e_value_thresh):
-                            gb_id = alignment.title.split("|")[3]  # 1 is for gi
-                            if gb_id.split(".") == 1:
-                                debug(gb_id)
-                            if gb_id not in self.data.gb_dict:  # skip ones we already have
-                                self.new_seqs[gb_id] = hsp.sbjct
-                                gi_id = alignment.title.split('|')[1]
-                                gb_acc = alignment.__dict__['accession']
-                                stitle = alignment.__dict__['title']
-                                hsps = alignment.__dict__['hsps']
-                                length = alignment.__dict__['length']
-                                query_dict = {'^ncbi:gi': gi_id, 'accession': gb_acc, 'title': stitle,
-                                              'length': length, 'hsps': hsps}
-                                self.data.gb_dict[gb_id] = query_dict
-        except ValueError:
+            for hit in blast_parser.iter_blast_xml_hits(fn_path):
+                if hit["evalue"] < float(self.config.e_value_thresh):
+                    gb_id = hit["title"].split("|")[3]  # 1 is for gi
+                    if gb_id.split(".") == 1:
+                        debug(gb_id)
+                    if gb_id not in self.data.gb_dict:  # skip ones we already have
+                        self.new_seqs[gb_id] = hit["sseq"]
+                        query_dict = {'^ncbi:gi': hit["^ncbi:gi"], 'accession': hit["accession"],
+                                      'title': hit["title"], 'length': hit["length"],
+                                      'evalue': hit["evalue"], 'bitscore': hit["bitscore"]}
+                        self.data.gb_dict[gb_id] = records.HitRecord(query_dict)
+        except (SyntaxError, ValueError):  # ParseError of ElementTree is a subclass of SyntaxError
             sys.stderr.write("Problem reading {}, skipping\n".format(fn_path))
 
     def read_blast_wrapper(self, blast_dir=None):
@@ -1860,7 +2404,8 @@ class PhyscraperScrape(object):
             self.read_unpublished_blast_query()
         else:
             if not self._blasted:
-                self.run_blast_wrapper()
+                self.run_blast_wrapper(max_queries=self.config.blast_max_queries,
+                                       max_seconds=self.config.blast_max_seconds)
             assert os.path.exists(self.blast_subdir)
             for taxon in self.data.aln:
                 # debug(self.config.blast_loc)
@@ -1878,11 +2423,14 @@ class PhyscraperScrape(object):
                     fn_path = "{}/{}.{}".format(self.blast_subdir, taxon.label, file_ending)
                 if _DEBUG:
                     sys.stdout.write("attempting to read {}\n".format(fn_path))
-                if os.path.isfile(fn_path):
+                if self.blast_result_done(fn_path):
+                    num_new_seqs = len(self.new_seqs)
                     if self.config.blast_loc == 'local':  # new method to read in txt format
                         self.read_local_blast_query(fn_path)
                     else:
                         self.read_webbased_blast_query(fn_path)
+                    # used to rank the next blast searches, see blast_queue()
+                    self.data.otu_dict[taxon.label]['^physcraper:last_yield'] = len(self.new_seqs) - num_new_seqs
         self.date = str(datetime.date.today())
         debug("len new seqs dict after evalue filter")
         debug(len(self.new_seqs))
@@ -1896,6 +2444,51 @@ class PhyscraperScrape(object):
     def get_sp_id_of_otulabel(self, label):
         """Get the species name and the corresponding ncbi id of the otu.
 
+        Results are cached per label in self._sp_id_cache, together with the taxonomy fields of the otu_dict
+        entry they were resolved from. If one of these fields changes, the label is resolved again.
+        Resolving can fill in fields itself (find_name() adds the name and ncbi id of an accession), the
+        fields are therefore read again before they are cached.
+
+        :param label: otu_label = key from otu_dict
+        :return: ncbi id of corresponding label
+        """
+        cached = self._sp_id_cache.get(label)
+        if cached is not None and cached[0] == self._sp_id_signature(label):
+            return cached[1]
+        id_of_label = self._resolve_sp_id(label)
+        self._sp_id_cache[label] = (self._sp_id_signature(label), id_of_label)
+        return id_of_label
+
+    def _sp_id_signature(self, label):
+        """:return: tuple of the taxonomy fields of the otu_dict entry, see get_sp_id_of_otulabel()"""
+        return tuple(self.data.otu_dict[label].get(key) for key in _SP_ID_FIELDS)
+
+    def resolve_sp_ids(self, labels):
+        """Resolves the ncbi ids of several otus at once, before they are compared in seq_dict_build().
+
+        Labels with the same taxon name are resolved only once, the others use the result of the first one.
+
+        :param labels: list of otu_ids
+        :return: fills self._sp_id_cache
+        """
+        by_name = {}
+        for label in labels:
+            signature = self._sp_id_signature(label)
+            cached = self._sp_id_cache.get(label)
+            if cached is not None and cached[0] == signature:
+                continue
+            # with an ott name the accession is not used, the result only depends on the name and ids
+            name_key = signature[:4] if signature[0] else signature
+            if name_key in by_name:
+                self._sp_id_cache[label] = (signature, by_name[name_key])
+            else:
+                # caches the fields as they are after resolving, see get_sp_id_of_otulabel()
+                by_name[name_key] = self.get_sp_id_of_otulabel(label)
+        debug("resolved {} taxon names".format(len(by_name)))
+
+    def _resolve_sp_id(self, label):
+        """Looks up the ncbi id of an otu, see get_sp_id_of_otulabel().
+
         :param label: otu_label = key from otu_dict
         :return: ncbi id of corresponding label
         """
@@ -1924,21 +2517,53 @@ class PhyscraperScrape(object):
             self.ids.spn_to_ncbiid[spn_of_label] = id_of_label
         return id_of_label
 
-    def seq_dict_build(self, seq, label, seq_dict):
+    def prune_later(self, taxon_label):
+        """Marks a taxon for removal from aln and tre, all marked taxa are removed at once at the end of
+        remove_identical_seqs(). The status is set now, as remove_taxa_aln_tre() would do.
+
+        :param taxon_label: otu_id
+        :return: appends to self._to_be_pruned
+        """
+        self.data.otu_dict[taxon_label]['^physcraper:status'] = "deleted"
+        self._to_be_pruned.append(taxon_label)
+
+    def seq_dict_build(self, seq, label, seq_dict, related=None):
         """takes a sequence, a label (the otu_id) and a dictionary and adds the
         sequence to the dict only if it is not a subsequence of a
         sequence already in the dict.
         If the new sequence is a super sequence of one in the dict, it
-        removes that sequence and replaces it
+        removes that sequence and replaces it.
+        Exact copies of a kept sequence of the same species are rejected before the search, by their digest
+        (self.seq_digests). Only the other sequences go into the containment search.
 
         :param seq: sequence as string, which shall be compared to existing sequences
         :param label: otu_label of corresponding seq
-        :param seq_dict: the tmp_dict generated in add_otu()
+        :param seq_dict: the tmp_dict generated in add_otu(). If it is a containment.IndexedSeqDict,
+                        only the sequences that may contain or be contained in seq are compared.
+        :param related: optional set of the labels that contain seq or are contained in it,
+                        precomputed by containment.precompute_related(). Only these are compared.
         :return: updated seq_dict
         """
         id_of_label = self.get_sp_id_of_otulabel(label)
         new_seq = seq.replace("-", "")
-        tax_list = deepcopy(seq_dict.keys())
+        # too long sequences are not compared at all, see below
+        if len(new_seq) < sum(self.data.orig_seqlen) / len(self.data.orig_seqlen) * 2.5:
+            dup_lab = self.seq_digests.same_species_copy(new_seq, seq_dict, id_of_label)
+            if dup_lab is not None:
+                if _VERBOSE:
+                    sys.stdout.write("seq {} is identical to {}, not added\n".format(label, dup_lab))
+                self.data.otu_dict[label]['^physcraper:status'] = "subsequence, not added"
+                debug("{} not added, identical to {}".format(id_of_label, dup_lab))
+                if self.data.has_taxon(label):
+                    self.prune_later(label)
+                return seq_dict
+        if isinstance(seq_dict, containment.IndexedSeqDict):
+            # only the candidates are looked at, in the order of the keys of seq_dict
+            tax_list = seq_dict.in_order(related if related is not None else seq_dict.candidates(new_seq))
+        elif related is not None:
+            tax_list = [tax_lab for tax_lab in seq_dict.keys() if tax_lab in related]
+        else:
+            tax_list = deepcopy(list(seq_dict.keys()))
         i = 0
         continue_search = False
         never_add = False
@@ -1991,7 +2616,7 @@ class PhyscraperScrape(object):
                     else:
                         del seq_dict[tax_lab]
                         seq_dict[label] = seq
-                        self.data.remove_taxa_aln_tre(tax_lab)
+                        self.prune_later(tax_lab)
                         if _VERBOSE:
                             sys.stdout.write("seq {} is supersequence of {}, {} added "
                                              "and {} removed\n".format(label, tax_lab, label, tax_lab))
@@ -2005,8 +2630,8 @@ class PhyscraperScrape(object):
             if (self.data.otu_dict[label]['^physcraper:status'].split(' ')[0] in self.seq_filter) or never_add is True:
                 if label in seq_dict.keys():
                     del seq_dict[label]
-                if label in self.data.aln.taxon_namespace or label in self.data.tre.taxon_namespace:
-                    self.data.remove_taxa_aln_tre(label)
+                if self.data.has_taxon(label):
+                    self.prune_later(label)
                 else:
                     debug("label was never added to aln or tre")
                 # Note: should not be the word 'deleted', as this is used in self.seq_filter
@@ -2017,13 +2642,18 @@ class PhyscraperScrape(object):
             if i % 50 == 0:
                 sys.stdout.write("\n")
         seq_dict[label] = seq
+        self.seq_digests.add(label, seq, id_of_label)
         return seq_dict
 
-    def remove_identical_seqs(self):
+    def remove_identical_seqs(self, num_processes=None):
         """goes through the new seqs pulled down, and removes ones that are
         shorter than LENGTH_THRESH percent of the orig seq lengths, and chooses
         the longer of two that are other wise identical, and puts them in a dict
         with new name as gi_ott_id.
+
+        :param num_processes: if larger than 1, the sequence comparisons are computed in a pool of processes
+                              first (containment.precompute_related()). The decisions are then made in the usual
+                              order, the result is the same as without. Defaults to self.config.num_processes.
         """
         debug("remove identical seqs")
         if len(self.new_seqs_otu_id) > 0:
@@ -2031,13 +2661,37 @@ class PhyscraperScrape(object):
                 sys.stdout.write("running remove identical twice in a row"
                                 "without generating new alignment will cause errors. skipping\n")
             return
-        tmp_dict = dict((taxon.label, self.data.aln[taxon].symbols_as_string()) for taxon in self.data.aln)
+        tmp_dict = containment.IndexedSeqDict((taxon.label, self.data.aln[taxon].symbols_as_string())
+                                              for taxon in self.data.aln)
+        self.resolve_sp_ids(tmp_dict.keys())
+        # sequences change during alignment and trimming, only rows with a new length are hashed again
+        self.seq_digests.sync(tmp_dict, self.data.aln_matrix().row_lengths(),
+                              dict((label, self.get_sp_id_of_otulabel(label)) for label in tmp_dict))
         old_seqs = tmp_dict.keys()
         # Adding seqs that are different, but needs to be maintained as diff than aln that the tree has been run on
         avg_seqlen = sum(self.data.orig_seqlen) / len(self.data.orig_seqlen)  # HMMMMMMMM
         assert self.config.seq_len_perc <= 1
         seq_len_cutoff = avg_seqlen * self.config.seq_len_perc
-        for gb_id, seq in self.new_seqs.items():
+        if num_processes is None:
+            num_processes = self.config.num_processes
+        relations = None
+        otu_of_acc = {}  # gb_id: otu_id of the new seqs that were passed to seq_dict_build
+        if num_processes is not None and num_processes > 1:
+            rel_seqs = dict((("aln", label), seq) for label, seq in tmp_dict.items())
+            for gb_id, seq in self.new_seqs.iteritems():
+                if (self.blacklist is None or gb_id not in self.blacklist) and gb_id not in self.newseqs_acc \
+                        and len(seq.replace("-", "").replace("N", "")) > seq_len_cutoff:
+                    rel_seqs[("new", gb_id)] = seq
+            queries = [key for key in rel_seqs if key[0] == "new"]
+            relations = containment.precompute_related(rel_seqs, queries, num_processes)
+
+        def related_labels(gb_id):
+            """labels in tmp_dict that are related to gb_id, None without precomputed relations"""
+            if relations is None:
+                return None
+            return set(key[1] if key[0] == "aln" else otu_of_acc.get(key[1]) for key in relations[("new", gb_id)])
+
+        for gb_id, seq in self.new_seqs.iteritems():
             if gb_id.split(".") == 1:
                 debug(gb_id)
             if self.blacklist is not None and gb_id in self.blacklist:
@@ -2052,15 +2706,6 @@ class PhyscraperScrape(object):
                         tax_name = None
                         # ######################################################
                         # ### new implementation of rank for delimitation
-                        if type(self.mrca_ncbi) is int:
-                            mrca_ncbi = self.mrca_ncbi
-                        elif len(self.mrca_ncbi) == 1:
-                            mrca_ncbi = list(self.mrca_ncbi)[0]
-                        else:
-                            debug(self.mrca_ncbi)
-                            debug("think about something to do!")
-                        rank_mrca_ncbi = self.ids.ncbi_parser.get_rank(mrca_ncbi)
-                        # get rank to delimit seq to ingroup_mrca
                         # get name first
                         if gb_id[:6] == "unpubl":
                             debug("unpubl data")
@@ -2088,30 +2733,76 @@ class PhyscraperScrape(object):
                         assert tax_name is not None
                         assert ncbi_id is not None
                         tax_name = str(tax_name).replace(" ", "_")
-                        input_rank_id = self.ids.ncbi_parser.get_downtorank_id(ncbi_id, rank_mrca_ncbi)
                         # #######################################################
-                        if input_rank_id == mrca_ncbi:  # belongs to ingroup mrca -> add to data, if not, leave it out
+                        # most hits outside the ingroup were already dropped while reading the blast files
+                        # belongs to ingroup mrca -> add to data, if not, leave it out. None: the ncbi id is not
+                        # in the local taxonomy (see is_ingroup()), the sequence is kept
+                        if self.is_ingroup(ncbi_id) is not False:
                             # debug("input belongs to same mrca")
                             self.newseqs_acc.append(gb_id)
                             otu_id = self.data.add_otu(gb_id, self.ids)
-                            self.seq_dict_build(seq, otu_id, tmp_dict)
+                            self.seq_dict_build(seq, otu_id, tmp_dict, related_labels(gb_id))
+                            otu_of_acc[gb_id] = otu_id
                     else:
                         self.newseqs_acc.append(gb_id)
                         otu_id = self.data.add_otu(gb_id, self.ids)
-                        self.seq_dict_build(seq, otu_id, tmp_dict)
+                        self.seq_dict_build(seq, otu_id, tmp_dict, related_labels(gb_id))
+                        otu_of_acc[gb_id] = otu_id
         old_seqs_ids = set()
         for tax in old_seqs:
             old_seqs_ids.add(tax)
         assert old_seqs_ids.issubset(tmp_dict.keys())
+        if self.config.near_identical is not None:
+            self.collapse_near_identical(tmp_dict, [label for label in tmp_dict if label not in old_seqs_ids])
         for tax in old_seqs:
             del tmp_dict[tax]
-        self.new_seqs_otu_id = tmp_dict  # renamed new seq to their otu_ids from GI's, but all info is in self.otu_dict
+        # statuses were set by seq_dict_build()
+        self.data.remove_taxa(self._to_be_pruned, status=None)
+        self._to_be_pruned = []
+        # renamed new seq to their otu_ids from GI's, but all info is in self.otu_dict
+        self.new_seqs_otu_id = self.new_seqs.view(tmp_dict)
         debug("len new seqs dict after remove identical")
         debug(len(self.new_seqs_otu_id))
         with open(self.logfile, "a") as log:
             log.write("{} new sequences added from genbank after removing identical seq, "
                       "of {} before filtering\n".format(len(self.new_seqs_otu_id), len(self.new_seqs)))
-        self.data.dump()
+        self.data.checkpoint()
+
+    def collapse_near_identical(self, seq_dict, new_labels):
+        """Removes new sequences that are near-identical to a kept sequence of the same taxon.
+
+        The sequences of the alignment are always kept. The new ones are processed from long to short, they are
+        either collapsed into the most similar kept sequence of their taxon, or kept themselves.
+        The identity threshold is self.config.near_identical, see minhash.py. Taxon ids are compared as int
+        (taxon_id_as_int()), sequences without a numeric taxon id are kept and never collapsed.
+
+        :param seq_dict: the tmp_dict of remove_identical_seqs(), collapsed sequences are removed from it
+        :param new_labels: otu_ids of the new sequences in seq_dict
+        :return: number of collapsed sequences
+        """
+        collapser = minhash.NearIdenticalCollapser(self.config.near_identical)
+        new_labels = set(new_labels)
+        for label in seq_dict.keys():
+            if label not in new_labels:
+                taxon_id = taxon_id_as_int(self.get_sp_id_of_otulabel(label))
+                if taxon_id is not None:
+                    collapser.add_representative(label, taxon_id, seq_dict[label])
+        num_collapsed = 0
+        for label in sorted(new_labels, key=lambda item: (-len(seq_dict[item].replace("-", "")), item)):
+            taxon_id = taxon_id_as_int(self.get_sp_id_of_otulabel(label))
+            if taxon_id is None:
+                # unknown taxa are not collapsed into each other, the sequence is kept
+                continue
+            representative = collapser.assign(label, taxon_id, seq_dict[label])
+            if representative is not None:
+                del seq_dict[label]
+                self.data.otu_dict[label]['^physcraper:status'] = "not added, near-identical to {}".format(
+                    representative)
+                num_collapsed += 1
+        with open(self.logfile, "a") as log:
+            log.write("{} new sequences not added, near-identical (>= {}) to a sequence of the same "
+                      "taxon\n".format(num_collapsed, self.config.near_identical))
+        return num_collapsed
 
     def find_otudict_gi(self):
         """Used to find seqs that were added twice. Debugging function.
@@ -2136,6 +2827,16 @@ class PhyscraperScrape(object):
             ofi = open("{}/scrape_checkpoint.p".format(self.workdir), "wb")
         pickle.dump(self, ofi)
 
+    def checkpoint(self, path=None):
+        """Writes the class, including data and ids, as checkpoint directory, see checkpoint.py.
+
+        :param path: optional, checkpoint directory, default is workdir/scrape_checkpoint
+        :return: writes the checkpoint, load it with checkpoint.Checkpoint(path).scraper
+        """
+        if path is None:
+            path = "{}/scrape_checkpoint".format(self.workdir)
+        checkpoint.save(path, None, scraper=self)
+
     def write_query_seqs(self):
         """writes out the query sequence file"""
         debug("write query seq")
@@ -2188,9 +2889,16 @@ class PhyscraperScrape(object):
                 # Something else went wrong while trying to run `wget`
                 raise
         os.chdir(cwd)
-        assert os.path.exists(path="{}/papara_alignment.{}".format(self.workdir, papara_runname))
-        self.data.aln = DnaCharacterMatrix.get(path="{}/papara_alignment."
-                                                    "{}".format(self.workdir, papara_runname), schema="phylip")
+        papara_aln = "{}/papara_alignment.{}".format(self.workdir, papara_runname)
+        assert os.path.exists(path=papara_aln)
+        if getattr(self.data, "aln_memmap", None):
+            if isinstance(self.data.aln, aln_memmap.MemmapDnaMatrix):
+                self.data.aln.close()  # the file is written again
+            self.data.aln = aln_memmap.MemmapDnaMatrix.from_seqs(self.data.aln_memmap,
+                                                                 aln_io.read_alignment(papara_aln, "phylip",
+                                                                                       replace=()))
+        else:
+            self.data.aln = aln_io.read_matrix(papara_aln, "phylip", replace=())
         self.data.aln.taxon_namespace.is_mutable = True  # Was too strict...
         if _VERBOSE:
             sys.stdout.write("Papara done")
@@ -2203,14 +2911,16 @@ class PhyscraperScrape(object):
         """Sometimes there were alien entries in self.tre and self.aln.
 
         This function ensures they are properly removed."""
-        for tax_lab in self.data.aln.taxon_namespace:
-            if tax_lab not in self.data.tre.taxon_namespace:
-                sys.stderr.write("tax {} not in tre. This is an alien name in the data.\n".format(tax_lab))
-                self.data.remove_taxa_aln_tre(tax_lab)
-        for tax_lab in self.data.tre.taxon_namespace:
-            if tax_lab not in self.data.aln.taxon_namespace:
-                sys.stderr.write("tax {} not in aln. This is an alien name in the data.\n".format(tax_lab))
-                self.data.remove_taxa_aln_tre(tax_lab)
+        aln_labels = self.data.taxa_by_label()
+        tre_labels = self.data.taxa_by_label(self.data.tre.taxon_namespace)
+        aliens = []
+        for tax_lab in sorted(set(aln_labels) - set(tre_labels)):
+            sys.stderr.write("tax {} not in tre. This is an alien name in the data.\n".format(tax_lab))
+            aliens.append(tax_lab)
+        for tax_lab in sorted(set(tre_labels) - set(aln_labels)):
+            sys.stderr.write("tax {} not in aln. This is an alien name in the data.\n".format(tax_lab))
+            aliens.append(tax_lab)
+        self.data.remove_taxa(aliens)
         self.data.prune_short()
 
     def place_query_seqs(self):
@@ -2373,12 +3083,13 @@ class PhyscraperScrape(object):
         Note, that seq that were not added because they were similar to the one being removed here, are lost
         (that should not be a major issue though, as in a new blast_run, new seqs from the taxon can be added.)
         """
+        blacklisted = []
         for tax in self.data.aln.taxon_namespace:
             gi_id = self.data.otu_dict[tax.label].get("^ncbi:gi")
             acc = self.data.otu_dict[tax.label].get("^ncbi:accession")
             if gi_id in self.blacklist or acc in self.blacklist:
-                self.data.remove_taxa_aln_tre(tax.label)
-                self.data.otu_dict[tax.label]['^physcraper:status'] = "deleted, Genbank identifier is part of blacklist"
+                blacklisted.append(tax.label)
+        self.data.remove_taxa(blacklisted, status="deleted, Genbank identifier is part of blacklist")
         self.data.prune_short()
         debug(self.data.tre.as_string(schema='newick'))
 
@@ -2425,24 +3136,31 @@ class PhyscraperScrape(object):
                 os.rename("{}/{}".format(self.workdir, self.newseqs_file),
                           "{}/previous_run/newseqs.fasta".format(self.workdir))
                 self.data.write_labelled(label='^ot:ottTaxonName', add_gb_id=True)
-                self.data.write_otus("otu_info", schema='table')
-                self.new_seqs = {}  # Wipe for next run
-                self.new_seqs_otu_id = {}
+                self.new_seqs = self.new_seqs.view()  # Wipe for next run, sequences stay in self.seq_file
+                self.new_seqs_otu_id = self.new_seqs.view()
                 self.repeat = 1
             else:
                 if _VERBOSE:
                     sys.stdout.write("No new sequences after filtering.\n")
                 self.repeat = 0
-                self.calculate_bootstrap()
         else:
             if _VERBOSE:
                 sys.stdout.write("No new sequences found.\n")
             self.repeat = 0
-            self.calculate_bootstrap()
+        if self.repeat == 0:
+            if self._blast_postponed > 0:
+                # the blast budget postponed searches, the run continues until they are done
+                with open(self.logfile, "a") as log:
+                    log.write("No new sequences, {} postponed blast searches remain\n".format(self._blast_postponed))
+                self.repeat = 1
+            else:
+                self.calculate_bootstrap()
         self.reset_markers()
         local_blast.del_blastfiles(self.workdir)  # delete local blast db
-        self.data.dump()
-        json.dump(self.data.otu_dict, open('{}/otu_dict.json'.format(self.workdir), 'wb'))
+        self.data.checkpoint()  # the changes of the otu_dict are appended to the journal
+        if self.repeat == 0:  # the complete otu_dict is only exported at the end of the run
+            self.data.write_otus("otu_info", schema='table')
+            json.dump(self.data.otu_dict, open('{}/otu_dict.json'.format(self.workdir), 'w'), default=records.to_dict)
 
     def write_unpubl_blastdb(self, path_to_local_seq):
         """Adds local sequences into a  local blast database, which then can be used to blast aln seq against it
@@ -2504,15 +3222,18 @@ class FilterBlast(PhyscraperScrape):
         self.sp_seq_d: dictionary
 
                 key = species name/id
-                value = dictionary (Is overwritten every 'round')
+                value = SeqStore, dictionary-like (Is overwritten every 'round')
 
                     key = otuID
                     value = seq.
-        self.filtered_seq: dictionary. Is used as the self.new_seqs equivalent from Physcraper, just with fewer seqs. Is overwritten every 'round'
+        self.filtered_seq: SeqStore, dictionary-like. Is used as the self.new_seqs equivalent from Physcraper, just with fewer seqs. Is overwritten every 'round'
 
                 key = otuID,
                 val = seq.
         self.downtorank: optional string defining the level of taxonomic filtering, e.g. "species", "genus"
+        self._aln_name_index: dictionary, key: taxon name (find_name()) of the otu_dict entry,
+                value = list of the Taxon objects of the alignment rows with that name.
+                Built once per filtering round by aln_taxa_of_name(), see sp_dict() and replace_new_seq().
     """
     def __init__(self, data_obj, ids, settings=None):
         super(FilterBlast, self).__init__(data_obj, ids)
@@ -2520,8 +3241,9 @@ class FilterBlast(PhyscraperScrape):
         # additional things that are needed for the filtering process
         self.sp_d = {}
         self.sp_seq_d = {}
-        self.filtered_seq = {}
+        self.filtered_seq = self.new_seqs.view()
         self.downtorank = None
+        self._aln_name_index = None
 
     def add_setting_to_self(self, downtorank, threshold):
         """
@@ -2550,6 +3272,7 @@ class FilterBlast(PhyscraperScrape):
         self.downtorank = downtorank
         debug("make sp_dict")
         self.sp_d = {}
+        self._aln_name_index = None  # new filtering round
         for key in self.data.otu_dict:
             if self.data.otu_dict[key]['^physcraper:status'].split(' ')[0] not in self.seq_filter:
                 tax_name = self.ids.find_name(sp_dict=self.data.otu_dict[key])
@@ -2605,6 +3328,23 @@ class FilterBlast(PhyscraperScrape):
                     self.sp_d[tax_id] = [self.data.otu_dict[key]]
         return self.sp_d
 
+    def aln_taxa_of_name(self, tax_name):
+        """Alignment rows of a taxon name, replaces the loops over the whole alignment for every otu of sp_d.
+
+        The index of all rows is built at the first call of a filtering round, with one find_name() per row.
+        The alignment does not change during a round, sp_dict() and replace_new_seq() start a new one.
+
+        :param tax_name: taxon name, as returned by self.ids.find_name()
+        :return: list of Taxon objects of self.data.aln, in alignment order
+        """
+        if getattr(self, "_aln_name_index", None) is None:
+            self._aln_name_index = {}
+            for taxon in self.data.aln:
+                otu_dict_name = self.ids.find_name(sp_dict=self.data.otu_dict[taxon.label])
+                self._aln_name_index.setdefault(otu_dict_name, []).append(taxon)
+            debug("aln name index: {} names".format(len(self._aln_name_index)))
+        return self._aln_name_index.get(tax_name, [])
+
     def make_sp_seq_dict(self):
         """Uses the sp_d to make a dict with species names as key1, key2 is gb_id/sp.name and value is seq
 
@@ -2620,7 +3360,7 @@ class FilterBlast(PhyscraperScrape):
         for key in self.sp_d:
             # loop to populate dict. key1 = sp name, key2= gb id, value = seq,
             # number of items in key2 will be filtered according to threshold and already present seq
-            seq_d = {}
+            seq_d = self.new_seqs.view()
             for otu_id in self.sp_d[key]:
                 # following if statement should not be necessary as it is already filtered in the step before.
                 # I leave it in for now.
@@ -2630,12 +3370,10 @@ class FilterBlast(PhyscraperScrape):
                     # which will have the gi (int). This differentiation is needed in the filtering blast step.
                     if otu_id['^physcraper:last_blasted'] != '1800/01/01':
                         tax_name = self.ids.find_name(sp_dict=otu_id)
-                        for user_name_aln, seq in self.data.aln.items():
-                            otu_dict_label = self.ids.find_name(sp_dict=self.data.otu_dict[user_name_aln.label])
-                            if tax_name == otu_dict_label:
-                                seq = seq.symbols_as_string().replace("-", "")
-                                seq = seq.replace("?", "")
-                                seq_d[user_name_aln.label] = seq
+                        for user_name_aln in self.aln_taxa_of_name(tax_name):
+                            seq = self.data.aln[user_name_aln].symbols_as_string().replace("-", "")
+                            seq = seq.replace("?", "")
+                            seq_d[user_name_aln.label] = seq
                     else:
                         if '^ncbi:accession' in otu_id:  # this should not be needed: all new blast seq have gb_id
                             gb_id = otu_id['^ncbi:accession']
@@ -2772,10 +3510,9 @@ class FilterBlast(PhyscraperScrape):
         for otu_id in self.sp_d[key]:
             tax_name = self.ids.find_name(sp_dict=otu_id)
             if '^physcraper:status' in otu_id and otu_id['^physcraper:status'].split(' ')[0] not in self.seq_filter:
-                for tax_name_aln, seq in self.data.aln.items():
-                    otu_dict_name = self.ids.find_name(sp_dict=self.data.otu_dict[tax_name_aln.label])
-                    if tax_name == otu_dict_name:
-                        nametoreturn = tax_name_aln.label
+                aln_taxa = self.aln_taxa_of_name(tax_name)
+                if aln_taxa:
+                    nametoreturn = aln_taxa[-1].label
             assert tax_name is not None  # assert instead of if
             if nametoreturn is None and tax_name is not None:
                 nametoreturn = tax_name.replace(" ", "_")
@@ -2798,12 +3535,10 @@ class FilterBlast(PhyscraperScrape):
             if '^physcraper:status' in otu_id and otu_id['^physcraper:status'].split(' ')[0] not in self.seq_filter:
                 if otu_id['^physcraper:last_blasted'] != '1800/01/01':  # old seq
                     tax_name = self.ids.find_name(sp_dict=otu_id)
-                    for tax_name_aln, seq in self.data.aln.items():
-                        otu_dict_name = self.ids.find_name(sp_dict=self.data.otu_dict[tax_name_aln.label])
-                        if tax_name == otu_dict_name:
-                            # debug(otu_dict_name)
-                            filename = nametoreturn
-                            local_blast.write_filterblast_files(self.workdir, tax_name_aln.label, seq, fn=nametoreturn)
+                    for tax_name_aln in self.aln_taxa_of_name(tax_name):
+                        filename = nametoreturn
+                        seq = self.data.aln[tax_name_aln]
+                        local_blast.write_filterblast_files(self.workdir, tax_name_aln.label, seq, fn=nametoreturn)
                 else:
                     if '^ncbi:accession' in otu_id:
                         gb_id = otu_id['^ncbi:accession']
@@ -2950,16 +3685,17 @@ class FilterBlast(PhyscraperScrape):
                         reduced_new_seqs_dic[key] = self.filtered_seq[gb_id]
                         self.data.otu_dict[key]['^physcraper:last_blasted'] = "1900/01/01"
                         self.data.otu_dict[key]['^physcraper:status'] = 'added, as representative of taxon'
-        reduced_new_seqs = {k: self.filtered_seq[k] for k in keylist}
+        reduced_new_seqs = self.filtered_seq.subset(keylist)
         # debug(reduced_new_seqs_dic)
         with open(self.logfile, "a") as log:
             log.write("{} sequences added after filtering, of {} before filtering\n".format(len(reduced_new_seqs_dic),
                                                                                             len(self.new_seqs_otu_id)))
-        self.new_seqs = deepcopy(reduced_new_seqs)
-        self.new_seqs_otu_id = deepcopy(reduced_new_seqs_dic)
+        self.new_seqs = reduced_new_seqs
+        self.new_seqs_otu_id = self.new_seqs.view(reduced_new_seqs_dic)
         # set back to empty dict
         self.sp_d.clear()
         self.filtered_seq.clear()
+        self._aln_name_index = None
         return
 
     def write_otu_info(self, downtorank=None):
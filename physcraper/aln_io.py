@@ -0,0 +1,154 @@
+"""Streaming readers for the alignments physcraper reads: the input alignment (generate_ATT_from_files) and the
+papara output (PhyscraperScrape.align_query_seqs).
+
+The files are parsed line by line into tuples of (label, sequence string), characters are replaced while
+reading (e.g. '?' by '-', papara handles them as different characters). No normalized copy of the file is
+written and the sequences are not parsed by the dendropy readers. to_matrix() builds the DnaCharacterMatrix
+that AlignTreeTax uses, the sequences can also go directly to MemmapDnaMatrix.from_seqs() or AlnMatrix.
+
+Supported are FASTA and relaxed, sequential PHYLIP (label and sequence separated by whitespace, the sequence
+may continue on the next lines), as written by papara and AlignTreeTax.write_papara_files().
+Other schemas are read with dendropy, from the replaced file content in memory.
+
+Note: has test, test_aln_io.py
+"""
+
+import sys
+from collections import OrderedDict
+
+from dendropy import DnaCharacterMatrix
+
+_DEBUG_MK = 0
+
+MISSING_TO_GAP = (("?", "-"),)  # papara handles '?' and '-' as different characters
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def _replace(text, replace):
+    for old, new in replace:
+        text = text.replace(old, new)
+    return text
+
+
+def _seq(line, replace):
+    """sequence part of a line, without whitespace and with the characters replaced"""
+    return _replace("".join(line.split()), replace)
+
+
+def read_fasta(path, replace=MISSING_TO_GAP):
+    """Reads a FASTA file one line at a time.
+
+    :param path: path to the alignment
+    :param replace: tuple of (old, new) characters that are replaced in the sequences
+    :return: generator of tuples (label, sequence)
+    """
+    label = None
+    parts = []
+    with open(path, "r") as infile:
+        for line in infile:
+            if line.startswith(">"):
+                if label is not None:
+                    yield label, "".join(parts)
+                label = line[1:].strip()
+                parts = []
+            elif line.strip():
+                if label is None:
+                    sys.stderr.write("{} does not start with a '>' label line\n".format(path))
+                    raise ValueError(path)
+                parts.append(_seq(line, replace))
+    if label is not None:
+        yield label, "".join(parts)
+
+
+def read_phylip(path, replace=MISSING_TO_GAP):
+    """Reads a relaxed, sequential PHYLIP file one line at a time.
+
+    :param path: path to the alignment
+    :param replace: tuple of (old, new) characters that are replaced in the sequences
+    :return: generator of tuples (label, sequence)
+    """
+    with open(path, "r") as infile:
+        header = infile.readline().split()
+        if len(header) < 2:
+            sys.stderr.write("{} has no PHYLIP header line 'ntax nchar'\n".format(path))
+            raise ValueError(path)
+        ntax, nchar = int(header[0]), int(header[1])
+        num = 0
+        label = None
+        parts = []
+        length = 0
+        for line in infile:
+            if not line.strip():
+                continue
+            if label is None:
+                fields = line.strip().split(None, 1)
+                label = fields[0]
+                line = fields[1] if len(fields) > 1 else ""
+            seq = _seq(line, replace)
+            parts.append(seq)
+            length += len(seq)
+            if length >= nchar:
+                yield label, "".join(parts)
+                num += 1
+                label = None
+                parts = []
+                length = 0
+        if label is not None:
+            sys.stderr.write("sequence of {} in {} is shorter than {}\n".format(label, path, nchar))
+            raise ValueError(path)
+        if num != ntax:
+            sys.stderr.write("{} has {} sequences, the header says {}\n".format(path, num, ntax))
+            raise ValueError(path)
+
+
+def read_alignment(path, schema, replace=MISSING_TO_GAP):
+    """Reads the sequences of an alignment file.
+
+    :param path: path to the alignment
+    :param schema: format of the alignment, "fasta" and "phylip" are streamed, others are read with dendropy
+    :param replace: tuple of (old, new) characters that are replaced in the sequences
+    :return: iterable of tuples (label, sequence)
+    """
+    if schema == "fasta":
+        return read_fasta(path, replace)
+    if schema == "phylip":
+        return read_phylip(path, replace)
+    debug("read {} with dendropy".format(schema))
+    with open(path, "r") as infile:
+        aln = DnaCharacterMatrix.get(data=_replace(infile.read(), replace), schema=schema)
+    return [(taxon.label, seq.symbols_as_string()) for taxon, seq in aln.items()]
+
+
+def to_matrix(seqs, taxon_namespace=None):
+    """Builds a DnaCharacterMatrix, the rows are in the order of seqs.
+
+    :param seqs: iterable of tuples (label, sequence), e.g. from read_alignment()
+    :param taxon_namespace: optional, taxon namespace of the matrix
+    :return: DnaCharacterMatrix
+    """
+    ordered = OrderedDict()
+    for label, seq in seqs:
+        if label in ordered:
+            sys.stderr.write("{} is more than once in the alignment\n".format(label))
+            raise ValueError(label)
+        ordered[label] = seq
+    if taxon_namespace is None:
+        return DnaCharacterMatrix.from_dict(ordered)
+    return DnaCharacterMatrix.from_dict(ordered, taxon_namespace=taxon_namespace)
+
+
+def read_matrix(path, schema, replace=MISSING_TO_GAP):
+    """read_alignment() and to_matrix() in one.
+
+    :param path: path to the alignment
+    :param schema: format of the alignment
+    :param replace: tuple of (old, new) characters that are replaced in the sequences
+    :return: DnaCharacterMatrix
+    """
+    return to_matrix(read_alignment(path, schema, replace))
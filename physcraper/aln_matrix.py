@@ -0,0 +1,165 @@
+"""uint8 matrix of an alignment, used by AlignTreeTax for the column and row statistics of trim() and prune_short().
+
+Reading the alignment through the dendropy state objects (self.aln[tax][i].label) is slow on large alignments.
+Each row is read once with symbols_as_string() and stored as bytes in a numpy matrix (rows in the order of the
+labels), gap and length statistics are then computed with numpy.
+
+The number of bases per column and the ungapped length per row are kept up to date when sequences are removed
+(remove()) or the alignment is trimmed (slice()), so they are not recomputed from the full matrix.
+AlignTreeTax keeps one AlnMatrix per alignment object, see AlignTreeTax.aln_matrix(). For very large alignments
+the sequences can be kept on disk instead of the dendropy matrix, the MemmapAlignment of the file then also
+provides the statistics (see aln_memmap.py).
+
+Note: has test, test_aln_matrix.py
+"""
+
+from physcraper import lazy_import
+
+numpy = lazy_import.module("numpy")
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+GAP = ord("-")
+MISSING = ord("?")
+
+
+def encode(seq):
+    """sequence as numpy uint8 array"""
+    return numpy.frombuffer(seq.encode("ascii"), dtype=numpy.uint8)
+
+
+class AlnMatrix(object):
+    """Alignment as numpy uint8 matrix.
+
+    Rows of different length (unaligned input) are padded with gaps, aligned is then False.
+
+    :param labels: list of taxon labels, one per row
+    :param seqs: list of sequences as strings, in the order of labels
+    """
+
+    def __init__(self, labels, seqs):
+        self.labels = list(labels)
+        self.rows = dict((label, pos) for pos, label in enumerate(self.labels))
+        self.seq_lengths = [len(seq) for seq in seqs]  # with gaps, as in the input
+        self.aligned = len(set(self.seq_lengths)) <= 1
+        num_cols = max(self.seq_lengths) if self.seq_lengths else 0
+        self.matrix = numpy.full((len(self.labels), num_cols), GAP, dtype=numpy.uint8)
+        for pos, seq in enumerate(seqs):
+            self.matrix[pos, :len(seq)] = encode(seq)
+        self.present = numpy.ones(len(self.labels), dtype=bool)  # False for removed rows
+        bases = ~self.gaps()
+        self._col_counts = bases.sum(axis=0)
+        self._row_lens = bases.sum(axis=1)
+        self.source = None  # the alignment object the matrix belongs to, set by AlignTreeTax.aln_matrix()
+
+    @classmethod
+    def from_aln(cls, aln):
+        """Builds the matrix of a dendropy DnaCharacterMatrix.
+
+        :param aln: DnaCharacterMatrix
+        :return: AlnMatrix
+        """
+        labels = []
+        seqs = []
+        for taxon, seq in aln.items():
+            labels.append(taxon.label)
+            seqs.append(seq.symbols_as_string())
+        return cls(labels, seqs)
+
+    def num_cols(self):
+        """number of columns"""
+        return self.matrix.shape[1]
+
+    def gaps(self):
+        """:return: boolean matrix, True for gaps and missing data"""
+        return (self.matrix == GAP) | (self.matrix == MISSING)
+
+    def num_rows(self):
+        """number of sequences, without the removed ones"""
+        return len(self.rows)
+
+    def col_counts(self):
+        """:return: array with the number of sequences that have a base in each column"""
+        return self._col_counts.copy()
+
+    def row_lengths(self, ignore=("-", "?")):
+        """Lengths of the sequences without gaps.
+
+        :param ignore: characters that are not counted, the lengths without gaps and missing data are kept up to
+                       date, all others are computed from the matrix
+        :return: dict, key: label, value: length
+        """
+        if tuple(sorted(ignore)) == ("-", "?"):
+            lengths = self._row_lens
+        else:
+            counted = numpy.ones(self.matrix.shape, dtype=bool)
+            for char in ignore:
+                counted &= self.matrix != ord(char)
+            lengths = counted.sum(axis=1)
+        return dict((label, int(lengths[pos])) for label, pos in self.rows.items())
+
+    def remove(self, label):
+        """Removes the row of a sequence from the statistics, O(columns).
+
+        :param label: taxon label
+        """
+        pos = self.rows.pop(label)
+        self.present[pos] = False
+        row = self.matrix[pos]
+        self._col_counts -= (row != GAP) & (row != MISSING)
+        if len(self.rows) < len(self.labels) // 2:
+            self._compact()
+
+    def _compact(self):
+        """drops the removed rows from the matrix"""
+        keep = numpy.flatnonzero(self.present)
+        self.matrix = self.matrix[keep]
+        self._row_lens = self._row_lens[keep]
+        self.labels = [self.labels[pos] for pos in keep]
+        self.seq_lengths = [self.seq_lengths[pos] for pos in keep]
+        self.rows = dict((label, pos) for pos, label in enumerate(self.labels))
+        self.present = numpy.ones(len(self.labels), dtype=bool)
+
+    def slice(self, start, stop):
+        """Keeps only the columns start to stop (exclusive), as AlignTreeTax.trim() does with the alignment.
+
+        :param start: first column
+        :param stop: column after the last one
+        """
+        for cut in (self.matrix[:, :start], self.matrix[:, stop:]):
+            self._row_lens = self._row_lens - ((cut != GAP) & (cut != MISSING)).sum(axis=1)
+        self.matrix = self.matrix[:, start:stop].copy()
+        self._col_counts = self._col_counts[start:stop].copy()
+        self.seq_lengths = [self.matrix.shape[1]] * len(self.labels)
+
+    def trim_bounds(self, taxon_missingness):
+        """First and last column that have a base in enough sequences, see AlignTreeTax.trim().
+
+        :param taxon_missingness: maximal fraction of sequences that have a gap in the first/last column
+        :return: tuple (start, stop), stop is exclusive. (0, num_cols) if no column qualifies.
+        """
+        return trim_bounds(self._col_counts, self.num_rows(), taxon_missingness)
+
+
+def trim_bounds(col_counts, num_rows, taxon_missingness):
+    """First and last column that have a base in enough sequences, used by AlnMatrix and MemmapAlignment.
+
+    :param col_counts: array with the number of sequences that have a base in each column
+    :param num_rows: number of sequences
+    :param taxon_missingness: maximal fraction of sequences that have a gap in the first/last column
+    :return: tuple (start, stop), stop is exclusive. (0, num_cols) if no column qualifies.
+    """
+    cutoff = num_rows * taxon_missingness
+    num_gaps = num_rows - col_counts
+    keep = numpy.flatnonzero(num_gaps <= cutoff)
+    if len(keep) == 0:
+        return 0, len(col_counts)
+    return int(keep[0]), int(keep[-1]) + 1
@@ -0,0 +1,492 @@
+"""Alignment stored as memory-mapped byte matrix on disk, for alignments with tens of thousands of sequences.
+
+The sequences are kept in a numpy.memmap file (one row of bytes per sequence, padded with gaps), only the labels
+and the per-row and per-column counts are kept in memory. The operating system keeps only the parts of the
+file in memory that are used, resident memory does not grow with the size of the alignment.
+
+MemmapAlignment has the interface of AlnMatrix (aln_matrix.py), used by AlignTreeTax.trim() and prune_short(),
+and additionally the row access, appending of rows and writing of the alignment as FASTA or PHYLIP.
+
+MemmapDnaMatrix wraps a MemmapAlignment in the part of the dendropy DnaCharacterMatrix interface that physcraper
+uses. If the config option aln_memmap is set, AlignTreeTax.use_memmap() replaces self.aln by a MemmapDnaMatrix:
+the dendropy matrix is not kept, the papara alignment is streamed into the file (aln_io.read_alignment()),
+trim() cuts the columns in the file and the alignment files for papara and raxml are written from it.
+
+The matrix is written to path, the labels and sizes to path.json (see flush()). Pickles refer to the file.
+
+Note: has test, test_aln_memmap.py
+"""
+
+import os
+import sys
+import json
+import binascii
+
+from dendropy import TaxonNamespace
+
+from physcraper import lazy_import
+from physcraper import aln_matrix
+from physcraper.aln_matrix import GAP, MISSING, encode
+
+numpy = lazy_import.module("numpy")
+
+_DEBUG_MK = 0
+
+if sys.version_info < (3,):
+    _STRING_TYPES = (str, unicode)
+else:
+    _STRING_TYPES = (str,)
+
+CHUNK_ROWS = 1024  # rows that are processed at once when the whole matrix is read
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def _bases(rows):
+    """boolean array, True for bases (not gap or missing data)"""
+    return (rows != GAP) & (rows != MISSING)
+
+
+class MemmapAlignment(object):
+    """Alignment in a memory-mapped file.
+
+    Removed rows stay in the file until the alignment is written again (e.g. by from_seqs()), only the label
+    is dropped.
+
+    :param path: path of the matrix file, is created (or overwritten) if num_cols is given
+    :param num_cols: number of alignment columns of a new file, None opens an existing file
+    :param capacity: number of rows the new file has space for, it is enlarged when needed
+    """
+
+    def __init__(self, path, num_cols=None, capacity=1024):
+        self.path = os.path.abspath(path)
+        self.source = None  # the alignment object the matrix belongs to, set by AlignTreeTax.aln_matrix()
+        if num_cols is not None:
+            self.file_id = binascii.hexlify(os.urandom(8)).decode("ascii")  # changes when the file is written again
+            self.version = 0  # number of flush() calls
+            self.labels = []  # label per row of the file, None for removed rows
+            self.seq_lengths = []  # length of the rows with gaps, as appended
+            self._num_cols = num_cols
+            self.stride = max(num_cols, 1)  # columns in the file
+            self.capacity = max(capacity, 1)
+            with open(self.path, "wb") as outfile:
+                outfile.truncate(self.capacity * self.stride)
+            self._map()
+            self.matrix[:] = GAP
+            self._col_counts = numpy.zeros(num_cols, dtype=numpy.int64)
+            self._row_lens = numpy.zeros(self.capacity, dtype=numpy.int64)
+        else:
+            with open("{}.json".format(self.path)) as infile:
+                index = json.load(infile)
+            self.file_id = index.get("file_id")
+            self.version = index.get("version", 0)
+            self.labels = index["labels"]
+            self.seq_lengths = index["seq_lengths"]
+            self._num_cols = index["num_cols"]
+            self.stride = index["stride"]
+            self.capacity = index["capacity"]
+            self._map()
+            self._count()
+        self.rows = dict((label, pos) for pos, label in enumerate(self.labels) if label is not None)
+
+    def __getstate__(self):
+        """Pickling: the matrix stays in the file, only the labels and sizes are pickled (see flush())."""
+        self.flush()
+        state = dict(self.__dict__)
+        for attr in ["matrix", "_col_counts", "_row_lens", "rows"]:
+            state.pop(attr, None)
+        return state
+
+    def __setstate__(self, state):
+        """Unpickling: the file is mapped again, it must not have changed since the object was pickled."""
+        self.__dict__.update(state)
+        with open("{}.json".format(self.path)) as infile:
+            index = json.load(infile)
+        if (index.get("file_id"), index.get("version")) != (self.file_id, self.version):
+            sys.stderr.write("{} was changed after the alignment was pickled\n".format(self.path))
+            raise ValueError(self.path)
+        self._map()
+        self._count()
+        self.rows = dict((label, pos) for pos, label in enumerate(self.labels) if label is not None)
+
+    def _map(self):
+        self.matrix = numpy.memmap(self.path, dtype=numpy.uint8, mode="r+", shape=(self.capacity, self.stride))
+
+    def _count(self):
+        """computes the column and row counts, reading CHUNK_ROWS rows at a time"""
+        self._col_counts = numpy.zeros(self._num_cols, dtype=numpy.int64)
+        self._row_lens = numpy.zeros(self.capacity, dtype=numpy.int64)
+        for start in range(0, len(self.labels), CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, len(self.labels))
+            bases = _bases(self.matrix[start:stop, :self._num_cols])
+            present = numpy.array([label is not None for label in self.labels[start:stop]])
+            self._row_lens[start:stop] = bases.sum(axis=1)
+            self._col_counts += bases[present].sum(axis=0)
+
+    @classmethod
+    def from_seqs(cls, path, seqs, num_cols=None):
+        """Writes sequences to a new file.
+
+        :param path: path of the matrix file
+        :param seqs: iterable of tuples (label, sequence), is read once
+        :param num_cols: optional, number of columns, default is the length of the first sequence
+        :return: MemmapAlignment
+        """
+        alignment = None
+        for label, seq in seqs:
+            if alignment is None:
+                alignment = cls(path, num_cols if num_cols is not None else len(seq))
+            alignment.append(label, seq)
+        if alignment is None:
+            alignment = cls(path, num_cols or 0)
+        alignment.flush()
+        return alignment
+
+    @property
+    def aligned(self):
+        """False if sequences of different length were added"""
+        return all(length == self._num_cols for pos, length in enumerate(self.seq_lengths)
+                   if self.labels[pos] is not None)
+
+    def num_cols(self):
+        """number of columns"""
+        return self._num_cols
+
+    def num_rows(self):
+        """number of sequences, without the removed ones"""
+        return len(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, label):
+        return label in self.rows
+
+    def __iter__(self):
+        return (label for label in self.labels if label is not None)
+
+    def __getitem__(self, label):
+        """sequence of a label, as string"""
+        seq = self.matrix[self.rows[label], :self._num_cols].tobytes()
+        if str is not bytes:
+            seq = seq.decode("ascii")
+        return seq
+
+    def _reserve(self, num_rows, num_cols):
+        """Enlarges the file to num_rows rows of num_cols columns."""
+        if num_cols > self.stride:
+            # rows get longer, the matrix is copied to a new file
+            tmp_path = "{}.tmp".format(self.path)
+            capacity = max(self.capacity, num_rows)
+            with open(tmp_path, "wb") as outfile:
+                outfile.truncate(capacity * num_cols)
+            new = numpy.memmap(tmp_path, dtype=numpy.uint8, mode="r+", shape=(capacity, num_cols))
+            new[:] = GAP
+            for start in range(0, len(self.labels), CHUNK_ROWS):
+                stop = min(start + CHUNK_ROWS, len(self.labels))
+                new[start:stop, :self.stride] = self.matrix[start:stop]
+            new.flush()
+            del new
+            del self.matrix
+            os.rename(tmp_path, self.path)
+            self.stride = num_cols
+            self.capacity = capacity
+            self._map()
+            self._row_lens = numpy.resize(self._row_lens, capacity)
+        elif num_rows > self.capacity:
+            capacity = max(num_rows, 2 * self.capacity)
+            self.matrix.flush()
+            del self.matrix
+            with open(self.path, "r+b") as outfile:
+                outfile.truncate(capacity * self.stride)
+            old_capacity = self.capacity
+            self.capacity = capacity
+            self._map()
+            self.matrix[old_capacity:] = GAP
+            self._row_lens = numpy.resize(self._row_lens, capacity)
+
+    def append(self, label, seq):
+        """Adds a sequence as new row, e.g. after papara aligned the new sequences.
+
+        Longer sequences than num_cols() add columns, shorter ones are padded with gaps, aligned is then False.
+
+        :param label: taxon label, must not be in the alignment
+        :param seq: sequence as string
+        """
+        if label in self.rows:
+            sys.stderr.write("{} is already in the alignment {}\n".format(label, self.path))
+            raise ValueError(label)
+        pos = len(self.labels)
+        self._reserve(pos + 1, len(seq))
+        if len(seq) > self._num_cols:
+            self._col_counts = numpy.concatenate([self._col_counts,
+                                                  numpy.zeros(len(seq) - self._num_cols, dtype=numpy.int64)])
+            self._num_cols = len(seq)
+        row = encode(seq)
+        self.matrix[pos, :len(seq)] = row
+        bases = _bases(row)
+        self._col_counts[:len(seq)] += bases
+        self._row_lens[pos] = bases.sum()
+        self.labels.append(label)
+        self.seq_lengths.append(len(seq))
+        self.rows[label] = pos
+
+    def remove(self, label):
+        """Removes a sequence, O(columns).
+
+        :param label: taxon label
+        """
+        pos = self.rows.pop(label)
+        self.labels[pos] = None
+        self._col_counts -= _bases(self.matrix[pos, :self._num_cols])
+
+    def slice(self, start, stop):
+        """Keeps only the columns start to stop (exclusive), as AlignTreeTax.trim() does with the alignment.
+        The columns are moved to the start of the rows in the file, CHUNK_ROWS rows at a time.
+
+        :param start: first column
+        :param stop: column after the last one
+        """
+        for first in range(0, len(self.labels), CHUNK_ROWS):
+            last = min(first + CHUNK_ROWS, len(self.labels))
+            rows = numpy.array(self.matrix[first:last, :self._num_cols])
+            self._row_lens[first:last] -= _bases(rows[:, :start]).sum(axis=1) + _bases(rows[:, stop:]).sum(axis=1)
+            self.matrix[first:last, :stop - start] = rows[:, start:stop]
+            self.matrix[first:last, stop - start:] = GAP
+        self._col_counts = self._col_counts[start:stop].copy()
+        self._num_cols = stop - start
+        self.seq_lengths = [self._num_cols] * len(self.labels)
+
+    def col_counts(self):
+        """:return: array with the number of sequences that have a base in each column"""
+        return self._col_counts.copy()
+
+    def row_lengths(self, ignore=("-", "?")):
+        """Lengths of the sequences without gaps.
+
+        :param ignore: characters that are not counted, the lengths without gaps and missing data are kept up to
+                       date, all others are computed from the file
+        :return: dict, key: label, value: length
+        """
+        if tuple(sorted(ignore)) == ("-", "?"):
+            return dict((label, int(self._row_lens[pos])) for label, pos in self.rows.items())
+        lengths = {}
+        for start in range(0, len(self.labels), CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, len(self.labels))
+            rows = self.matrix[start:stop, :self._num_cols]
+            counted = numpy.ones(rows.shape, dtype=bool)
+            for char in ignore:
+                counted &= rows != ord(char)
+            counts = counted.sum(axis=1)
+            for pos in range(start, stop):
+                if self.labels[pos] is not None:
+                    lengths[self.labels[pos]] = int(counts[pos - start])
+        return lengths
+
+    def trim_bounds(self, taxon_missingness):
+        """see AlnMatrix.trim_bounds()"""
+        return aln_matrix.trim_bounds(self._col_counts, self.num_rows(), taxon_missingness)
+
+    def write(self, path, schema="fasta"):
+        """Writes the alignment, one sequence at a time.
+
+        :param path: output file
+        :param schema: "fasta" or "phylip"
+        """
+        assert schema in ["fasta", "phylip"]
+        with open(path, "w") as outfile:
+            if schema == "phylip":
+                outfile.write("{} {}\n".format(self.num_rows(), self._num_cols))
+            for label in self:
+                if schema == "phylip":
+                    outfile.write("{} {}\n".format(label, self[label]))
+                else:
+                    outfile.write(">{}\n{}\n".format(label, self[label]))
+
+    def flush(self):
+        """Writes the matrix to disk and the labels and sizes to path.json, open the file again with
+        MemmapAlignment(path)."""
+        self.matrix.flush()
+        self.version += 1
+        index = {"file_id": self.file_id,
+                 "version": self.version,
+                 "labels": self.labels,
+                 "seq_lengths": self.seq_lengths,
+                 "num_cols": self._num_cols,
+                 "stride": self.stride,
+                 "capacity": self.capacity}
+        with open("{}.json".format(self.path), "w") as outfile:
+            json.dump(index, outfile)
+
+    def close(self):
+        """Releases the memory map, e.g. before the file is written again. The object can not be used afterwards."""
+        if getattr(self, "matrix", None) is not None:
+            self.matrix.flush()
+        self.matrix = None
+
+
+class MemmapSequence(object):
+    """Sequence of one row of a MemmapDnaMatrix, read from the file when it is used.
+
+    :param alignment: MemmapAlignment
+    :param key: label of the row in alignment
+    """
+
+    def __init__(self, alignment, key):
+        self.alignment = alignment
+        self.key = key
+
+    def symbols_as_string(self, sep=""):
+        """sequence as string, as CharacterDataSequence.symbols_as_string()"""
+        seq = self.alignment[self.key]
+        if sep:
+            return sep.join(seq)
+        return seq
+
+    def __str__(self):
+        return self.symbols_as_string()
+
+    def __len__(self):
+        return self.alignment.num_cols()
+
+    def __getitem__(self, idx):
+        return self.symbols_as_string()[idx]
+
+
+class MemmapDnaMatrix(object):
+    """The part of the dendropy DnaCharacterMatrix interface that physcraper uses, with the sequences in a
+    MemmapAlignment.
+
+    The rows are found by Taxon as in the DnaCharacterMatrix, labels of the taxa can change (e.g. in
+    AlignTreeTax.write_labelled()). Iteration follows the order of the taxon namespace.
+
+    :param alignment: MemmapAlignment with the sequences
+    :param taxon_namespace: TaxonNamespace of the taxa, shared with the tree
+    :param keys: dictionary, key: Taxon, value: label of its row in alignment
+    """
+
+    def __init__(self, alignment, taxon_namespace, keys):
+        self.alignment = alignment
+        self.taxon_namespace = taxon_namespace
+        self._keys = keys
+        alignment.source = self
+
+    @classmethod
+    def from_seqs(cls, path, seqs, taxon_namespace=None):
+        """Writes sequences to a new file, one sequence at a time.
+
+        :param path: path of the matrix file
+        :param seqs: iterable of tuples (label, sequence), e.g. from aln_io.read_alignment(), is read once
+        :param taxon_namespace: optional, the taxa are taken from it or added to it
+        :return: MemmapDnaMatrix
+        """
+        if taxon_namespace is None:
+            taxon_namespace = TaxonNamespace()
+        keys = {}
+
+        def rows():
+            for label, seq in seqs:
+                keys[taxon_namespace.require_taxon(label=label)] = label
+                yield label, seq
+        return cls(MemmapAlignment.from_seqs(path, rows()), taxon_namespace, keys)
+
+    @classmethod
+    def from_aln(cls, path, aln):
+        """Writes a dendropy DnaCharacterMatrix to a new file, one sequence at a time. The taxa and the taxon
+        namespace are kept.
+
+        :param path: path of the matrix file
+        :param aln: DnaCharacterMatrix
+        :return: MemmapDnaMatrix
+        """
+        keys = {}
+
+        def rows():
+            for taxon, seq in aln.items():
+                keys[taxon] = taxon.label
+                yield taxon.label, seq.symbols_as_string()
+        return cls(MemmapAlignment.from_seqs(path, rows()), aln.taxon_namespace, keys)
+
+    def _taxon(self, key):
+        """Taxon of an index or label of the taxon namespace, or the Taxon itself, as DnaCharacterMatrix does"""
+        if isinstance(key, int):
+            return self.taxon_namespace[key]
+        if isinstance(key, _STRING_TYPES):
+            taxon = self.taxon_namespace.get_taxon(label=key)
+            if taxon is None:
+                raise KeyError(key)
+            return taxon
+        return key
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return (taxon for taxon in self.taxon_namespace if taxon in self._keys)
+
+    def __contains__(self, key):
+        if isinstance(key, _STRING_TYPES):
+            return any(taxon.label == key for taxon in self._keys)
+        return key in self._keys
+
+    def __getitem__(self, key):
+        return MemmapSequence(self.alignment, self._keys[self._taxon(key)])
+
+    def __setitem__(self, key, seq):
+        """Replaces the sequence of a taxon, the new sequence is appended as new row."""
+        taxon = self._taxon(key)
+        if taxon in self._keys:
+            self.alignment.remove(self._keys.pop(taxon))
+        label = taxon.label
+        while label in self.alignment:
+            label = "{}_".format(label)
+        self.alignment.append(label, str(seq))
+        self._keys[taxon] = label
+
+    def items(self):
+        """tuples of Taxon and MemmapSequence, in the order of the taxon namespace"""
+        return ((taxon, MemmapSequence(self.alignment, self._keys[taxon])) for taxon in self)
+
+    def values(self):
+        """MemmapSequences, in the order of the taxon namespace"""
+        return (seq for taxon, seq in self.items())
+
+    def remove_sequences(self, taxa):
+        """Removes the rows of taxa, KeyError if a taxon has no row.
+
+        :param taxa: iterable of Taxon
+        """
+        for taxon in taxa:
+            self.alignment.remove(self._keys.pop(taxon))
+
+    def slice(self, start, stop):
+        """Keeps only the columns start to stop (exclusive), see MemmapAlignment.slice()."""
+        self.alignment.slice(start, stop)
+
+    def write(self, path, schema="fasta"):
+        """Writes the alignment with the current labels of the taxa, one sequence at a time.
+
+        :param path: output file
+        :param schema: "fasta" or "phylip"
+        """
+        if schema not in ["fasta", "phylip"]:
+            sys.stderr.write("the memory-mapped alignment can only be written as fasta or phylip, "
+                             "not {}\n".format(schema))
+            raise ValueError(schema)
+        with open(path, "w") as outfile:
+            if schema == "phylip":
+                outfile.write("{} {}\n".format(len(self), self.alignment.num_cols()))
+            for taxon, seq in self.items():
+                if schema == "phylip":
+                    outfile.write("{} {}\n".format(taxon.label, seq))
+                else:
+                    outfile.write(">{}\n{}\n".format(taxon.label, seq))
+
+    def close(self):
+        """Releases the memory map of the file, see MemmapAlignment.close()."""
+        self.alignment.close()
@@ -0,0 +1,189 @@
+"""Persistent table of the blast searches of a run, stored as SQLite database in the workdir.
+
+Every search (identified by the path of its result file) is recorded with its state, the number of attempts,
+start and end time, the md5 checksum of the result file and the last error:
+
+  * running: the search was started. If a run is killed, the search stays 'running' and is counted as failed
+    when the run is restarted.
+  * done: the result file was written completely.
+  * failed: the search raised an error or did not write a result file.
+
+Result files are written to a temporary file first and renamed when they are complete (atomic_write(),
+commit_tmp_file()), so a killed run does not leave truncated files behind. The temporary file is synced to disk
+before the rename, and discarded if the search that writes it fails (discard_tmp_file()). A restarted run skips the searches
+that are done (and whose file is unchanged) and repeats the failed ones.
+
+Note: has test, test_blast_jobs.py
+"""
+
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def file_checksum(fn_path):
+    """md5 checksum of a file.
+
+    :param fn_path: path to file
+    :return: hex digest as string
+    """
+    md5 = hashlib.md5()
+    with open(fn_path, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def tmp_path(fn_path):
+    """path of the temporary file that is used while fn_path is written"""
+    return "{}.tmp".format(fn_path)
+
+
+def commit_tmp_file(fn_path):
+    """Moves the completely written temporary file to fn_path, os.rename() is atomic on the same file system.
+
+    The file is synced to disk first, otherwise a crash shortly after the rename can leave an empty or
+    truncated fn_path behind.
+
+    :param fn_path: final path of the file
+    :return: True if the temporary file existed
+    """
+    if not os.path.isfile(tmp_path(fn_path)):
+        return False
+    with open(tmp_path(fn_path), "rb+") as tmp_file:
+        os.fsync(tmp_file.fileno())
+    os.rename(tmp_path(fn_path), fn_path)
+    return True
+
+
+def discard_tmp_file(fn_path):
+    """Removes the temporary file of a write that failed.
+
+    :param fn_path: final path of the file
+    :return: True if the temporary file existed
+    """
+    if not os.path.isfile(tmp_path(fn_path)):
+        return False
+    os.remove(tmp_path(fn_path))
+    return True
+
+
+def atomic_write(fn_path, content):
+    """Writes content to fn_path, readers never see a partially written file.
+
+    :param fn_path: path to file
+    :param content: string
+    :return: writes file
+    """
+    with open(tmp_path(fn_path), "w") as outfile:
+        outfile.write(content)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.rename(tmp_path(fn_path), fn_path)
+
+
+class BlastJobs(object):
+    """The job table. Can be used from several threads, the connection is not pickled.
+
+    :param db_path: path to the SQLite file, is created if it does not exist
+    """
+
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                               "fn_path TEXT PRIMARY KEY, otu_id TEXT, state TEXT, attempts INTEGER, "
+                               "started REAL, finished REAL, checksum TEXT, error TEXT)")
+            self._conn.commit()
+        return self._conn
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(sql, args).fetchall()
+            conn.commit()
+        return rows
+
+    def __getstate__(self):
+        return {"db_path": self.db_path}
+
+    def __setstate__(self, state):
+        self.__init__(state["db_path"])
+
+    def get(self, fn_path):
+        """Returns the entry of a job.
+
+        :param fn_path: path of the result file
+        :return: dict with the columns of the table, None if the job is unknown
+        """
+        rows = self._execute("SELECT otu_id, state, attempts, started, finished, checksum, error "
+                             "FROM jobs WHERE fn_path = ?", (os.path.abspath(fn_path),))
+        if not rows:
+            return None
+        keys = ("otu_id", "state", "attempts", "started", "finished", "checksum", "error")
+        return dict(zip(keys, rows[0]))
+
+    def state(self, fn_path):
+        """:return: state of the job, None if the job is unknown"""
+        job = self.get(fn_path)
+        if job is None:
+            return None
+        return job["state"]
+
+    def is_done(self, fn_path):
+        """Tests if a job was completed and its result file is still the one that was written.
+
+        :param fn_path: path of the result file
+        :return: True/False
+        """
+        job = self.get(fn_path)
+        if job is None or job["state"] != "done" or not os.path.isfile(fn_path):
+            return False
+        return file_checksum(fn_path) == job["checksum"]
+
+    def start(self, fn_path, otu_id):
+        """records the start of an attempt"""
+        fn_path = os.path.abspath(fn_path)
+        self._execute("INSERT OR IGNORE INTO jobs (fn_path, otu_id, state, attempts) VALUES (?, ?, 'pending', 0)",
+                      (fn_path, otu_id))
+        self._execute("UPDATE jobs SET state = 'running', attempts = attempts + 1, started = ?, finished = NULL, "
+                      "error = NULL WHERE fn_path = ?", (time.time(), fn_path))
+
+    def finish(self, fn_path):
+        """records that the result file was written, together with its checksum"""
+        self._execute("UPDATE jobs SET state = 'done', finished = ?, checksum = ? WHERE fn_path = ?",
+                      (time.time(), file_checksum(fn_path), os.path.abspath(fn_path)))
+
+    def fail(self, fn_path, error):
+        """records a failed attempt"""
+        self._execute("UPDATE jobs SET state = 'failed', finished = ?, error = ? WHERE fn_path = ?",
+                      (time.time(), str(error), os.path.abspath(fn_path)))
+
+    def reset_running(self):
+        """Jobs that are still running belong to a run that was killed, they are marked as failed.
+
+        :return: number of interrupted jobs
+        """
+        rows = self._execute("SELECT count(*) FROM jobs WHERE state = 'running'")
+        self._execute("UPDATE jobs SET state = 'failed', error = 'interrupted' WHERE state = 'running'")
+        return rows[0][0]
+
+    def summary(self):
+        """:return: dict with the number of jobs per state"""
+        return dict(self._execute("SELECT state, count(*) FROM jobs GROUP BY state"))
@@ -0,0 +1,86 @@
+"""Lightweight readers for BLAST result files.
+
+Biopython's NCBIXML builds a full record object for every hit and every hsp of a search. For large hitlist sizes
+this needs a lot of memory and, as physcraper keeps part of that information in the data object, makes the
+checkpoint files huge. The functions here stream through the files and only keep the fields physcraper uses.
+"""
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def _best_hsp(hsp_elem, best):
+    """Compares a Hsp element against the currently best hsp of a hit.
+
+    The best hsp is the one with the lowest e-value, ties are resolved by the higher bitscore.
+
+    :param hsp_elem: xml element of the hsp
+    :param best: dict with the values of the best hsp so far or None
+    :return: dict with 'evalue', 'bitscore', 'sseq' of the best hsp
+    """
+    evalue = float(hsp_elem.findtext("Hsp_evalue"))
+    bitscore = float(hsp_elem.findtext("Hsp_bit-score"))
+    if best is None or evalue < best["evalue"] or (evalue == best["evalue"] and bitscore > best["bitscore"]):
+        best = {"evalue": evalue, "bitscore": bitscore, "sseq": hsp_elem.findtext("Hsp_hseq")}
+    return best
+
+
+def iter_blast_xml_hits(fn_path):
+    """Streams through a blast xml file (outfmt 5 or web blast) and yields one compact record per hit.
+
+    Elements are cleared as soon as they were read, so memory usage does not depend on the hitlist size.
+
+    Note: has test, test_read_blast_xml.py
+
+    :param fn_path: path to the blast xml file
+    :return: generator of dicts with the keys: 'hit_id', 'title', 'accession', '^ncbi:gi', 'length', 'evalue',
+             'bitscore', 'sseq'. The hsp values are those of the best hsp of the hit.
+    """
+    best = None
+    hit = {}
+    context = ElementTree.iterparse(fn_path, events=("start", "end"))
+    for event, elem in context:
+        tag = elem.tag
+        if event == "start":
+            if tag == "Hit":
+                best = None
+                hit = {}
+            continue
+        if tag == "Hit_id":
+            hit["hit_id"] = elem.text
+        elif tag == "Hit_def":
+            hit["hit_def"] = elem.text
+        elif tag == "Hit_accession":
+            hit["accession"] = elem.text
+        elif tag == "Hit_len":
+            hit["length"] = int(elem.text)
+        elif tag == "Hsp":
+            best = _best_hsp(elem, best)
+            elem.clear()
+        elif tag == "Hit":
+            elem.clear()
+            if best is None:
+                continue
+            # title is build the same way as Bio.Blast.NCBIXML does it: hit_id and hit_def
+            title = "{} {}".format(hit.get("hit_id"), hit.get("hit_def"))
+            id_split = hit.get("hit_id", "").split("|")
+            gi_id = None
+            if len(id_split) > 1:
+                gi_id = id_split[1]
+            yield {"hit_id": hit.get("hit_id"), "title": title, "accession": hit.get("accession"),
+                   "^ncbi:gi": gi_id, "length": hit.get("length"), "evalue": best["evalue"],
+                   "bitscore": best["bitscore"], "sseq": best["sseq"]}
+        elif tag == "Iteration":
+            elem.clear()
+
@@ -0,0 +1,231 @@
+"""Distributes web blast queries over several (self-hosted) BLAST cloud instances.
+
+In the config file, url_base can contain a comma separated list of endpoints. Every endpoint can be followed by
+the number of queries it runs at the same time (default 1):
+
+    url_base = http://host1/cgi-bin/blast.cgi 4, http://host2/cgi-bin/blast.cgi 2
+
+Queries are sent to the healthy endpoint with the lowest load (running queries / concurrency). If a query
+fails, the endpoint is marked as unhealthy and the query is retried on another endpoint. Unhealthy endpoints
+are checked again after health_interval seconds.
+
+Note: has test, test_blast_pool.py
+"""
+
+import sys
+import time
+import threading
+
+if sys.version_info < (3,):
+    from urllib2 import urlopen, HTTPError
+    from Queue import Queue
+else:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+    from queue import Queue
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def parse_endpoints(url_base):
+    """Reads the url_base value of the config file.
+
+    :param url_base: string, comma separated list of urls, each optionally followed by its concurrency
+    :return: list of tuples (url, concurrency)
+    """
+    endpoints = []
+    for item in url_base.split(","):
+        item = item.split()
+        if not item:
+            continue
+        concurrency = 1
+        if len(item) > 1:
+            concurrency = int(item[1])
+            assert concurrency >= 1, "concurrency of endpoint `{}` needs to be at least 1".format(item[0])
+        endpoints.append((item[0], concurrency))
+    return endpoints
+
+
+class Endpoint(object):
+    """State of a single BLAST endpoint, only changed while holding the lock of the EndpointPool."""
+
+    def __init__(self, url, concurrency=1):
+        self.url = url
+        self.concurrency = concurrency
+        self.active = 0
+        self.healthy = True
+        self.last_check = 0
+        self.num_done = 0
+        self.num_failed = 0
+
+    def load(self):
+        """fraction of the concurrency in use"""
+        return float(self.active) / self.concurrency
+
+    def __repr__(self):
+        return "Endpoint({}, active {}/{}, healthy {})".format(self.url, self.active, self.concurrency,
+                                                               self.healthy)
+
+
+def check_health(url, timeout=10):
+    """Tests if an endpoint answers. Server errors (status code >= 500) and connection problems count as unhealthy.
+
+    :param url: url of the endpoint
+    :param timeout: seconds
+    :return: True/False
+    """
+    try:
+        urlopen(url, timeout=timeout).close()
+    except HTTPError as err:
+        return err.code < 500
+    except Exception as err:  # URLError, socket errors and timeouts
+        debug("health check of {} failed: {}".format(url, err))
+        return False
+    return True
+
+
+class EndpointPool(object):
+    """Pool of BLAST endpoints with per-endpoint concurrency limits.
+
+    :param endpoints: list of tuples (url, concurrency), see parse_endpoints()
+    :param max_tries: number of endpoints a query is tried on before it is given up
+    :param health_interval: seconds after which an unhealthy endpoint is checked again
+    :param health_check: function that takes an url and returns True/False, default check_health()
+    """
+
+    def __init__(self, endpoints, max_tries=3, health_interval=60, health_check=check_health):
+        assert endpoints, "no blast endpoints given"
+        self.endpoints = [Endpoint(url, concurrency) for url, concurrency in endpoints]
+        self.max_tries = max_tries
+        self.health_interval = health_interval
+        self.health_check = health_check
+        self._cond = threading.Condition()
+
+    def size(self):
+        """total number of queries that can run at the same time"""
+        return sum(endpoint.concurrency for endpoint in self.endpoints)
+
+    def _recheck(self, exclude):
+        """Checks unhealthy endpoints again, if they were not checked during the last health_interval.
+
+        Called with the lock held, the check itself runs without it.
+        """
+        now = time.time()
+        to_check = [endpoint for endpoint in self.endpoints
+                    if not endpoint.healthy and endpoint.url not in exclude
+                    and now - endpoint.last_check >= self.health_interval]
+        if not to_check:
+            return
+        for endpoint in to_check:
+            endpoint.last_check = now
+        self._cond.release()
+        try:
+            results = [(endpoint, self.health_check(endpoint.url)) for endpoint in to_check]
+        finally:
+            self._cond.acquire()
+        for endpoint, healthy in results:
+            endpoint.healthy = healthy
+
+    def acquire(self, exclude=()):
+        """Waits for a free slot on the least loaded healthy endpoint.
+
+        :param exclude: urls that shall not be used, e.g. the ones a query already failed on
+        :return: Endpoint, or None if no healthy endpoint is left
+        """
+        with self._cond:
+            while True:
+                self._recheck(exclude)
+                usable = [endpoint for endpoint in self.endpoints
+                          if endpoint.healthy and endpoint.url not in exclude]
+                if not usable:
+                    return None
+                free = [endpoint for endpoint in usable if endpoint.active < endpoint.concurrency]
+                if free:
+                    endpoint = min(free, key=lambda item: item.load())
+                    endpoint.active += 1
+                    return endpoint
+                self._cond.wait(1)
+
+    def release(self, endpoint, success):
+        """Frees the slot of a finished query.
+
+        :param endpoint: Endpoint returned by acquire()
+        :param success: False if the query failed, marks the endpoint as unhealthy
+        """
+        with self._cond:
+            endpoint.active -= 1
+            if success:
+                endpoint.num_done += 1
+            else:
+                endpoint.num_failed += 1
+                endpoint.healthy = False
+                endpoint.last_check = time.time()
+            self._cond.notify_all()
+
+    def run(self, search, *args):
+        """Runs a single query, retries it on another endpoint if it fails.
+
+        :param search: function that is called with the url of the endpoint and args
+        :param args: further arguments for search
+        :return: the return value of search
+        """
+        tried = []
+        last_error = None
+        while len(tried) < self.max_tries:
+            endpoint = self.acquire(exclude=tried)
+            if endpoint is None:
+                break
+            try:
+                result = search(endpoint.url, *args)
+            except Exception as err:
+                sys.stderr.write("blast query failed on {}: {}\n".format(endpoint.url, err))
+                self.release(endpoint, False)
+                tried.append(endpoint.url)
+                last_error = err
+                continue
+            self.release(endpoint, True)
+            return result
+        if last_error is None:
+            last_error = IOError("no healthy blast endpoint available")
+        raise last_error
+
+    def map(self, search, jobs):
+        """Runs all jobs on the pool, with as many threads as the pool has slots.
+
+        :param search: function that is called with the url of the endpoint and the items of a job
+        :param jobs: list of tuples with the further arguments of search
+        :return: list with one tuple (result, error) per job, in the order of jobs. error is None on success.
+        """
+        results = [None] * len(jobs)
+        todo = Queue()
+        for pos, job in enumerate(jobs):
+            todo.put((pos, job))
+
+        def worker():
+            while True:
+                item = todo.get()
+                if item is None:
+                    return
+                pos, job = item
+                try:
+                    results[pos] = (self.run(search, *job), None)
+                except Exception as err:
+                    results[pos] = (None, err)
+
+        threads = []
+        for _ in range(min(self.size(), len(jobs))):
+            thread = threading.Thread(target=worker)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+            todo.put(None)
+        for thread in threads:
+            thread.join()
+        return results
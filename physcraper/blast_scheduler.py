@@ -0,0 +1,65 @@
+"""Orders the blast queries of an update cycle by the number of new sequences they are expected to find.
+
+On big trees, most OTUs do not find anything new when they are blasted again. The queries are ranked using:
+
+  * the number of new hits the OTU found the last time it was blasted ('^physcraper:last_yield' in the otu_dict),
+  * the sampling density of its taxon in the alignment: well sampled taxa are less likely to add something new,
+  * the time since it was last blasted: new sequences are added to GenBank all the time.
+
+Together with a budget in PhyscraperScrape.run_blast_wrapper(), the blast time is spent on the queries
+that are most likely to find new sequences. Queries that are not run stay pending and get older,
+so they move up in the next cycle.
+
+Note: has test, test_blast_scheduler.py
+"""
+
+import math
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def expected_yield(age, last_yield, density, delay):
+    """Scores a single blast query, higher is better.
+
+    :param age: days since the OTU was last blasted
+    :param last_yield: number of new hits found by the last search of the OTU
+    :param density: number of OTUs of the same taxon in the alignment
+    :param delay: the delay of run_blast_wrapper, used to scale the age
+    :return: score as float
+    """
+    age_factor = 1 + math.log(1 + float(age) / max(delay, 1))
+    return (1 + last_yield) * age_factor / max(density, 1)
+
+
+def rank_queries(candidates, delay):
+    """Sorts the pending blast queries by decreasing expected yield.
+
+    OTUs that have no yield information (never blasted, or blasted with an older physcraper version) get the
+    mean yield of the other candidates. Ties keep the order of the input.
+
+    :param candidates: list of dicts with the keys 'otu_id', 'age', 'last_yield' (None if unknown) and 'density'
+    :param delay: the delay of run_blast_wrapper
+    :return: the candidates as a new, sorted list
+    """
+    known = [cand["last_yield"] for cand in candidates if cand["last_yield"] is not None]
+    if known:
+        prior = float(sum(known)) / len(known)
+    else:
+        prior = 1.0
+    scored = []
+    for pos, cand in enumerate(candidates):
+        last_yield = cand["last_yield"]
+        if last_yield is None:
+            last_yield = prior
+        score = expected_yield(cand["age"], last_yield, cand["density"], delay)
+        debug([cand["otu_id"], score])
+        scored.append((-score, pos, cand))
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return [item[2] for item in scored]
@@ -0,0 +1,410 @@
+"""Checkpoints of a physcraper run as a directory of text files, instead of whole-object pickles.
+
+AlignTreeTax.dump(), PhyscraperScrape.dump() and IdDicts.dump() pickle the complete objects, including the
+dendropy tree and alignment. Every reload unpickles everything, the files can not be compared between runs.
+A checkpoint is a directory with:
+
+  * **state.json**: the small attributes of the objects, the class of the scrape object and the format version
+  * **aln.fasta**: the alignment
+  * **tree.tre**: the phylogeny, newick
+  * **gb_dict.jsonl**: one line per entry, [key, value]
+  * **id_dicts.jsonl**: the large dictionaries of IdDicts, one line per entry, [name of dictionary, key, value]
+  * **seq_stores.jsonl**: the positions of the sequences of the SeqStores in their SeqFile,
+    one line per entry, [store number, key, offset, length]
+
+Attributes are written as json. Values json can not represent (sets, tuples, dictionaries with non-string keys,
+records, SeqStores, ...) are written as objects with a single marker key, e.g. {"__set__": [...]}.
+Attributes that are only caches are not written and start empty after loading.
+The otu_dict is not part of the directory. Its changes are appended to the journal of the AlignTreeTax
+(workdir/otu_journal, see journal.py), state.json stores the position in the journal.
+
+A checkpoint replaces the pickle file of the same name without the ".p", e.g. workdir/scrape_checkpoint.
+Checkpoint() reads the objects when they are first accessed.
+
+Note: has test, test_checkpoint.py
+"""
+
+import os
+import sys
+import json
+import shutil
+
+import physcraper
+from physcraper import records
+from physcraper import seq_store
+from physcraper import blast_jobs
+from physcraper import containment
+from physcraper import ncbi_data_parser
+from physcraper import journal
+from physcraper import aln_io
+from physcraper import aln_memmap
+
+_DEBUG_MK = 0
+
+FORMAT_VERSION = 1
+
+if sys.version_info < (3,):
+    _STRING_TYPES = (str, unicode)
+    _NUMBER_TYPES = (int, long, float)
+else:
+    _STRING_TYPES = (str,)
+    _NUMBER_TYPES = (int, float)
+
+# attributes that are written to their own files or are caches, they are not part of state.json
+_ATT_SKIP = frozenset(["aln", "tre", "otu_dict", "gb_dict", "_aln_matrix", "_label_index", "_otu_journal"])
+_ID_DICTS = ("acc_ncbi_dict", "spn_to_ncbiid", "ncbiid_to_spn", "otu_rank")
+_IDS_SKIP = frozenset(["config", "ott_to_ncbi", "ncbi_to_ott", "ott_to_name"] + list(_ID_DICTS))
+_SCRAPE_SKIP = frozenset(["data", "ids", "config", "_sp_id_cache", "_aln_name_index"])
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def checkpoint_path(pickle_path):
+    """Directory of the checkpoint that replaces a pickle file, the path without ".p".
+
+    :param pickle_path: path of the pickle file, e.g. workdir/scrape_checkpoint.p
+    :return: path of the checkpoint directory
+    """
+    if pickle_path.endswith(".p"):
+        return pickle_path[:-2]
+    return pickle_path
+
+
+def exists(path):
+    """True if path is a complete checkpoint"""
+    return os.path.isfile(os.path.join(path, "state.json"))
+
+
+class _SeqStores(object):
+    """The SeqStores and SeqFiles of the objects in a checkpoint, the same object is written once."""
+
+    def __init__(self):
+        self.stores = []
+        self.numbers = {}  # id(store): number
+        self.files = {}  # path: SeqFile, used when loading
+
+    def number(self, store):
+        """number of a SeqStore in the checkpoint"""
+        if id(store) not in self.numbers:
+            self.numbers[id(store)] = len(self.stores)
+            self.stores.append(store)
+        return self.numbers[id(store)]
+
+    def seq_file(self, path):
+        """SeqFile of a path, all stores of the same file share it after loading"""
+        if path not in self.files:
+            self.files[path] = seq_store.SeqFile(path)
+        return self.files[path]
+
+
+def encode(value, stores):
+    """Converts a value to something json can write, see the module docstring.
+
+    :param value: attribute value
+    :param stores: _SeqStores
+    :return: json compatible value, raises TypeError for unknown types
+    """
+    if value is None or isinstance(value, (bool,) + _NUMBER_TYPES + _STRING_TYPES):
+        return value
+    if isinstance(value, records.OtuRecord):
+        return {"__otu_record__": encode(value.to_dict(), stores)}
+    if isinstance(value, records.HitRecord):
+        return {"__hit_record__": encode(value.to_dict(), stores)}
+    if isinstance(value, seq_store.SeqStore):
+        return {"__seq_store__": stores.number(value)}
+    if isinstance(value, seq_store.SeqFile):
+        return {"__seq_file__": value.path}
+    if isinstance(value, blast_jobs.BlastJobs):
+        return {"__blast_jobs__": value.db_path}
+    if isinstance(value, containment.DigestMap):
+        return {"__digest_map__": sorted(value.digests.items())}
+    if isinstance(value, ncbi_data_parser.Parser):
+        return {"__ncbi_parser__": [value.names_file, value.nodes_file]}
+    if isinstance(value, list):
+        return [encode(item, stores) for item in value]
+    if isinstance(value, tuple):
+        return {"__tuple__": [encode(item, stores) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        items = [encode(item, stores) for item in value]
+        try:
+            items.sort()
+        except TypeError:  # mixed types on python 3
+            pass
+        return {"__set__": items}
+    if isinstance(value, dict):
+        if all(isinstance(key, _STRING_TYPES) and not key.startswith("__") for key in value):
+            return dict((key, encode(val, stores)) for key, val in value.items())
+        return {"__pairs__": [[encode(key, stores), encode(val, stores)] for key, val in value.items()]}
+    raise TypeError("{!r} can not be written to a checkpoint".format(type(value)))
+
+
+def decode(value, stores):
+    """Reverses encode().
+
+    :param value: value as read from json
+    :param stores: _SeqStores with the stores of the checkpoint
+    :return: value
+    """
+    if isinstance(value, _STRING_TYPES):
+        if not isinstance(value, str):  # python 2, json returns unicode
+            try:
+                return value.encode("ascii")
+            except UnicodeEncodeError:
+                return value
+        return value
+    if isinstance(value, list):
+        return [decode(item, stores) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        marker, content = list(value.items())[0]
+        if marker == "__otu_record__":
+            return records.OtuRecord(decode(content, stores))
+        if marker == "__hit_record__":
+            return records.HitRecord(decode(content, stores))
+        if marker == "__seq_store__":
+            return stores.stores[content]
+        if marker == "__seq_file__":
+            return stores.seq_file(decode(content, stores))
+        if marker == "__blast_jobs__":
+            return blast_jobs.BlastJobs(decode(content, stores))
+        if marker == "__digest_map__":
+            digests = containment.DigestMap()
+            for label, digest in decode(content, stores):
+                digests.digests[label] = digest
+                digests.labels.setdefault(digest, set()).add(label)
+            return digests
+        if marker == "__ncbi_parser__":
+            names_file, nodes_file = decode(content, stores)
+            return ncbi_data_parser.Parser(names_file=names_file, nodes_file=nodes_file, load=False)
+        if marker == "__tuple__":
+            return tuple(decode(item, stores) for item in content)
+        if marker == "__set__":
+            return set(decode(item, stores) for item in content)
+        if marker == "__pairs__":
+            return dict((decode(key, stores), decode(val, stores)) for key, val in content)
+    return dict((decode(key, stores), decode(val, stores)) for key, val in value.items())
+
+
+def _encode_attrs(obj, skip, stores, name):
+    """json compatible dictionary of the attributes of obj, without the ones in skip"""
+    attrs = {}
+    for attr, value in vars(obj).items():
+        if attr in skip:
+            continue
+        try:
+            attrs[attr] = encode(value, stores)
+        except TypeError as err:
+            sys.stderr.write("{}.{} is not written to the checkpoint: {}\n".format(name, attr, err))
+    return attrs
+
+
+def _write_jsonl(path, lines):
+    """writes one json list per line"""
+    with open(path, "w") as outfile:
+        for line in lines:
+            outfile.write(json.dumps(line, sort_keys=True))
+            outfile.write("\n")
+
+
+def _read_jsonl(path):
+    """yields the json lists of a file written by _write_jsonl()"""
+    with open(path) as infile:
+        for line in infile:
+            if line.strip():
+                yield json.loads(line)
+
+
+def save(path, data, ids=None, scraper=None):
+    """Writes a checkpoint.
+
+    The files are written to a temporary directory that replaces path when it is complete,
+    a killed run leaves the last complete checkpoint.
+
+    :param path: checkpoint directory
+    :param data: AlignTreeTax, or None
+    :param ids: optional IdDicts
+    :param scraper: optional PhyscraperScrape or FilterBlast, data and ids are then taken from it
+    :return: writes the checkpoint
+    """
+    debug("write checkpoint {}".format(path))
+    if scraper is not None:
+        data = scraper.data
+        ids = scraper.ids
+    path = os.path.abspath(path)
+    tmp_dir = "{}.tmp".format(path)
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    stores = _SeqStores()
+    state = {"format": FORMAT_VERSION}
+    if data is not None:
+        state["att"] = _encode_attrs(data, _ATT_SKIP, stores, "AlignTreeTax")
+        data.aln.write(path=os.path.join(tmp_dir, "aln.fasta"), schema="fasta")
+        data.tre.write(path=os.path.join(tmp_dir, "tree.tre"),
+                       schema="newick",
+                       unquoted_underscores=True,
+                       suppress_edge_lengths=False)
+        otu_journal = data.otu_journal()
+        position = otu_journal.flush(data.otu_dict)
+        state["otu_journal"] = {"path": otu_journal.directory, "generation": position[0], "offset": position[1]}
+        _write_jsonl(os.path.join(tmp_dir, "gb_dict.jsonl"),
+                     ([encode(key, stores), encode(entry, stores)] for key, entry in data.gb_dict.items()))
+    if ids is not None:
+        state["config"] = _encode_attrs(ids.config, (), stores, "ConfigObj")
+        state["ids"] = _encode_attrs(ids, _IDS_SKIP, stores, "IdDicts")
+        state["id_dicts"] = [name for name in _ID_DICTS if hasattr(ids, name)]
+        _write_jsonl(os.path.join(tmp_dir, "id_dicts.jsonl"),
+                     ([name, encode(key, stores), encode(val, stores)]
+                      for name in state["id_dicts"] for key, val in getattr(ids, name).items()))
+    if scraper is not None:
+        state["scrape_class"] = type(scraper).__name__
+        state["scrape"] = _encode_attrs(scraper, _SCRAPE_SKIP, stores, type(scraper).__name__)
+    # encoding the attributes collects the SeqStores
+    state["seq_files"] = [store.seq_file.path for store in stores.stores]
+    _write_jsonl(os.path.join(tmp_dir, "seq_stores.jsonl"),
+                 ([num, encode(key, stores), pos[0], pos[1]]
+                  for num, store in enumerate(stores.stores) for key, pos in store._index.items()))
+    with open(os.path.join(tmp_dir, "state.json"), "w") as outfile:
+        json.dump(state, outfile, sort_keys=True, indent=1)
+    if os.path.exists(path):
+        old_dir = "{}.old".format(path)
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+        os.rename(path, old_dir)
+        os.rename(tmp_dir, path)
+        shutil.rmtree(old_dir)
+    else:
+        os.rename(tmp_dir, path)
+    if data is not None:
+        otu_journal.pin(path, position)
+
+
+def _restore(cls, attrs):
+    """instance of cls with the given attributes, without calling __init__ (as pickle does)"""
+    obj = cls.__new__(cls)
+    obj.__dict__.update(attrs)
+    return obj
+
+
+class Checkpoint(object):
+    """Reads a checkpoint written by save().
+
+    Only state.json is read when the Checkpoint is created. The objects are built when they are first accessed:
+    data (AlignTreeTax), ids (IdDicts), config (ConfigObj) and scraper (PhyscraperScrape or FilterBlast,
+    built from data and ids of the same checkpoint).
+
+    :param path: checkpoint directory
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(os.path.join(self.path, "state.json")) as infile:
+            self.state = json.load(infile)
+        if self.state.get("format") != FORMAT_VERSION:
+            sys.stderr.write("Checkpoint {} has format {}, expected {}\n".format(self.path,
+                                                                                self.state.get("format"),
+                                                                                FORMAT_VERSION))
+            raise ValueError("unknown checkpoint format")
+        self._stores = None
+        self._data = None
+        self._ids = None
+        self._config = None
+        self._scraper = None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @property
+    def stores(self):
+        """_SeqStores with the SeqStores of the checkpoint"""
+        if self._stores is None:
+            stores = _SeqStores()
+            for path in self.state.get("seq_files", []):
+                store = seq_store.SeqStore(stores.seq_file(path))
+                stores.number(store)
+            for num, key, offset, length in _read_jsonl(self._file("seq_stores.jsonl")):
+                stores.stores[num]._index[decode(key, stores)] = (offset, length)
+            self._stores = stores
+        return self._stores
+
+    @property
+    def data(self):
+        """AlignTreeTax of the checkpoint"""
+        if self._data is None:
+            if "att" not in self.state:
+                raise ValueError("Checkpoint {} has no AlignTreeTax".format(self.path))
+            attrs = decode(self.state["att"], self.stores)
+            attrs["_aln_matrix"] = None
+            attrs["_label_index"] = []
+            if attrs.get("aln_memmap"):  # the sequences are kept in the memory-mapped file
+                attrs["aln"] = aln_memmap.MemmapDnaMatrix.from_seqs(attrs["aln_memmap"],
+                                                                    aln_io.read_fasta(self._file("aln.fasta"),
+                                                                                      replace=()))
+            else:
+                attrs["aln"] = physcraper.DnaCharacterMatrix.get(path=self._file("aln.fasta"), schema="fasta")
+            attrs["tre"] = physcraper.Tree.get(path=self._file("tree.tre"),
+                                               schema="newick",
+                                               preserve_underscores=True,
+                                               taxon_namespace=attrs["aln"].taxon_namespace)
+            if "otu_journal" in self.state:
+                position = self.state["otu_journal"]
+                attrs["otu_dict"], attrs["_otu_journal"] = journal.load(position["path"],
+                                                                        position["generation"],
+                                                                        position["offset"])
+            else:  # written before the otu_dict journal
+                otu_dict = {}
+                for otu, entry in _read_jsonl(self._file("otu_dict.jsonl")):
+                    otu_dict[decode(otu, self.stores)] = decode(entry, self.stores)
+                attrs["otu_dict"] = records.compact_otu_dict(otu_dict)
+                attrs["_otu_journal"] = None
+            attrs["gb_dict"] = dict((decode(key, self.stores), decode(entry, self.stores))
+                                    for key, entry in _read_jsonl(self._file("gb_dict.jsonl")))
+            self._data = _restore(physcraper.AlignTreeTax, attrs)
+        return self._data
+
+    @property
+    def config(self):
+        """ConfigObj of the checkpoint"""
+        if self._config is None:
+            if "config" not in self.state:
+                raise ValueError("Checkpoint {} has no configuration".format(self.path))
+            self._config = _restore(physcraper.ConfigObj, decode(self.state["config"], self.stores))
+        return self._config
+
+    @property
+    def ids(self):
+        """IdDicts of the checkpoint, the ott - ncbi mappings are read again from config.ott_ncbi"""
+        if self._ids is None:
+            if "ids" not in self.state:
+                raise ValueError("Checkpoint {} has no IdDicts".format(self.path))
+            attrs = decode(self.state["ids"], self.stores)
+            attrs["config"] = self.config
+            for name in self.state["id_dicts"]:
+                attrs[name] = {}
+            for name, key, val in _read_jsonl(self._file("id_dicts.jsonl")):
+                attrs[name][decode(key, self.stores)] = decode(val, self.stores)
+            ids = _restore(physcraper.IdDicts, attrs)
+            ids.read_ott_ncbi()
+            self._ids = ids
+        return self._ids
+
+    @property
+    def scraper(self):
+        """PhyscraperScrape or FilterBlast of the checkpoint"""
+        if self._scraper is None:
+            if "scrape" not in self.state:
+                raise ValueError("Checkpoint {} has no scrape object".format(self.path))
+            classes = {"PhyscraperScrape": physcraper.PhyscraperScrape, "FilterBlast": physcraper.FilterBlast}
+            attrs = decode(self.state["scrape"], self.stores)
+            attrs["_sp_id_cache"] = {}
+            attrs["data"] = self.data
+            attrs["ids"] = self.ids
+            attrs["config"] = self.ids.config
+            self._scraper = _restore(classes[self.state["scrape_class"]], attrs)
+        return self._scraper
@@ -8,9 +8,11 @@ import random
 
 from copy import deepcopy
 from dendropy import Tree, DnaCharacterMatrix
-from Bio import Entrez
 
 import physcraper
+from physcraper import lazy_import
+
+Entrez = lazy_import.module("Bio.Entrez")
 
 if sys.version_info < (3,):
     from urllib2 import HTTPError
@@ -161,12 +163,17 @@ class Concat(object):
         Removes abandoned nodes first.
 
         :param workdir: directory of single gene run
-        :param pickle_fn: path to pickled file of the Physcraper run
+        :param pickle_fn: path to pickled file of the Physcraper run, the checkpoint of the same name without ".p"
+                          is used if it exists (see checkpoint.py)
         :param genename: string, name for locus provided by user
         :return: self.single_runs
         """
         physcraper.debug("load_single_genes: {}".format(genename))
-        scrape = pickle.load(open("{}/{}".format(workdir, pickle_fn), "rb"))
+        pickle_path = "{}/{}".format(workdir, pickle_fn)
+        if physcraper.checkpoint.exists(physcraper.checkpoint.checkpoint_path(pickle_path)):
+            scrape = physcraper.checkpoint.Checkpoint(physcraper.checkpoint.checkpoint_path(pickle_path)).scraper
+        else:
+            scrape = pickle.load(open(pickle_path, "rb"))
         scrape = remove_aln_tre_leaf(scrape)
         self.single_runs[genename] = deepcopy(scrape)
         return
@@ -0,0 +1,422 @@
+"""Minimizer index to find sequences that may contain, or be contained in, a query sequence.
+
+PhyscraperScrape.seq_dict_build() compares every new sequence against all sequences already kept (str.find in
+both directions). The index here only returns candidates, and only those are compared exactly.
+
+Every sequence is reduced to its set of minimizers: for every window of w consecutive k-mers, the k-mer with
+the smallest hash. The minimizer of a window only depends on the window itself, therefore:
+
+  * if Q is a subsequence of S, every minimizer of Q is a minimizer of S. The sequences that contain Q are
+    found by intersecting the postings (minimizer -> sequences) of the minimizers of Q.
+  * if S is a subsequence of Q, the minimizer of the first window of S (its anchor) is a minimizer of Q. The
+    sequences contained in Q are found by looking up the minimizers of Q in the anchor table.
+
+Sequences that are shorter than one window (w + k - 1) are always returned as candidates.
+
+Most rejected hits are exact copies of a sequence that is already kept. DigestMap finds them by the md5 digest
+of the canonical sequence (gaps removed, case kept as in the str.find comparisons) before the containment search.
+
+precompute_related() does the exact comparisons for all new sequences in a pool of processes, before
+remove_identical_seqs() makes its decisions in the usual order.
+
+Note: has test, test_containment.py
+"""
+
+import hashlib
+import multiprocessing
+from collections import deque
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def canonical(seq):
+    """sequence without gaps, compared case sensitive like seq_dict_build() does"""
+    return seq.replace("-", "")
+
+
+def seq_length(seq):
+    """length of seq without gaps and missing data, as AlnMatrix.row_lengths() counts it"""
+    return len(seq) - seq.count("-") - seq.count("?")
+
+
+def seq_digest(seq):
+    """md5 digest of the canonical sequence, is the same in every python process"""
+    return hashlib.md5(canonical(seq).encode("ascii")).hexdigest()
+
+
+def minimizers(seq, k, w):
+    """Computes the minimizers of a sequence.
+
+    :param seq: sequence as string, without gaps
+    :param k: k-mer length
+    :param w: number of k-mers per window
+    :return: tuple of the set of minimizers and the minimizer of the first window.
+             (None, None) if the sequence is shorter than one window.
+    """
+    num_kmers = len(seq) - k + 1
+    if num_kmers < w:
+        return None, None
+    hashes = [hash(seq[i:i + k]) for i in range(num_kmers)]
+    result = set()
+    anchor = None
+    window = deque()  # positions with increasing hash, the first one is the minimum of the current window
+    for pos in range(num_kmers):
+        while window and hashes[window[-1]] > hashes[pos]:  # keeps the leftmost one of equal hashes
+            window.pop()
+        window.append(pos)
+        if window[0] <= pos - w:
+            window.popleft()
+        if pos >= w - 1:
+            kmer = seq[window[0]:window[0] + k]
+            if anchor is None:
+                anchor = kmer
+            result.add(kmer)
+    return result, anchor
+
+
+class ContainmentIndex(object):
+    """Index of labelled sequences, see the module docstring.
+
+    :param k: k-mer length
+    :param w: number of k-mers per window
+    """
+
+    def __init__(self, k=16, w=8):
+        self.k = k
+        self.w = w
+        self.postings = {}  # minimizer: set of labels
+        self.anchors = {}  # anchor minimizer: set of labels
+        self.short = set()  # labels of sequences shorter than one window
+        self.seq_mins = {}  # label: (minimizers, anchor)
+        self.lengths = {}  # label: length of the sequence
+
+    def add(self, label, seq):
+        """Adds a sequence, replaces an existing one with the same label.
+
+        :param label: otu_id
+        :param seq: sequence without gaps
+        """
+        if label in self.lengths:
+            self.remove(label)
+        mins, anchor = minimizers(seq, self.k, self.w)
+        self.lengths[label] = len(seq)
+        if mins is None:
+            self.short.add(label)
+            return
+        self.seq_mins[label] = (mins, anchor)
+        for kmer in mins:
+            self.postings.setdefault(kmer, set()).add(label)
+        self.anchors.setdefault(anchor, set()).add(label)
+
+    def remove(self, label):
+        """Removes a sequence from the index."""
+        del self.lengths[label]
+        if label in self.short:
+            self.short.discard(label)
+            return
+        mins, anchor = self.seq_mins.pop(label)
+        for kmer in mins:
+            labels = self.postings[kmer]
+            labels.discard(label)
+            if not labels:
+                del self.postings[kmer]
+        self.anchors[anchor].discard(label)
+        if not self.anchors[anchor]:
+            del self.anchors[anchor]
+
+    def candidates(self, seq):
+        """Labels of the sequences that may contain seq or may be contained in seq.
+
+        Sequences of the same length as seq are only tested as super sequences, as in seq_dict_build().
+
+        :param seq: query sequence without gaps
+        :return: set of labels, a superset of the true matches
+        """
+        query_len = len(seq)
+        mins, anchor = minimizers(seq, self.k, self.w)
+        found = set(label for label in self.short if self.lengths[label] <= query_len)
+        if mins is None:
+            # query is shorter than one window, no filter for super sequences
+            found.update(label for label, length in self.lengths.items() if length >= query_len)
+            return found
+        # super sequences: contain all minimizers of seq
+        postings = []
+        for kmer in mins:
+            labels = self.postings.get(kmer)
+            if labels is None:
+                postings = []
+                break
+            postings.append(labels)
+        if postings:
+            postings.sort(key=len)
+            supers = set(label for label in postings[0] if self.lengths[label] >= query_len)
+            for labels in postings[1:]:
+                if not supers:
+                    break
+                supers.intersection_update(labels)
+            found.update(supers)
+        # sub sequences: their anchor is one of the minimizers of seq
+        for kmer in mins:
+            labels = self.anchors.get(kmer)
+            if labels:
+                found.update(label for label in labels if self.lengths[label] < query_len)
+        return found
+
+
+class IndexedSeqDict(dict):
+    """dict of otu_id: sequence, that keeps a ContainmentIndex of the gap stripped sequences up to date.
+
+    Used as tmp_dict in remove_identical_seqs(), seq_dict_build() then only compares against the candidates.
+    """
+
+    def __init__(self, seqs=None, k=16, w=8):
+        dict.__init__(self)
+        self.index = ContainmentIndex(k, w)
+        self.positions = {}  # label: insertion number, gives the order of the keys as in a plain dict
+        self._next_position = 0
+        if seqs is not None:
+            self.update(seqs)
+
+    def __setitem__(self, label, seq):
+        if dict.get(self, label) == seq and label in self.index.lengths:
+            return
+        if label not in self.positions:
+            self.positions[label] = self._next_position
+            self._next_position += 1
+        dict.__setitem__(self, label, seq)
+        self.index.add(label, seq.replace("-", ""))
+
+    def __delitem__(self, label):
+        dict.__delitem__(self, label)
+        self.index.remove(label)
+        del self.positions[label]
+
+    def __reduce__(self):
+        return self.__class__, (dict(self), self.index.k, self.index.w)
+
+    def update(self, *args, **kwargs):
+        for label, seq in dict(*args, **kwargs).items():
+            self[label] = seq
+
+    def pop(self, label, *default):
+        if label not in self and default:
+            return default[0]
+        seq = self[label]
+        del self[label]
+        return seq
+
+    def setdefault(self, label, seq=None):
+        if label not in self:
+            self[label] = seq
+        return self[label]
+
+    def candidates(self, seq):
+        """see ContainmentIndex.candidates()"""
+        return self.index.candidates(seq)
+
+    def in_order(self, labels):
+        """The labels that are keys, in the order they were inserted, without looking at the other keys.
+
+        :param labels: iterable of labels, e.g. from candidates()
+        :return: list of labels
+        """
+        return sorted((label for label in set(labels) if label in self.positions), key=self.positions.get)
+
+
+class DigestMap(object):
+    """Maps the digests of the kept sequences to their labels, is kept on the scrape object between rounds.
+
+    For every label the ncbi id of its species is stored, seq_dict_build() then resolves exact copies of a
+    sequence of the same species (same_species_copy()) without the containment search.
+    Sequences change when they are aligned or trimmed, sync() hashes the rows whose length changed and the new
+    ones again. duplicates() only returns labels whose current sequence is identical to the query.
+    """
+
+    def __init__(self):
+        self.labels = {}  # digest: set of labels
+        self.digests = {}  # label: digest
+        self.lengths = {}  # label: seq_length() of the sequence the digest was computed of
+        self.species = {}  # label: ncbi id of the species, as get_sp_id_of_otulabel() returns it
+
+    def __setstate__(self, state):
+        """Unpickling: maps pickled without lengths and species hash all rows at the next sync()."""
+        self.__dict__.update(state)
+        for attr in ["lengths", "species"]:
+            if attr not in state:
+                setattr(self, attr, {})
+
+    def add(self, label, seq, sp_id=None, length=None):
+        """Adds or updates the sequence of a label.
+
+        :param label: otu_id
+        :param seq: sequence
+        :param sp_id: optional, ncbi id of the species of label
+        :param length: optional, seq_length() of seq if it is known
+        """
+        digest = seq_digest(seq)
+        self.lengths[label] = length if length is not None else seq_length(seq)
+        if sp_id is not None:
+            self.species[label] = sp_id
+        old = self.digests.get(label)
+        if old == digest:
+            return
+        if old is not None:
+            self.labels[old].discard(label)
+            if not self.labels[old]:
+                del self.labels[old]
+        self.digests[label] = digest
+        self.labels.setdefault(digest, set()).add(label)
+
+    def discard(self, label):
+        """Removes a label, if present."""
+        self.lengths.pop(label, None)
+        self.species.pop(label, None)
+        digest = self.digests.pop(label, None)
+        if digest is None:
+            return
+        self.labels[digest].discard(label)
+        if not self.labels[digest]:
+            del self.labels[digest]
+
+    def sync(self, seq_dict, lengths=None, species=None):
+        """Updates the map with the sequences of the current alignment, drops the labels that are not in it.
+
+        :param seq_dict: dict of otu_id: sequence
+        :param lengths: optional, dict of otu_id: length without gaps and missing data (AlnMatrix.row_lengths()).
+                        Only new labels and labels whose length changed are hashed again, None hashes all.
+        :param species: optional, dict of otu_id: ncbi id of the species
+        """
+        for label in [label for label in self.digests if label not in seq_dict]:
+            self.discard(label)
+        for label, seq in seq_dict.items():
+            if lengths is None or label not in self.digests or self.lengths.get(label) != lengths[label]:
+                self.add(label, seq, length=None if lengths is None else lengths[label])
+            if species is not None:
+                self.species[label] = species[label]
+
+    def duplicates(self, seq, seq_dict):
+        """Labels in seq_dict whose sequence is identical to seq after canonical().
+
+        :param seq: query sequence
+        :param seq_dict: dict of otu_id: sequence, the labels are checked against it
+        :return: list of labels, sorted
+        """
+        labels = self.labels.get(seq_digest(seq))
+        if not labels:
+            return []
+        query = canonical(seq)
+        return sorted(label for label in labels if label in seq_dict and canonical(seq_dict[label]) == query)
+
+    def same_species_copy(self, seq, seq_dict, sp_id):
+        """A label in seq_dict whose sequence is identical to seq and that is not of a different species.
+
+        The species are compared as in seq_dict_build(): only two different int ids are different species.
+        Labels without a stored species are not returned.
+
+        :param seq: query sequence
+        :param seq_dict: dict of otu_id: sequence
+        :param sp_id: ncbi id of the species of seq
+        :return: label, None if there is no such copy
+        """
+        for label in self.duplicates(seq, seq_dict):
+            if label not in self.species:
+                continue
+            existing_id = self.species[label]
+            if not (type(existing_id) == int and existing_id != sp_id):
+                return label
+        return None
+
+
+def related(index, seqs, label):
+    """Labels of the sequences that contain seq[label] or are contained in it, as compared by seq_dict_build().
+
+    :param index: ContainmentIndex of seqs
+    :param seqs: dict of label: sequence without gaps
+    :param label: label of the query in seqs
+    :return: set of labels, without label itself
+    """
+    query = seqs[label]
+    found = set()
+    for other in index.candidates(query):
+        if other == label:
+            continue
+        seq = seqs[other]
+        if len(seq) >= len(query):
+            if seq.find(query) != -1:
+                found.add(other)
+        elif query.find(seq) != -1:
+            found.add(other)
+    return found
+
+
+_worker_state = {}
+
+
+def _init_worker(seqs, k, w):
+    """builds the index once per worker process"""
+    index = ContainmentIndex(k, w)
+    for label, seq in seqs.items():
+        index.add(label, seq)
+    _worker_state["index"] = index
+    _worker_state["seqs"] = seqs
+
+
+def _related_partition(labels):
+    index = _worker_state["index"]
+    seqs = _worker_state["seqs"]
+    return [(label, related(index, seqs, label)) for label in labels]
+
+
+def partition(seqs, labels, num_parts):
+    """Splits labels into num_parts lists with about the same total sequence length.
+
+    :param seqs: dict of label: sequence
+    :param labels: labels to distribute
+    :param num_parts: number of lists
+    :return: list of lists of labels
+    """
+    parts = [[] for _ in range(num_parts)]
+    sizes = [0] * num_parts
+    for label in sorted(labels, key=lambda item: (-len(seqs[item]), item)):
+        smallest = sizes.index(min(sizes))
+        parts[smallest].append(label)
+        sizes[smallest] += len(seqs[label])
+    return [part for part in parts if part]
+
+
+def precompute_related(seqs, queries, num_processes, k=16, w=8):
+    """Computes related() for many queries in a pool of processes.
+
+    Every process gets all sequences, the queries are split with partition(). The result does not depend
+    on the number of processes.
+
+    :param seqs: dict of label: sequence, gaps are removed
+    :param queries: labels in seqs that related() is computed for
+    :param num_processes: number of processes, 1 computes it in this process
+    :return: dict of query label: set of related labels
+    """
+    seqs = dict((label, seq.replace("-", "")) for label, seq in seqs.items())
+    parts = partition(seqs, queries, max(num_processes, 1))
+    if num_processes <= 1 or len(parts) <= 1:
+        _init_worker(seqs, k, w)
+        results = [_related_partition(part) for part in parts]
+        _worker_state.clear()
+    else:
+        pool = multiprocessing.Pool(len(parts), _init_worker, (seqs, k, w))
+        try:
+            results = pool.map(_related_partition, parts)
+        finally:
+            pool.close()
+            pool.join()
+    relations = {}
+    for result in results:
+        relations.update(result)
+    debug("precomputed containment of {} sequences in {} partitions".format(len(relations), len(parts)))
+    return relations
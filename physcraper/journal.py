@@ -0,0 +1,224 @@
+"""Append-only journal of the changes of AlignTreeTax.otu_dict.
+
+Writing the complete otu_dict into the checkpoint of every round scales with the number of OTUs, while only the
+entries of the new sequences and a few status changes differ from the last round. The journal is the only
+write of the otu_dict per round, the exports for the user (otu_dict.json, otu_info) are written at the end of
+the run. load() reads the current otu_dict of a running or killed run. The journal directory
+(workdir/otu_journal) holds:
+
+  * **snapshot.<generation>.jsonl**: the complete otu_dict, one line per entry: [otu_id, entry]
+  * **journal.<generation>.jsonl**: the changes since the snapshot, one line per change:
+    ["set", otu_id, entry] for new and changed entries, ["del", otu_id] for removed ones
+  * **pins.json**: the generation every checkpoint refers to, these snapshots are kept
+
+flush() appends the entries of the records that are dirty (see records.py) and of new keys, writes scale with
+the number of changes. When the journal has more entries than the otu_dict, the otu_dict is written as snapshot
+of the next generation (compact()), the journal starts empty.
+Checkpoints (checkpoint.py) store the generation and the byte offset of the journal at the time they were
+written, load() reads the snapshot and the journal up to that offset. A killed run loses at most the changes
+since the last flush, an incomplete last line is ignored.
+
+Note: has test, test_journal.py
+"""
+
+import os
+import sys
+import json
+import glob
+
+from physcraper import records
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def _snapshot_path(directory, generation):
+    return os.path.join(directory, "snapshot.{}.jsonl".format(generation))
+
+
+def _journal_path(directory, generation):
+    return os.path.join(directory, "journal.{}.jsonl".format(generation))
+
+
+def _generations(directory):
+    """generations with a complete snapshot, sorted"""
+    generations = []
+    for path in glob.glob(os.path.join(directory, "snapshot.*.jsonl")):
+        generations.append(int(os.path.basename(path).split(".")[1]))
+    return sorted(generations)
+
+
+def _line(item):
+    """one json line as bytes"""
+    return (json.dumps(item, sort_keys=True) + "\n").encode("ascii")
+
+
+def _entry(value):
+    """plain dict of an otu_dict entry"""
+    return dict(value.items())
+
+
+class OtuJournal(object):
+    """The journal of one otu_dict, see the module docstring.
+
+    A new OtuJournal writes a snapshot at the first flush(), after the generations that are already in directory.
+    Use load() to continue a journal.
+
+    :param directory: journal directory, is created if it does not exist
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        generations = _generations(self.directory)
+        self.generation = generations[-1] if generations else 0
+        self.offset = None  # bytes of the journal file that belong to the otu_dict, None: no snapshot yet
+        self.entries = 0  # number of changes in the journal since the snapshot
+        self.known = set()  # otu_ids in snapshot and journal
+
+    def pins(self):
+        """:return: dictionary, key: checkpoint path, value: generation the checkpoint refers to"""
+        pins_path = os.path.join(self.directory, "pins.json")
+        if not os.path.isfile(pins_path):
+            return {}
+        with open(pins_path) as infile:
+            return json.load(infile)
+
+    def position(self):
+        """:return: tuple of generation and journal offset, stored by the checkpoints"""
+        return self.generation, self.offset
+
+    def flush(self, otu_dict):
+        """Appends the new, changed and removed entries of otu_dict to the journal.
+
+        :param otu_dict: AlignTreeTax.otu_dict
+        :return: position() after the flush
+        """
+        if self.offset is None:
+            return self.compact(otu_dict)
+        lines = []
+        changed = []
+        for otu_id, entry in otu_dict.items():
+            if otu_id not in self.known or getattr(entry, "dirty", True):
+                lines.append(_line(["set", otu_id, _entry(entry)]))
+                changed.append(entry)
+        removed = [otu_id for otu_id in self.known if otu_id not in otu_dict]
+        for otu_id in removed:
+            lines.append(_line(["del", otu_id]))
+        if self.entries + len(lines) > len(otu_dict):
+            return self.compact(otu_dict)
+        if lines:
+            with open(_journal_path(self.directory, self.generation), "ab") as outfile:
+                outfile.seek(0, os.SEEK_END)
+                if outfile.tell() != self.offset:  # changes of a killed run after the loaded checkpoint
+                    outfile.truncate(self.offset)
+                outfile.write(b"".join(lines))
+                outfile.flush()
+                os.fsync(outfile.fileno())
+                self.offset = outfile.tell()
+            self.entries += len(lines)
+            for entry in changed:
+                if isinstance(entry, records.OtuRecord):
+                    entry.mark_clean()
+            self.known.update(otu_dict)
+            self.known.difference_update(removed)
+        debug("journal: {} changes".format(len(lines)))
+        return self.position()
+
+    def compact(self, otu_dict):
+        """Writes otu_dict as snapshot of the next generation, the journal starts empty.
+
+        Snapshots that are neither the current one nor referred to by a checkpoint are deleted.
+
+        :param otu_dict: AlignTreeTax.otu_dict
+        :return: position()
+        """
+        generation = self.generation + 1
+        path = _snapshot_path(self.directory, generation)
+        with open("{}.tmp".format(path), "wb") as outfile:
+            for otu_id, entry in otu_dict.items():
+                outfile.write(_line([otu_id, _entry(entry)]))
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        open(_journal_path(self.directory, generation), "wb").close()
+        os.rename("{}.tmp".format(path), path)  # the generation is complete
+        self.generation = generation
+        self.offset = 0
+        self.entries = 0
+        self.known = set(otu_dict)
+        for entry in otu_dict.values():
+            if isinstance(entry, records.OtuRecord):
+                entry.mark_clean()
+        keep = set(self.pins().values())
+        keep.add(self.generation)
+        for old in _generations(self.directory):
+            if old not in keep:
+                os.remove(_snapshot_path(self.directory, old))
+                if os.path.exists(_journal_path(self.directory, old)):
+                    os.remove(_journal_path(self.directory, old))
+        debug("journal: snapshot {}".format(generation))
+        return self.position()
+
+    def pin(self, name, position):
+        """Keeps the snapshot of position, as the checkpoint name refers to it.
+
+        :param name: path of the checkpoint
+        :param position: position() that was stored in the checkpoint
+        """
+        pins = self.pins()
+        pins[name] = position[0]
+        pins_path = os.path.join(self.directory, "pins.json")
+        with open("{}.tmp".format(pins_path), "w") as outfile:
+            json.dump(pins, outfile, sort_keys=True, indent=1)
+        os.rename("{}.tmp".format(pins_path), pins_path)
+
+
+def load(directory, generation=None, offset=None):
+    """Reads an otu_dict from a journal directory.
+
+    :param directory: journal directory
+    :param generation: optional, generation of the snapshot, default is the last one
+    :param offset: optional, the journal is read up to this byte offset, default is the complete journal
+    :return: tuple of otu_dict (with OtuRecords) and the OtuJournal to continue it
+    """
+    otu_journal = OtuJournal(directory)
+    if generation is None:
+        generation = otu_journal.generation
+    otu_dict = {}
+    with open(_snapshot_path(otu_journal.directory, generation), "rb") as infile:
+        for line in infile:
+            otu_id, entry = json.loads(line.decode("ascii"))
+            otu_dict[otu_id] = entry
+    read_to = 0
+    entries = 0
+    path = _journal_path(otu_journal.directory, generation)
+    if os.path.exists(path):
+        with open(path, "rb") as infile:
+            for line in infile:
+                if offset is not None and read_to + len(line) > offset:
+                    break
+                if not line.endswith(b"\n"):
+                    sys.stderr.write("Incomplete last line in {}, is ignored\n".format(path))
+                    break
+                change = json.loads(line.decode("ascii"))
+                if change[0] == "set":
+                    otu_dict[change[1]] = change[2]
+                else:
+                    otu_dict.pop(change[1], None)
+                read_to += len(line)
+                entries += 1
+    records.compact_otu_dict(otu_dict)
+    for entry in otu_dict.values():
+        entry.mark_clean()
+    otu_journal.generation = generation
+    otu_journal.offset = read_to
+    otu_journal.entries = entries
+    otu_journal.known = set(otu_dict)
+    return otu_dict, otu_journal
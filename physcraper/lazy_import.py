@@ -0,0 +1,88 @@
+"""Imports of the heavy dependencies (peyotl, ete2, Biopython, pandas, numpy) on first use.
+
+`import physcraper` used to import all of them, also for runs and helper scripts that never query the
+Open Tree of Life, NCBI or the local blast filter. module() and attribute() return placeholders with the name the
+modules use already, the import happens at the first attribute access or call:
+
+    Entrez = lazy_import.module("Bio.Entrez")
+    NCBITaxa = lazy_import.attribute("ete2", "NCBITaxa")
+
+Setting an attribute (e.g. Entrez.email) sets it on the imported module.
+tests/test_import_time.py checks that `import physcraper` does not import them, and that the import time
+stays within a budget (PHYSCRAPER_IMPORT_BUDGET, or by default a multiple of the import time of dendropy).
+
+Note: has test, test_import_time.py
+"""
+
+import importlib
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+class LazyModule(object):
+    """Placeholder of a module that is imported at the first attribute access.
+
+    :param name: absolute module name, e.g. "Bio.Entrez"
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, "_lazy_name", name)
+        object.__setattr__(self, "_lazy_module", None)
+
+    def _lazy_load(self):
+        if self._lazy_module is None:
+            debug("import {}".format(self._lazy_name))
+            object.__setattr__(self, "_lazy_module", importlib.import_module(self._lazy_name))
+        return self._lazy_module
+
+    def __getattr__(self, attr):
+        # only called for attributes that are not set on the placeholder itself
+        return getattr(self._lazy_load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._lazy_load(), attr, value)
+
+    def __repr__(self):
+        return "<lazy module {}>".format(self._lazy_name)
+
+
+class LazyAttribute(object):
+    """Placeholder of a class, function or object of a module, the module is imported at the first call or
+    attribute access.
+
+    :param name: absolute module name, e.g. "peyotl.sugar"
+    :param attr: name in the module, e.g. "taxomachine"
+    """
+
+    def __init__(self, name, attr):
+        self._lazy_module = LazyModule(name)
+        self._lazy_attr = attr
+
+    def _lazy_load(self):
+        return getattr(self._lazy_module, self._lazy_attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._lazy_load()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._lazy_load(), attr)
+
+    def __repr__(self):
+        return "<lazy {}.{}>".format(self._lazy_module._lazy_name, self._lazy_attr)
+
+
+def module(name):
+    """:return: LazyModule of name"""
+    return LazyModule(name)
+
+
+def attribute(name, attr):
+    """:return: LazyAttribute of attr in module name, use like `from name import attr`"""
+    return LazyAttribute(name, attr)
@@ -4,9 +4,12 @@
 import os
 import sys
 import subprocess
-import numpy
 import shutil
-from Bio.Blast import NCBIXML
+
+from physcraper import lazy_import
+
+numpy = lazy_import.module("numpy")
+NCBIXML = lazy_import.module("Bio.Blast.NCBIXML")
 
 _DEBUG_MK = 0
 
@@ -0,0 +1,135 @@
+"""Collapses near-identical sequences of the same taxon, using MinHash sketches of their k-mers.
+
+remove_identical_seqs() only removes sequences that are sub- or supersequences of another one. Many species have
+dozens of accessions that differ in a few positions, they bloat the alignment and the tree inference.
+If near_identical is set in the config file, sequences whose estimated identity to a kept sequence of the same
+taxon is at least that value are not added.
+
+Sketches use one-permutation hashing: the hash of every k-mer falls into one of num_bins bins, the sketch is the
+minimum per bin (empty bins are filled from the next bin). The fraction of equal bins estimates the Jaccard
+similarity of the k-mer sets. Similar sketches are found with LSH: sketches are split into bands, sequences that
+share a band with a representative are compared to it. This keeps the number of comparisons close to linear.
+
+Note: has test, test_minhash.py
+"""
+
+import zlib
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def sketch(seq, k=16, num_bins=64):
+    """MinHash sketch of the k-mers of a sequence.
+
+    :param seq: sequence as string, gaps are removed
+    :param k: k-mer length
+    :param num_bins: length of the sketch
+    :return: tuple of num_bins ints, None if the sequence is shorter than k
+    """
+    seq = seq.replace("-", "").upper().encode("ascii")
+    if len(seq) < k:
+        return None
+    bins = [None] * num_bins
+    for i in range(len(seq) - k + 1):
+        value = zlib.crc32(seq[i:i + k]) & 0xffffffff
+        pos = value % num_bins
+        value //= num_bins
+        if bins[pos] is None or value < bins[pos]:
+            bins[pos] = value
+    # densification: empty bins take the value of the next filled bin, marked by its distance
+    for pos in range(num_bins):
+        if bins[pos] is None:
+            for dist in range(1, num_bins):
+                value = bins[(pos + dist) % num_bins]
+                if value is not None and not isinstance(value, tuple):
+                    bins[pos] = (dist, value)
+                    break
+    return tuple(bins)
+
+
+def similarity(sketch1, sketch2):
+    """estimated Jaccard similarity of the k-mer sets of two sequences"""
+    same = sum(1 for val1, val2 in zip(sketch1, sketch2) if val1 == val2)
+    return float(same) / len(sketch1)
+
+
+def identity_to_jaccard(identity, k):
+    """Jaccard similarity of the k-mer sets of two sequences of the same length with the given identity.
+
+    A mismatch changes up to k k-mers, so a fraction identity ** k of the k-mers is shared.
+    """
+    shared = identity ** k
+    return shared / (2 - shared)
+
+
+class NearIdenticalCollapser(object):
+    """Groups sequences into clusters of near-identical sequences per taxon, one representative per cluster.
+
+    Representatives are added with add_representative(), every other sequence is passed to assign() and either
+    joins the cluster of a similar representative of its taxon or becomes a representative itself.
+
+    :param identity: minimal identity (0 - 1) of two sequences in the same cluster
+    :param k: k-mer length
+    :param num_bins: length of the sketches
+    :param bands: number of LSH bands, num_bins needs to be a multiple of it
+    """
+
+    def __init__(self, identity, k=16, num_bins=64, bands=16):
+        assert 0 < identity <= 1, "identity `{}` is not between 0 and 1".format(identity)
+        assert num_bins % bands == 0
+        self.k = k
+        self.num_bins = num_bins
+        self.bands = bands
+        self.rows = num_bins // bands
+        self.min_similarity = identity_to_jaccard(identity, k)
+        self.buckets = {}  # (taxon, band, values): list of representative labels
+        self.sketches = {}  # representative label: sketch
+
+    def _band_keys(self, taxon, seq_sketch):
+        for band in range(self.bands):
+            yield (taxon, band, seq_sketch[band * self.rows:(band + 1) * self.rows])
+
+    def add_representative(self, label, taxon, seq):
+        """Adds a sequence that is kept in any case, e.g. one that is already in the alignment."""
+        seq_sketch = sketch(seq, self.k, self.num_bins)
+        if seq_sketch is None:
+            return
+        self.sketches[label] = seq_sketch
+        for key in self._band_keys(taxon, seq_sketch):
+            self.buckets.setdefault(key, []).append(label)
+
+    def assign(self, label, taxon, seq):
+        """Finds the most similar representative of the same taxon.
+
+        :param label: otu_id
+        :param taxon: taxon id, only sequences of the same taxon are collapsed
+        :param seq: sequence
+        :return: label of the representative, None if the sequence became a representative
+        """
+        seq_sketch = sketch(seq, self.k, self.num_bins)
+        if seq_sketch is None:
+            return None
+        candidates = set()
+        for key in self._band_keys(taxon, seq_sketch):
+            candidates.update(self.buckets.get(key, ()))
+        best = None
+        best_sim = self.min_similarity
+        for other in sorted(candidates):
+            sim = similarity(seq_sketch, self.sketches[other])
+            if sim >= best_sim and (best is None or sim > best_sim):
+                best = other
+                best_sim = sim
+        if best is not None:
+            debug("{} is near-identical to {} ({})".format(label, best, best_sim))
+            return best
+        self.sketches[label] = seq_sketch
+        for key in self._band_keys(taxon, seq_sketch):
+            self.buckets.setdefault(key, []).append(label)
+        return None
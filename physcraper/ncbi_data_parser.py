@@ -5,7 +5,10 @@ parts are altered from https://github.com/zyxue/ncbitax2lin/blob/master/ncbitax2
 
 import os
 import sys
-import pandas as pd
+
+from physcraper import lazy_import
+
+pd = lazy_import.module("pandas")
 
 
 _DEBUG_MK = 0
@@ -123,10 +126,13 @@ class Parser:
     The files need to be updated regularly, best way to always do it when a new blast database was loaded.
     """
 
-    def __init__(self, names_file, nodes_file):
+    def __init__(self, names_file, nodes_file, load=True):
+        """:param load: if False, the databases are read when they are first needed, e.g. after loading a checkpoint
+        """
         self.names_file = names_file
         self.nodes_file = nodes_file
-        self.initialize()
+        if load:
+            self.initialize()
 
     def initialize(self):
         """ The data itself are not stored in __init__, as then the information will be pickled (which results in
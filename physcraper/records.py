@@ -0,0 +1,312 @@
+"""Compact records for the otu_dict and gb_dict entries.
+
+Every entry of AlignTreeTax.otu_dict and AlignTreeTax.gb_dict used to be a dict with the same long keys
+('^ncbi:accession', '^physcraper:status', ...). The records here store the known keys in slots and only
+fall back to a dict for additional keys. Status and date strings, which are repeated for most of the OTUs,
+are interned. The records behave like a dict, so existing code can keep using otu_dict[otu]['^ncbi:taxon'],
+.get(), .keys(), `in`, .update() etc.
+
+Note: has test, test_records.py. Benchmark: scripts/benchmark_records.py
+"""
+
+import sys
+
+if sys.version_info < (3,):
+    from collections import MutableMapping
+else:
+    from collections.abc import MutableMapping
+
+OTU_FIELDS = ("^ncbi:gi",
+              "^ncbi:accession",
+              "^ncbi:title",
+              "^ncbi:taxon",
+              "^ot:ottId",
+              "^ot:ottTaxonName",
+              "^ot:originalLabel",
+              "^user:TaxonName",
+              "^physcraper:status",
+              "^physcraper:last_blasted",
+              "^physcraper:last_yield")
+
+HIT_FIELDS = ("^ncbi:gi",
+              "accession",
+              "title",
+              "length",
+              "staxids",
+              "sscinames",
+              "pident",
+              "evalue",
+              "bitscore",
+              "sseq",
+              "localID",
+              "^ncbi:taxon",
+              "^ot:ottId",
+              "^ot:ottTaxonName",
+              "^user:TaxonName")
+
+# values of these keys are shared by many records, e.g. 'query', 'original' or '1800/01/01'
+INTERNED_FIELDS = frozenset(["^physcraper:status", "^physcraper:last_blasted"])
+
+_STRING_POOL = {}
+
+
+class _Missing(object):
+    """Marker for slots that are not set, as None is a valid value in the otu_dict."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<missing>"
+
+    def __reduce__(self):
+        # pickled by reference, so that unpickled records share the module level marker
+        return "_MISSING"
+
+
+_MISSING = _Missing()
+
+
+def intern_value(value):
+    """Returns the shared copy of a string value. Works for str and unicode, in contrast to intern().
+
+    :param value: string
+    :return: the pooled string with the same value
+    """
+    if isinstance(value, (str, type(u""))):
+        return _STRING_POOL.setdefault(value, value)
+    return value
+
+
+def _slot_names(fields):
+    """Generates the slot names for a tuple of record keys."""
+    return tuple("_v{}".format(i) for i in range(len(fields)))
+
+
+class _Record(object):
+    """Base class of the compact records, subclasses define _fields and the corresponding __slots__.
+
+    Keys that are not part of _fields are stored in self._extra, which stays None for most records.
+    self._dirty is set when the record is created or changed, the otu_dict journal (journal.py) only writes
+    the records that are dirty.
+    """
+    __slots__ = ("_extra", "_dirty")
+    _fields = ()
+    _slot_of = {}
+
+    def __init__(self, *args, **kwargs):
+        self._extra = None
+        self._dirty = True
+        for slot in self._slot_of.values():
+            setattr(self, slot, _MISSING)
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        slot = self._slot_of.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+            if value is not _MISSING:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self._dirty = True
+        if key in INTERNED_FIELDS:
+            value = intern_value(value)
+        slot = self._slot_of.get(key)
+        if slot is not None:
+            setattr(self, slot, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        slot = self._slot_of.get(key)
+        self._dirty = True
+        if slot is not None:
+            if getattr(self, slot) is _MISSING:
+                raise KeyError(key)
+            setattr(self, slot, _MISSING)
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        slot = self._slot_of.get(key)
+        if slot is not None:
+            return getattr(self, slot) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in self._fields:
+            if getattr(self, self._slot_of[key]) is not _MISSING:
+                yield key
+        if self._extra is not None:
+            for key in list(self._extra):
+                yield key
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __eq__(self, other):
+        if isinstance(other, (_Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, dict(self.items()))
+
+    def __getstate__(self):
+        # only the values are stored, the keys are given by the position in _fields
+        values = tuple(getattr(self, self._slot_of[key]) for key in self._fields)
+        return values, self._extra
+
+    def __setstate__(self, state):
+        values, self._extra = state
+        self._dirty = True
+        for slot in self.__slots__:  # records pickled before a field was added
+            setattr(self, slot, _MISSING)
+        for key, value in zip(self._fields, values):
+            if key in INTERNED_FIELDS:
+                value = intern_value(value)
+            setattr(self, self._slot_of[key], value)
+
+    @property
+    def dirty(self):
+        """True if the record was created or changed since the last mark_clean()"""
+        return self._dirty
+
+    def mark_clean(self):
+        """Is called when the record was written to the otu_dict journal."""
+        self._dirty = False
+
+    def get(self, key, default=None):
+        """dict.get()"""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """dict.keys()"""
+        return list(iter(self))
+
+    def values(self):
+        """dict.values()"""
+        return [self[key] for key in self]
+
+    def items(self):
+        """dict.items()"""
+        return [(key, self[key]) for key in self]
+
+    def iterkeys(self):
+        """dict.iterkeys()"""
+        return iter(self)
+
+    def itervalues(self):
+        """dict.itervalues()"""
+        return (self[key] for key in self)
+
+    def iteritems(self):
+        """dict.iteritems()"""
+        return ((key, self[key]) for key in self)
+
+    def update(self, *args, **kwargs):
+        """dict.update()"""
+        if len(args) > 1:
+            raise TypeError("update expected at most 1 arguments, got {}".format(len(args)))
+        if args:
+            other = args[0]
+            if hasattr(other, "keys"):
+                for key in other.keys():
+                    self[key] = other[key]
+            else:
+                for key, value in other:
+                    self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        """dict.setdefault()"""
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        """dict.pop()"""
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def clear(self):
+        """dict.clear()"""
+        self.__init__()
+
+    def copy(self):
+        """returns a shallow copy of the same record type"""
+        return type(self)(self)
+
+    def to_dict(self):
+        """returns a plain dict, e.g. to write the record to json"""
+        return dict(self.items())
+
+
+class OtuRecord(_Record):
+    """One entry of AlignTreeTax.otu_dict. See AlignTreeTax for the meaning of the keys.
+    """
+    _fields = OTU_FIELDS
+    __slots__ = _slot_names(OTU_FIELDS)
+    _slot_of = dict(zip(OTU_FIELDS, __slots__))
+
+
+class HitRecord(_Record):
+    """One entry of AlignTreeTax.gb_dict, the information of a blast hit.
+    """
+    _fields = HIT_FIELDS
+    __slots__ = _slot_names(HIT_FIELDS)
+    _slot_of = dict(zip(HIT_FIELDS, __slots__))
+
+
+MutableMapping.register(OtuRecord)
+MutableMapping.register(HitRecord)
+
+
+def compact_otu_dict(otu_dict):
+    """Replaces the values of an otu_dict (e.g. read from json or from phylesystem) with OtuRecords.
+
+    :param otu_dict: dict with otu_id as key and a dict as value
+    :return: the same dict, now with OtuRecord values
+    """
+    for otu_id in otu_dict:
+        if not isinstance(otu_dict[otu_id], OtuRecord):
+            otu_dict[otu_id] = OtuRecord(otu_dict[otu_id])
+    return otu_dict
+
+
+def to_dict(record):
+    """Used as `default` for json.dump(), to write records as plain json objects.
+
+    :param record: OtuRecord or HitRecord
+    :return: dict
+    """
+    if isinstance(record, _Record):
+        return record.to_dict()
+    raise TypeError("{!r} is not JSON serializable".format(record))
@@ -0,0 +1,244 @@
+"""On-disk store for the sequences found during a physcraper run.
+
+PhyscraperScrape.new_seqs, new_seqs_otu_id and the FilterBlast dictionaries (sp_seq_d, filtered_seq) used to
+hold the full sequence strings in memory, often several copies of the same sequence (under the accession and
+under the otu_id). Here every sequence is written once to an append-only FASTA file (SeqFile); the dictionaries
+are replaced by SeqStore objects that only keep the position of the sequence in that file and read the sequence
+when it is accessed.
+
+Identical sequences are written only once, independent of the key under which they are stored. As the file is
+only appended to, pickled SeqStores and checkpoints (e.g. workdir/scrape_checkpoint) stay valid while the run continues.
+
+Note: has test, test_seq_store.py
+"""
+
+import os
+import sys
+import hashlib
+
+_DEBUG_MK = 0
+
+
+def debug(msg):
+    """short debugging command
+    """
+    if _DEBUG_MK == 1:
+        print(msg)
+
+
+def _to_bytes(seq):
+    """sequences are written as ascii"""
+    if isinstance(seq, bytes):
+        return seq
+    return seq.encode("ascii")
+
+
+class SeqFile(object):
+    """The append-only FASTA file that holds the sequences of one or several SeqStores.
+
+    The file handle is opened when it is needed and is not pickled.
+
+    :param path: path to the FASTA file, is created if it does not exist
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._by_digest = {}  # md5 of seq: (offset, length), used to write every sequence only once
+        self._handle = None
+        self._flushed = True
+
+    def _open(self):
+        if self._handle is None:
+            if not os.path.exists(self.path):
+                open(self.path, "wb").close()
+            self._handle = open(self.path, "r+b")
+        return self._handle
+
+    def append(self, key, seq):
+        """Writes a sequence to the end of the file, if it is not already in there.
+
+        :param key: identifier written in the FASTA header, only used to make the file readable
+        :param seq: sequence as string
+        :return: tuple of offset and length of the sequence in the file
+        """
+        seq = _to_bytes(seq)
+        digest = hashlib.md5(seq).digest()
+        pos = self._by_digest.get(digest)
+        if pos is not None:
+            return pos
+        handle = self._open()
+        handle.seek(0, os.SEEK_END)
+        handle.write(_to_bytes(">{}\n".format(key)))
+        pos = (handle.tell(), len(seq))
+        handle.write(seq + b"\n")
+        self._flushed = False
+        self._by_digest[digest] = pos
+        return pos
+
+    def read(self, pos):
+        """Reads the sequence at pos.
+
+        :param pos: tuple of offset and length as returned by append()
+        :return: sequence as string
+        """
+        handle = self._open()
+        if not self._flushed:
+            handle.flush()
+            self._flushed = True
+        handle.seek(pos[0])
+        seq = handle.read(pos[1])
+        if len(seq) != pos[1]:
+            sys.stderr.write("{} is shorter than expected, was it modified?\n".format(self.path))
+            raise IOError("Sequence at {} not found in {}".format(pos[0], self.path))
+        if str is not bytes:
+            seq = seq.decode("ascii")
+        return seq
+
+    def close(self):
+        """closes the file handle, it is reopened when needed"""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+            self._flushed = True
+
+    def __getstate__(self):
+        if self._handle is not None:
+            self._handle.flush()
+        state = self.__dict__.copy()
+        state["_handle"] = None
+        state["_flushed"] = True
+        return state
+
+    def __copy__(self):
+        # the file is shared, copies of the stores refer to the same SeqFile
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class SeqStore(object):
+    """Dictionary-like object (key: accession or otu_id, value: sequence) with the sequences kept in a SeqFile.
+
+    Only the keys and the position of the sequences are kept in memory, sequences are read from the file when
+    they are accessed.
+
+    :param seq_file: SeqFile or path to the FASTA file
+    :param seqs: optional dict of sequences to add
+    """
+
+    def __init__(self, seq_file, seqs=None):
+        if not isinstance(seq_file, SeqFile):
+            seq_file = SeqFile(seq_file)
+        self.seq_file = seq_file
+        self._index = {}
+        if seqs is not None:
+            self.update(seqs)
+
+    def view(self, seqs=None):
+        """Returns a new, empty SeqStore that writes to the same file.
+
+        :param seqs: optional dict of sequences to add
+        :return: SeqStore
+        """
+        return SeqStore(self.seq_file, seqs)
+
+    def __getitem__(self, key):
+        return self.seq_file.read(self._index[key])
+
+    def __setitem__(self, key, seq):
+        self._index[key] = self.seq_file.append(key, seq)
+
+    def __delitem__(self, key):
+        del self._index[key]
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return "SeqStore({}, {} sequences)".format(self.seq_file.path, len(self._index))
+
+    def seq_len(self, key):
+        """Length of a sequence, without reading it from file.
+
+        :param key: accession or otu_id
+        :return: int
+        """
+        return self._index[key][1]
+
+    def get(self, key, default=None):
+        """dict.get()"""
+        if key in self._index:
+            return self[key]
+        return default
+
+    def keys(self):
+        """dict.keys()"""
+        return list(self._index)
+
+    def values(self):
+        """dict.values(), reads all sequences"""
+        return [self[key] for key in self._index]
+
+    def items(self):
+        """dict.items(), reads all sequences"""
+        return [(key, self[key]) for key in self._index]
+
+    def iterkeys(self):
+        """dict.iterkeys()"""
+        return iter(self._index)
+
+    def itervalues(self):
+        """dict.itervalues(), reads one sequence at a time"""
+        return (self[key] for key in list(self._index))
+
+    def iteritems(self):
+        """dict.iteritems(), reads one sequence at a time"""
+        return ((key, self[key]) for key in list(self._index))
+
+    def update(self, other):
+        """dict.update(), positions are copied from SeqStores of the same file without reading the sequences"""
+        if isinstance(other, SeqStore) and other.seq_file is self.seq_file:
+            self._index.update(other._index)
+        else:
+            for key in other.keys():
+                self[key] = other[key]
+
+    def pop(self, key, *default):
+        """dict.pop()"""
+        if key not in self._index and default:
+            return default[0]
+        seq = self[key]
+        del self._index[key]
+        return seq
+
+    def clear(self):
+        """removes all keys, the sequences stay in the file"""
+        self._index.clear()
+
+    def copy(self):
+        """returns a SeqStore with the same keys, the sequences are not duplicated"""
+        new = self.view()
+        new._index = self._index.copy()
+        return new
+
+    def subset(self, keys):
+        """returns a SeqStore with the given keys, the sequences are not duplicated
+
+        :param keys: iterable of keys of self
+        :return: SeqStore
+        """
+        new = self.view()
+        for key in keys:
+            new._index[key] = self._index[key]
+        return new
+
+    def to_dict(self):
+        """returns a plain dict with all sequences"""
+        return dict(self.iteritems())
@@ -14,6 +14,7 @@ from physcraper import (
 from physcraper import FilterBlast, Settings, debug  # Concat
 from dendropy import DnaCharacterMatrix
 from .concat import Concat
+from . import checkpoint
 
 print("Current Wrapper Version number: 09142018.0")
 
@@ -37,6 +38,27 @@ def sync_ott(configfi):
     subprocess.call(["process_ott.sh", "".format(conf.ott_ncbi)])
 
 
+def has_checkpoint(pickle_path):
+    """True if there is a checkpoint (see checkpoint.py) or, from runs of older versions, a pickle file to continue.
+
+    :param pickle_path: path of the pickle file, e.g. workdir/scrape_checkpoint.p
+    """
+    return checkpoint.exists(checkpoint.checkpoint_path(pickle_path)) or os.path.isfile(pickle_path)
+
+
+def load_checkpoint(pickle_path, obj="scraper"):
+    """Reloads an object from the checkpoint that replaces pickle_path, or from the pickle file of older runs.
+
+    :param pickle_path: path of the pickle file, e.g. workdir/scrape_checkpoint.p
+    :param obj: "data", "ids" or "scraper", the object of the checkpoint that is returned
+    :return: the object
+    """
+    path = checkpoint.checkpoint_path(pickle_path)
+    if checkpoint.exists(path):
+        return getattr(checkpoint.Checkpoint(path), obj)
+    return pickle.load(open(pickle_path, "rb"))
+
+
 # TODO: not used
 # generates IdDicts physcrapper class
 def get_ottid(configfi, cwd):
@@ -71,9 +93,9 @@ def standard_run(study_id,
     debug("Debugging mode is on")
 
     conf = ConfigObj(configfi, interactive=False)
-    if os.path.isfile("{}/att_checkpoint.p".format(workdir)):
-        sys.stdout.write("Reloading data object from pickle file\n")
-        data_obj = pickle.load(open("{}/att_checkpoint.p".format(workdir), "rb"))
+    if has_checkpoint("{}/att_checkpoint.p".format(workdir)):
+        sys.stdout.write("Reloading data object from checkpoint\n")
+        data_obj = load_checkpoint("{}/att_checkpoint.p".format(workdir), "data")
 #        scraper.repeat = 1
     else:
         sys.stdout.write("setting up Data Object\n")
@@ -96,16 +118,16 @@ def standard_run(study_id,
         data_obj.write_files()
         data_obj.write_labelled(label="^ot:ottTaxonName")
         data_obj.write_otus("otu_info", schema="table")
-        data_obj.dump()
+        data_obj.checkpoint()
         # Mapping identifiers between OpenTree and NCBI requires and identifier dict object
-    if os.path.isfile(conf.id_pickle):
+    if has_checkpoint(conf.id_pickle):
         sys.stdout.write("Reloading id dicts from {}\n".format(conf.id_pickle))
-        ids = pickle.load(open(conf.id_pickle, "rb"))
+        ids = load_checkpoint(conf.id_pickle, "ids")
     else:
         sys.stdout.write("setting up id dictionaries\n")
         sys.stdout.flush()
         ids = IdDicts(conf, workdir=workdir)
-        ids.dump()
+        ids.checkpoint()
     # Now combine the data, the ids, and the configuration into a single physcraper scrape object
     scraper = PhyscraperScrape(data_obj, ids)
     # run the analyses
@@ -113,20 +135,21 @@ def standard_run(study_id,
         scraper.blast_subdir = shared_blast_folder
     else:
         shared_blast_folder = None
-    scraper.run_blast_wrapper(delay=14)
+    scraper.run_blast_wrapper(delay=14, max_queries=scraper.config.blast_max_queries,
+                              max_seconds=scraper.config.blast_max_seconds)
     scraper.read_blast_wrapper(blast_dir=shared_blast_folder)
-    scraper.remove_identical_seqs()
+    scraper.remove_identical_seqs(num_processes=scraper.config.num_processes)
     scraper.generate_streamed_alignment()
     while scraper.repeat == 1:
         scraper.data.write_labelled(label="^ot:ottTaxonName")
-        scraper.data.write_otus("otu_info", schema="table")
         if shared_blast_folder:
             scraper.blast_subdir = shared_blast_folder
         else:
             shared_blast_folder = None
-        scraper.run_blast_wrapper(delay=14)
+        scraper.run_blast_wrapper(delay=14, max_queries=scraper.config.blast_max_queries,
+                                  max_seconds=scraper.config.blast_max_seconds)
         scraper.read_blast_wrapper(blast_dir=shared_blast_folder)
-        scraper.remove_identical_seqs()
+        scraper.remove_identical_seqs(num_processes=scraper.config.num_processes)
         scraper.generate_streamed_alignment()
     # scraper.write_otu_info()
 
@@ -160,9 +183,9 @@ def own_data_run(seqaln,
 
     debug("Debugging mode is on")
 
-    if os.path.isfile("{}/scrape_checkpoint.p".format(workdir)):
-        sys.stdout.write("Reloading from pickled scrapefile: ATT\n")
-        scraper = pickle.load(open("{}/scrape_checkpoint.p".format(workdir), "rb"))
+    if has_checkpoint("{}/scrape_checkpoint.p".format(workdir)):
+        sys.stdout.write("Reloading from checkpoint: ATT\n")
+        scraper = load_checkpoint("{}/scrape_checkpoint.p".format(workdir))
         scraper.repeat = 1
     else:
         sys.stdout.write("setting up Data Object\n")
@@ -183,7 +206,7 @@ def own_data_run(seqaln,
         data_obj.write_files()
         data_obj.write_labelled(label="^ot:ottTaxonName")
         data_obj.write_otus("otu_info", schema="table")
-        data_obj.dump()
+        data_obj.checkpoint()
 
         sys.stdout.write("setting up ID dictionaries\n")
         sys.stdout.flush()
@@ -194,18 +217,20 @@ def own_data_run(seqaln,
         else:
             shared_blast_folder = None
         # run the analyses
-        scraper.run_blast_wrapper(delay=14)
+        scraper.run_blast_wrapper(delay=14, max_queries=scraper.config.blast_max_queries,
+                                  max_seconds=scraper.config.blast_max_seconds)
         scraper.read_blast_wrapper(blast_dir=shared_blast_folder)
-        scraper.remove_identical_seqs()
+        scraper.remove_identical_seqs(num_processes=scraper.config.num_processes)
         scraper.generate_streamed_alignment()
     while scraper.repeat == 1:
-        scraper.run_blast_wrapper(delay=14)
+        scraper.run_blast_wrapper(delay=14, max_queries=scraper.config.blast_max_queries,
+                                  max_seconds=scraper.config.blast_max_seconds)
         if shared_blast_folder:
             scraper.blast_subdir = shared_blast_folder
         else:
             shared_blast_folder = None
         scraper.read_blast_wrapper(blast_dir=shared_blast_folder)
-        scraper.remove_identical_seqs()
+        scraper.remove_identical_seqs(num_processes=scraper.config.num_processes)
         scraper.generate_streamed_alignment()
     return 1
 
@@ -227,9 +252,9 @@ def filter_OTOL(study_id,
     new analysis for as long as new seqs are found. 
     This uses the FilterBlast subclass to be able to filter the blast output."""
     debug("Debugging mode is on")
-    if os.path.isfile("{}/scrape_checkpoint.p".format(workdir)):
-        sys.stdout.write("Reloading from pickled scrapefile: scrape\n")
-        filteredScrape = pickle.load(open("{}/scrape_checkpoint.p".format(workdir), 'rb'))
+    if has_checkpoint("{}/scrape_checkpoint.p".format(workdir)):
+        sys.stdout.write("Reloading from checkpoint: scrape\n")
+        filteredScrape = load_checkpoint("{}/scrape_checkpoint.p".format(workdir))
         filteredScrape.repeat = 1   
     else:   
         sys.stdout.write("setting up Data Object\n")
@@ -249,7 +274,7 @@ def filter_OTOL(study_id,
         data_obj.write_files()
         data_obj.write_labelled(label="^ot:ottTaxonName", add_gb_id=True)
         data_obj.write_otus("otu_info", schema="table")
-        data_obj.dump()
+        data_obj.checkpoint()
 
         sys.stdout.write("setting up id dictionaries\n")
         sys.stdout.flush()
@@ -267,18 +292,20 @@ def filter_OTOL(study_id,
             sys.stdout.write("Blasting against local unpublished data")
             filteredScrape.unpublished = True
             filteredScrape.write_unpubl_blastdb(add_unpubl_seq)
-            filteredScrape.run_blast_wrapper(delay=14)
+            filteredScrape.run_blast_wrapper(delay=14, max_queries=filteredScrape.config.blast_max_queries,
+                                             max_seconds=filteredScrape.config.blast_max_seconds)
             filteredScrape.data.local_otu_json = id_to_spn_addseq_json
             filteredScrape.read_blast_wrapper()
-            filteredScrape.remove_identical_seqs()
+            filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
             filteredScrape.generate_streamed_alignment()
             filteredScrape.unpublished = False
         else:
             sys.stdout.write("BLASTing input sequences\n")
-            filteredScrape.run_blast_wrapper(delay=14)
+            filteredScrape.run_blast_wrapper(delay=14, max_queries=filteredScrape.config.blast_max_queries,
+                                             max_seconds=filteredScrape.config.blast_max_seconds)
             filteredScrape.read_blast_wrapper(blast_dir=shared_blast_folder)
-            filteredScrape.remove_identical_seqs()
-            filteredScrape.dump()
+            filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
+            filteredScrape.checkpoint()
             if threshold is not None:
                 filteredScrape.sp_dict(downtorank)
                 filteredScrape.make_sp_seq_dict()
@@ -286,14 +313,14 @@ def filter_OTOL(study_id,
                 filteredScrape.replace_new_seq()
             sys.stdout.write("calculate the phylogeny\n")
             filteredScrape.generate_streamed_alignment()
-            filteredScrape.dump()
+            filteredScrape.checkpoint()
     while filteredScrape.repeat == 1:
         filteredScrape.data.write_labelled(label="^ot:ottTaxonName", add_gb_id=True)
-        filteredScrape.data.write_otus("otu_info", schema="table")
         sys.stdout.write("BLASTing input sequences\n")
-        filteredScrape.run_blast_wrapper(delay=14)
+        filteredScrape.run_blast_wrapper(delay=14, max_queries=filteredScrape.config.blast_max_queries,
+                                         max_seconds=filteredScrape.config.blast_max_seconds)
         filteredScrape.read_blast_wrapper(blast_dir=shared_blast_folder)
-        filteredScrape.remove_identical_seqs()
+        filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
         sys.stdout.write("Filter the sequences\n")
         if threshold is not None:
             filteredScrape.sp_dict(downtorank)
@@ -303,7 +330,7 @@ def filter_OTOL(study_id,
         filteredScrape.data.prune_short(0.75)
         sys.stdout.write("calculate the phylogeny\n")
         filteredScrape.generate_streamed_alignment()
-        filteredScrape.dump()
+        filteredScrape.checkpoint()
         filteredScrape.write_otu_info(downtorank)
         return filteredScrape
 
@@ -330,9 +357,9 @@ def add_unpubl_to_backbone(seqaln,
     Backbone will not be updated
     """
     debug("Debugging mode is on")
-    if os.path.isfile("{}/scrape_checkpoint.p".format(workdir)):
-        sys.stdout.write("Reloading from pickled scrapefile: scrape\n")
-        filteredScrape = pickle.load(open("{}/scrape_checkpoint.p".format(workdir), 'rb'))
+    if has_checkpoint("{}/scrape_checkpoint.p".format(workdir)):
+        sys.stdout.write("Reloading from checkpoint: scrape\n")
+        filteredScrape = load_checkpoint("{}/scrape_checkpoint.p".format(workdir))
         filteredScrape.repeat = 1   
     else:   
         sys.stdout.write("setting up Data Object\n")
@@ -355,7 +382,7 @@ def add_unpubl_to_backbone(seqaln,
         data_obj.write_files()
         data_obj.write_labelled(label="^ot:ottTaxonName", add_gb_id=True)
         data_obj.write_otus("otu_info", schema="table")
-        data_obj.dump()
+        data_obj.checkpoint()
 
         sys.stdout.write("setting up id dictionaries\n")
         sys.stdout.flush()
@@ -376,7 +403,8 @@ def add_unpubl_to_backbone(seqaln,
             filteredScrape.backbone = True
 
             filteredScrape.write_unpubl_blastdb(add_unpubl_seq)
-            filteredScrape.run_blast_wrapper(delay=14)
+            filteredScrape.run_blast_wrapper(delay=14, max_queries=filteredScrape.config.blast_max_queries,
+                                             max_seconds=filteredScrape.config.blast_max_seconds)
 
 
 
@@ -387,7 +415,7 @@ def add_unpubl_to_backbone(seqaln,
 
 
             filteredScrape.read_blast_wrapper()
-            filteredScrape.remove_identical_seqs()
+            filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
             filteredScrape.generate_streamed_alignment()
             filteredScrape.unpublished = False
         else:
@@ -397,10 +425,11 @@ def add_unpubl_to_backbone(seqaln,
                 filteredScrape.blast_subdir = shared_blast_folder
             else:
                 shared_blast_folder = None
-            filteredScrape.run_blast_wrapper(delay=14)
+            filteredScrape.run_blast_wrapper(delay=14, max_queries=filteredScrape.config.blast_max_queries,
+                                             max_seconds=filteredScrape.config.blast_max_seconds)
             filteredScrape.read_blast_wrapper(blast_dir=shared_blast_folder)
-            filteredScrape.remove_identical_seqs()
-            filteredScrape.dump()
+            filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
+            filteredScrape.checkpoint()
             sys.stdout.write("Filter the sequences\n")
             if threshold is not None:
                 filteredScrape.sp_dict(downtorank)
@@ -409,18 +438,18 @@ def add_unpubl_to_backbone(seqaln,
                 filteredScrape.replace_new_seq()
             sys.stdout.write("Calculate the phylogeny\n")
             filteredScrape.generate_streamed_alignment()
-            filteredScrape.dump()
+            filteredScrape.checkpoint()
     while filteredScrape.repeat == 1:
         filteredScrape.data.write_labelled(label='^ot:ottTaxonName', add_gb_id=True)
-        filteredScrape.data.write_otus("otu_info", schema='table')
         sys.stdout.write("BLASTing input sequences\n")
         if shared_blast_folder:
             filteredScrape.blast_subdir = shared_blast_folder
         else:
             shared_blast_folder = None
-        filteredScrape.run_blast_wrapper(delay=14)
+        filteredScrape.run_blast_wrapper(delay=14, max_queries=filteredScrape.config.blast_max_queries,
+                                         max_seconds=filteredScrape.config.blast_max_seconds)
         filteredScrape.read_blast_wrapper(blast_dir=shared_blast_folder)
-        filteredScrape.remove_identical_seqs()
+        filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
         sys.stdout.write("Filter the sequences\n")
         if threshold is not None:
             filteredScrape.sp_dict(downtorank)
@@ -430,7 +459,7 @@ def add_unpubl_to_backbone(seqaln,
         filteredScrape.data.prune_short(0.75)
         sys.stdout.write("calculate the phylogeny\n")
         filteredScrape.generate_streamed_alignment()
-        filteredScrape.dump()
+        filteredScrape.checkpoint()
     filteredScrape.write_otu_info(downtorank)
     return filteredScrape
 
@@ -461,9 +490,9 @@ def filter_data_run(seqaln,
     # if _DEBUG_MK == 1:
     #     random.seed(3269235691)
     print(workdir)
-    if os.path.isfile("{}/scrape_checkpoint.p".format(workdir)):
-        sys.stdout.write("Reloading from pickled scrapefile: scrape\n")
-        filteredScrape = pickle.load(open("{}/scrape_checkpoint.p".format(workdir), 'rb'))
+    if has_checkpoint("{}/scrape_checkpoint.p".format(workdir)):
+        sys.stdout.write("Reloading from checkpoint: scrape\n")
+        filteredScrape = load_checkpoint("{}/scrape_checkpoint.p".format(workdir))
         filteredScrape.repeat = 1   
     else:   
         sys.stdout.write("setting up Data Object\n")
@@ -485,7 +514,7 @@ def filter_data_run(seqaln,
         data_obj.write_files()
         data_obj.write_labelled(label="^ot:ottTaxonName", add_gb_id=True)
         data_obj.write_otus("otu_info", schema="table")
-        data_obj.dump()
+        data_obj.checkpoint()
         sys.stdout.write("setting up id dictionaries\n")
         sys.stdout.flush()
         ids = IdDicts(conf, workdir=workdir, mrca=ingroup_mrca)
@@ -500,13 +529,14 @@ def filter_data_run(seqaln,
             sys.stdout.write("Blasting against local unpublished data")
             filteredScrape.unpublished = True
             filteredScrape.write_unpubl_blastdb(add_unpubl_seq)
-            filteredScrape.run_blast_wrapper(delay=14)
+            filteredScrape.run_blast_wrapper(delay=14, max_queries=filteredScrape.config.blast_max_queries,
+                                             max_seconds=filteredScrape.config.blast_max_seconds)
             print("add unpubl otu json")
             filteredScrape.data.unpubl_otu_json = id_to_spn_addseq_json
             print(filteredScrape.data.unpubl_otu_json)
 
             filteredScrape.read_blast_wrapper()
-            filteredScrape.remove_identical_seqs()
+            filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
             filteredScrape.generate_streamed_alignment()
             filteredScrape.unpublished = False
         else:
@@ -516,10 +546,11 @@ def filter_data_run(seqaln,
                 filteredScrape.blast_subdir = shared_blast_folder
             else:
                 shared_blast_folder = None
-            filteredScrape.run_blast_wrapper(delay=14)
+            filteredScrape.run_blast_wrapper(delay=14, max_queries=filteredScrape.config.blast_max_queries,
+                                             max_seconds=filteredScrape.config.blast_max_seconds)
             filteredScrape.read_blast_wrapper(blast_dir=shared_blast_folder)
-            filteredScrape.remove_identical_seqs()
-            filteredScrape.dump()
+            filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
+            filteredScrape.checkpoint()
             sys.stdout.write("Filter the sequences\n")
             if threshold is not None:
 
@@ -529,21 +560,20 @@ def filter_data_run(seqaln,
                 filteredScrape.replace_new_seq()
             sys.stdout.write("Calculate the phylogeny\n")
             filteredScrape.generate_streamed_alignment()
-            filteredScrape.data.write_otus("otu_info", schema="table")
             filteredScrape.write_otu_info(downtorank)
 
-            filteredScrape.dump()
+            filteredScrape.checkpoint()
     while filteredScrape.repeat == 1:
         filteredScrape.data.write_labelled(label="^ot:ottTaxonName", add_gb_id=True)
-        filteredScrape.data.write_otus("otu_info", schema="table")
         sys.stdout.write("BLASTing input sequences\n")
         if shared_blast_folder:
             filteredScrape.blast_subdir = shared_blast_folder
         else:
             shared_blast_folder = None
-        filteredScrape.run_blast_wrapper(delay=14)
+        filteredScrape.run_blast_wrapper(delay=14, max_queries=filteredScrape.config.blast_max_queries,
+                                         max_seconds=filteredScrape.config.blast_max_seconds)
         filteredScrape.read_blast_wrapper(blast_dir=shared_blast_folder)
-        filteredScrape.remove_identical_seqs()
+        filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
         sys.stdout.write("Filter the sequences\n")
         if threshold is not None:
             filteredScrape.sp_dict(downtorank)
@@ -553,7 +583,7 @@ def filter_data_run(seqaln,
         filteredScrape.data.prune_short(0.75)
         sys.stdout.write("calculate the phylogeny\n")
         filteredScrape.generate_streamed_alignment()
-        filteredScrape.dump()
+        filteredScrape.checkpoint()
         filteredScrape.write_otu_info(downtorank)
         # print(some)
     filteredScrape.write_otu_info(downtorank)
@@ -579,11 +609,9 @@ def run_with_settings(settings):
     new analysis for as long as new seqs are found. 
     This uses the FilterBlast subclass to be able to filter the blast output."""
     debug("Debugging mode is on")
-    if os.path.isfile("{}/scrape_checkpoint.p".format(settings.workdir)):
-        sys.stdout.write("Reloading from pickled scrapefile: scrape\n")
-        filteredScrape = pickle.load(
-            open("{}/scrape_checkpoint.p".format(settings.workdir), "rb")
-        )
+    if has_checkpoint("{}/scrape_checkpoint.p".format(settings.workdir)):
+        sys.stdout.write("Reloading from checkpoint: scrape\n")
+        filteredScrape = load_checkpoint("{}/scrape_checkpoint.p".format(settings.workdir))
         filteredScrape.repeat = 1
     else:
         conf = ConfigObj(settings.configfi)
@@ -607,7 +635,7 @@ def run_with_settings(settings):
 
         data_obj.write_labelled(label="^ot:ottTaxonName", add_gb_id=True)
         data_obj.write_otus("otu_info", schema="table")
-        data_obj.dump()
+        data_obj.checkpoint()
 
         ids = IdDicts(conf, workdir=settings.workdir)
 
@@ -621,19 +649,21 @@ def run_with_settings(settings):
         if filteredScrape.unpublished is True:  # use unpublished data
             sys.stdout.write("Blasting against local unpublished data")
             filteredScrape.write_unpubl_blastdb(settings.add_unpubl_seq)
-            filteredScrape.run_blast_wrapper(settings.delay)
+            filteredScrape.run_blast_wrapper(settings.delay, max_queries=filteredScrape.config.blast_max_queries,
+                                             max_seconds=filteredScrape.config.blast_max_seconds)
             filteredScrape.local_otu_json = settings.id_to_spn_addseq_json
             filteredScrape.read_blast_wrapper()
-            filteredScrape.remove_identical_seqs()
+            filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
             filteredScrape.generate_streamed_alignment()
             filteredScrape.unpublished = False
 
         # run the ananlyses
         if filteredScrape.unpublished is not True:
-            filteredScrape.run_blast_wrapper(settings.delay)
+            filteredScrape.run_blast_wrapper(settings.delay, max_queries=filteredScrape.config.blast_max_queries,
+                                             max_seconds=filteredScrape.config.blast_max_seconds)
             filteredScrape.read_blast_wrapper(blast_dir=settings.shared_blast_folder)
-            filteredScrape.remove_identical_seqs()
-            filteredScrape.dump()
+            filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
+            filteredScrape.checkpoint()
             if settings.threshold is not None:
                 filteredScrape.sp_dict(settings.downtorank)
                 filteredScrape.make_sp_seq_dict()
@@ -641,20 +671,20 @@ def run_with_settings(settings):
                 filteredScrape.replace_new_seq()
             debug("from replace to streamed aln")
             filteredScrape.generate_streamed_alignment()
-            filteredScrape.dump()
+            filteredScrape.checkpoint()
     while filteredScrape.repeat is 1:
         filteredScrape.data.write_labelled(label="^ot:ottTaxonName", add_gb_id=True)
-        filteredScrape.data.write_otus("otu_info", schema="table")
-        filteredScrape.run_blast_wrapper(settings.delay)
+        filteredScrape.run_blast_wrapper(settings.delay, max_queries=filteredScrape.config.blast_max_queries,
+                                         max_seconds=filteredScrape.config.blast_max_seconds)
         filteredScrape.read_blast_wrapper(blast_dir=settings.shared_blast_folder)
-        filteredScrape.remove_identical_seqs()
+        filteredScrape.remove_identical_seqs(num_processes=filteredScrape.config.num_processes)
         if settings.threshold is not None:
             filteredScrape.sp_dict(settings.downtorank)
             filteredScrape.make_sp_seq_dict()
             filteredScrape.how_many_sp_to_keep(threshold=settings.threshold, selectby=settings.selectby)
             filteredScrape.replace_new_seq()
         filteredScrape.generate_streamed_alignment()
-        filteredScrape.dump()
+        filteredScrape.checkpoint()
         filteredScrape.write_otu_info(settings.downtorank)
         return filteredScrape
 
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Compares memory use and checkpoint (pickle) size of an otu_dict made of plain dicts and one made of
+physcraper.records.OtuRecord entries.
+
+usage: python scripts/benchmark_records.py [number_of_otus]
+"""
+import sys
+import time
+import pickle
+import random
+from physcraper import records
+
+statuses = ["original", "query", "subsequence, not added", "new seq added", "not added, there are enough seq per sp in tre",
+            "added, as representative of taxon", "deleted in prune short"]
+
+
+def make_otu_dict(num_otus):
+    """generates an otu_dict that looks like the one after a blast run"""
+    random.seed(1)
+    otu_dict = {}
+    for i in range(num_otus):
+        otu_dict["otuPS{}".format(i)] = {
+            "^ncbi:gi": 429489099 + i,
+            "^ncbi:accession": "JX{}.1".format(895264 + i),
+            "^ncbi:title": "gi|{}|gb|JX{}.1| Senecio sp. {} ITS".format(429489099 + i, 895264 + i, i % 500),
+            "^ncbi:taxon": 1000 + i % 500,
+            "^ot:ottId": 2000 + i % 500,
+            "^ot:ottTaxonName": "Senecio sp. {}".format(i % 500),
+            # json/str operations generate new string objects for each entry
+            "^physcraper:status": "".join(random.choice(statuses)),
+            "^physcraper:last_blasted": "".join("1800/01/01"),
+        }
+    return otu_dict
+
+
+def deep_size(obj, seen=None):
+    """sum of sys.getsizeof of an object and all objects reachable through containers and records"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, records.OtuRecord):
+        for slot in records.OtuRecord.__slots__:
+            size += deep_size(getattr(obj, slot), seen)
+        size += deep_size(obj._extra, seen)
+    return size
+
+
+def measure(name, otu_dict):
+    """prints memory use, pickle size and pickling time"""
+    start = time.time()
+    dumped = pickle.dumps(otu_dict, 2)
+    dump_time = time.time() - start
+    start = time.time()
+    pickle.loads(dumped)
+    load_time = time.time() - start
+    sys.stdout.write("{:<12} memory {:>8.1f} MB  pickle {:>8.1f} MB  dump {:.2f}s  load {:.2f}s\n".format(
+        name, deep_size(otu_dict) / 1e6, len(dumped) / 1e6, dump_time, load_time))
+
+
+if __name__ == "__main__":
+    num_otus = 100000
+    if len(sys.argv) > 1:
+        num_otus = int(sys.argv[1])
+    sys.stdout.write("otu_dict with {} OTUs\n".format(num_otus))
+    plain = make_otu_dict(num_otus)
+    measure("dict", plain)
+    measure("OtuRecord", records.compact_otu_dict(make_otu_dict(num_otus)))
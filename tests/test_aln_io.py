@@ -0,0 +1,33 @@
+import os
+import sys
+import shutil
+from physcraper import aln_io
+
+sys.stdout.write("\ntests aln_io\n")
+
+# tests that the streaming readers return the sequences in file order, with '?' replaced
+workdir = "tests/output/test_aln_io"
+
+
+def test_read_alignment():
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    fasta = "{}/aln.fas".format(workdir)
+    with open(fasta, "w") as outfile:
+        outfile.write(">2029 doronicum\nAC?T\nAC\n\n>otu2\nA-GTN?\n")
+    assert list(aln_io.read_alignment(fasta, "fasta")) == [("2029 doronicum", "AC-TAC"), ("otu2", "A-GTN-")]
+    assert list(aln_io.read_fasta(fasta, replace=()))[0] == ("2029 doronicum", "AC?TAC")
+
+    phylip = "{}/aln.phy".format(workdir)
+    with open(phylip, "w") as outfile:
+        outfile.write("3 6\notu1 AC?TAC\notu2   A-G\nTN-\n\notu3 AAA AAA\n")
+    assert list(aln_io.read_alignment(phylip, "phylip")) == [("otu1", "AC-TAC"), ("otu2", "A-GTN-"),
+                                                             ("otu3", "AAAAAA")]
+    with open(phylip, "w") as outfile:
+        outfile.write("3 6\notu1 AC?TAC\notu2 A-GTN-\n")
+    try:
+        list(aln_io.read_phylip(phylip))
+        assert False
+    except ValueError:
+        pass
@@ -0,0 +1,52 @@
+import sys
+import random
+from physcraper import aln_matrix
+
+
+sys.stdout.write("\ntests aln_matrix\n")
+
+# tests the column and row statistics used by trim and prune_short
+
+
+def test_aln_matrix():
+    labels = ["otu1", "otu2", "otu3", "otu4"]
+    seqs = ["--ACGTAC--",
+            "??ACGTACG-",
+            "-CACGTNCG?",
+            "----GT----"]
+    matrix = aln_matrix.AlnMatrix(labels, seqs)
+    assert matrix.aligned
+    assert matrix.col_counts().tolist() == [0, 1, 3, 3, 4, 4, 3, 3, 2, 0]
+    assert matrix.row_lengths() == {"otu1": 6, "otu2": 7, "otu3": 8, "otu4": 2}
+    assert matrix.row_lengths(ignore=("-", "N")) == {"otu1": 6, "otu2": 9, "otu3": 8, "otu4": 2}
+    # at most 1 of 4 sequences may miss the first/last base
+    assert matrix.trim_bounds(0.25) == (2, 8)
+    assert matrix.trim_bounds(0.75) == (1, 9)
+    assert matrix.trim_bounds(0) == (4, 6)
+    # no column qualifies
+    assert aln_matrix.AlnMatrix(["otu1"], ["--"]).trim_bounds(0.5) == (0, 2)
+
+    unaligned = aln_matrix.AlnMatrix(labels[:2], ["ACGT", "AC"])
+    assert not unaligned.aligned
+    assert unaligned.seq_lengths == [4, 2]
+    assert unaligned.row_lengths() == {"otu1": 4, "otu2": 2}
+
+
+def test_aln_matrix_updates():
+    rnd = random.Random(5)
+    labels = ["otu{}".format(num) for num in range(12)]
+    seqs = ["".join(rnd.choice("ACGT--?") for _ in range(40)) for _ in labels]
+    matrix = aln_matrix.AlnMatrix(labels, seqs)
+    kept = dict(zip(labels, seqs))
+    for label in labels[:3] + labels[7:10]:
+        matrix.remove(label)
+        del kept[label]
+        start, stop = matrix.trim_bounds(0.5)
+        matrix.slice(start, stop)
+        kept = dict((key, seq[start:stop]) for key, seq in kept.items())
+        fresh = aln_matrix.AlnMatrix(list(kept.keys()), list(kept.values()))
+        assert matrix.num_rows() == len(kept)
+        assert matrix.col_counts().tolist() == fresh.col_counts().tolist()
+        assert matrix.row_lengths() == fresh.row_lengths()
+        assert matrix.row_lengths(ignore=("-", "N")) == fresh.row_lengths(ignore=("-", "N"))
+        assert matrix.trim_bounds(0.5) == fresh.trim_bounds(0.5)
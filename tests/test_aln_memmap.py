@@ -0,0 +1,118 @@
+import os
+import sys
+import random
+import pickle
+import shutil
+from dendropy import DnaCharacterMatrix
+from physcraper import AlignTreeTax, aln_io, aln_matrix, aln_memmap
+
+sys.stdout.write("\ntests aln_memmap\n")
+
+# tests that the memory-mapped alignment gives the same statistics as the AlnMatrix
+workdir = "tests/output/test_aln_memmap"
+
+
+def test_aln_memmap():
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    aln_memmap.CHUNK_ROWS = 4  # several chunks with few sequences
+    rnd = random.Random(7)
+    labels = ["otu{}".format(num) for num in range(10)]
+    seqs = ["".join(rnd.choice("ACGT--?N") for _ in range(30)) for _ in labels]
+    path = "{}/aln.bin".format(workdir)
+    memmap = aln_memmap.MemmapAlignment.from_seqs(path, zip(labels, seqs))
+    kept = dict(zip(labels, seqs))
+    assert memmap.aligned
+    assert memmap["otu3"] == seqs[3]
+
+    memmap.remove("otu2")
+    del kept["otu2"]
+    start, stop = memmap.trim_bounds(0.5)
+    memmap.slice(start, stop)
+    kept = dict((label, seq[start:stop]) for label, seq in kept.items())
+    # rows added after papara, more than the capacity of the file
+    for num in range(10, 1100):
+        seq = "".join(rnd.choice("ACGT-") for _ in range(stop - start))
+        memmap.append("otu{}".format(num), seq)
+        kept["otu{}".format(num)] = seq
+
+    memmap.flush()
+    for matrix in [memmap, aln_memmap.MemmapAlignment(path)]:
+        fresh = aln_matrix.AlnMatrix(list(kept.keys()), list(kept.values()))
+        assert matrix.num_rows() == len(kept)
+        assert matrix.col_counts().tolist() == fresh.col_counts().tolist()
+        assert matrix.row_lengths() == fresh.row_lengths()
+        assert matrix.row_lengths(ignore=("-", "N")) == fresh.row_lengths(ignore=("-", "N"))
+        assert matrix.trim_bounds(0.5) == fresh.trim_bounds(0.5)
+        assert dict((label, matrix[label]) for label in matrix) == kept
+
+    # a longer sequence adds columns
+    memmap.append("long", "A" * (stop - start + 5))
+    assert not memmap.aligned
+    assert memmap["otu3"] == kept["otu3"] + "-" * 5
+
+    memmap.write("{}/aln.fas".format(workdir), schema="fasta")
+    with open("{}/aln.fas".format(workdir)) as fasta:
+        lines = fasta.read().split("\n")
+    assert lines[0] == ">otu0" and lines[1] == memmap["otu0"]
+    memmap.write("{}/aln.phy".format(workdir), schema="phylip")
+    with open("{}/aln.phy".format(workdir)) as phylip:
+        assert phylip.readline() == "{} {}\n".format(len(kept) + 1, stop - start + 5)
+    aln_memmap.CHUNK_ROWS = 1024
+
+
+def make_att(workdir, seqs):
+    """AlignTreeTax of sequences seqs (dictionary label: sequence) and a tree of the same taxa"""
+    aln = DnaCharacterMatrix.from_dict(seqs)
+    labels = sorted(seqs)
+    newick = "({});".format(",".join(labels))
+    otu_dict = dict(("otu{}".format(label), {"^ot:originalLabel": label, "^physcraper:status": "original"})
+                    for label in labels)
+    return AlignTreeTax(newick, otu_dict, aln, ingroup_mrca=1, workdir=workdir)
+
+
+def test_memmap_dna_matrix():
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    rnd = random.Random(3)
+    seqs = dict(("t{}".format(num), "".join(rnd.choice("ACGT") for _ in range(40))) for num in range(12))
+    seqs["t3"] = "-" * 15 + seqs["t3"][15:]  # pruned
+    for label in seqs:  # the ends are trimmed
+        if label not in ["t1", "t3"]:
+            seqs[label] = "?" * 3 + seqs[label][3:37] + "-" * 3
+    in_memory = make_att("{}/in_memory".format(workdir), seqs)
+    in_file = make_att("{}/in_file".format(workdir), seqs)
+    in_file.use_memmap("{}/in_file/aln_memmap.bin".format(workdir))
+    assert isinstance(in_file.aln, aln_memmap.MemmapDnaMatrix)
+    assert in_file.tre.taxon_namespace is in_file.aln.taxon_namespace
+    assert in_file.aln_matrix() is in_file.aln.alignment
+
+    for data in [in_memory, in_file]:
+        data.prune_short()
+        data.remove_taxa(["otut7"])
+        data.write_papara_files()
+    assert [taxon.label for taxon in in_file.aln] == [taxon.label for taxon in in_memory.aln]
+    assert dict((taxon.label, seq.symbols_as_string()) for taxon, seq in in_file.aln.items()) == \
+        dict((taxon.label, seq.symbols_as_string()) for taxon, seq in in_memory.aln.items())
+    assert "otut3" not in in_file.aln and "otut7" not in in_file.aln
+    assert len(in_file.aln["otut1"]) == 34
+    # the papara input is written from the file, it is read as in align_query_seqs()
+    written = list(aln_io.read_alignment("{}/in_file/aln_ott.phy".format(workdir), "phylip", replace=()))
+    assert written == list(aln_io.read_alignment("{}/in_memory/aln_ott.phy".format(workdir), "phylip",
+                                                 replace=()))
+    papara = aln_memmap.MemmapDnaMatrix.from_seqs("{}/papara.bin".format(workdir), written + [("new", "A" * 10)])
+    assert papara["new"].symbols_as_string() == "A" * 10 + "-" * (len(written[0][1]) - 10)
+
+    # taxa are found by Taxon, also after relabelling
+    taxon = in_file.aln.taxon_namespace.get_taxon(label="otut1")
+    seq = in_file.aln[taxon].symbols_as_string()
+    taxon.label = "relabelled"
+    assert in_file.aln[taxon].symbols_as_string() == seq
+    taxon.label = "otut1"
+
+    copied = pickle.loads(pickle.dumps(in_file))
+    assert [(taxon.label, str(seq)) for taxon, seq in copied.aln.items()] == \
+        [(taxon.label, str(seq)) for taxon, seq in in_file.aln.items()]
+    assert copied.tre.taxon_namespace is copied.aln.taxon_namespace
@@ -0,0 +1,101 @@
+import sys
+import os
+import pickle
+from physcraper import blast_jobs, PhyscraperScrape
+
+
+sys.stdout.write("\ntests blast_jobs\n")
+
+# tests the persistent job table, that is used to resume killed blast runs
+
+workdir = "tests/output/test_blast_jobs"
+
+
+def test_blast_jobs():
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    db_path = "{}/blast_jobs.db".format(workdir)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    jobs = blast_jobs.BlastJobs(db_path)
+    done_fn = "{}/otu1.xml".format(workdir)
+    failed_fn = "{}/otu2.xml".format(workdir)
+    killed_fn = "{}/otu3.xml".format(workdir)
+    for fn in [done_fn, failed_fn, killed_fn]:
+        if os.path.exists(fn):
+            os.remove(fn)
+    assert jobs.state(done_fn) is None
+
+    jobs.start(done_fn, "otu1")
+    blast_jobs.atomic_write(done_fn, "<BlastOutput></BlastOutput>")
+    assert not os.path.exists(blast_jobs.tmp_path(done_fn))
+    jobs.finish(done_fn)
+    assert jobs.is_done(done_fn)
+
+    jobs.start(failed_fn, "otu2")
+    jobs.fail(failed_fn, IOError("connection reset"))
+    jobs.start(killed_fn, "otu3")
+    with open(blast_jobs.tmp_path(killed_fn), "w") as partial:
+        partial.write("<BlastOut")
+
+    # restart: the job table is read from the database, running jobs were interrupted
+    jobs = pickle.loads(pickle.dumps(jobs))
+    assert jobs.reset_running() == 1
+    assert jobs.state(killed_fn) == "failed"
+    assert not os.path.exists(killed_fn)
+    assert jobs.get(failed_fn)["error"] == "connection reset"
+    assert jobs.summary() == {"done": 1, "failed": 2}
+    jobs.start(failed_fn, "otu2")
+    assert jobs.get(failed_fn)["attempts"] == 2
+
+    # a modified result file is not accepted as done
+    with open(done_fn, "a") as changed:
+        changed.write("\n")
+    assert not jobs.is_done(done_fn)
+
+
+class FakeConfig(object):
+    num_threads = 1
+    hitlist_size = 10
+
+
+class FakeScraper(object):
+    """the attributes of PhyscraperScrape that run_local_blast_cmd and run_blast_job use"""
+    def __init__(self, blastdb):
+        self.blast_subdir = workdir
+        self.config = FakeConfig()
+        self.config.blastdb = blastdb
+        self.blast_jobs = blast_jobs.BlastJobs("{}/blast_jobs_failing.db".format(workdir))
+
+
+def test_failed_local_blast():
+    # a blastn that writes part of its output and exits with an error
+    bindir = os.path.abspath("{}/bin".format(workdir))
+    if not os.path.exists(bindir):
+        os.makedirs(bindir)
+    with open("{}/blastn".format(bindir), "w") as fake_blastn:
+        fake_blastn.write("#!/bin/sh\n"
+                          "while [ \"$1\" != \"-out\" ]; do shift; done\n"
+                          "echo 'gi|1|gb|AB1|' > \"$2\"\n"
+                          "exit 2\n")
+    os.chmod("{}/blastn".format(bindir), 0o755)
+    fn_path = os.path.abspath("{}/otu4_tobeblasted.txt".format(workdir))
+    for fn in [fn_path, blast_jobs.tmp_path(fn_path)]:
+        if os.path.exists(fn):
+            os.remove(fn)
+    scraper = FakeScraper(os.path.abspath(workdir) + "/")
+    run_local_blast_cmd = PhyscraperScrape.__dict__["run_local_blast_cmd"]
+    run_blast_job = PhyscraperScrape.__dict__["run_blast_job"]
+    path = os.environ["PATH"]
+    cwd = os.getcwd()
+    os.environ["PATH"] = "{}:{}".format(bindir, path)
+    try:
+        blasted = run_blast_job(scraper, "otu4", fn_path,
+                                lambda *args: run_local_blast_cmd(scraper, *args), "ACGT", "otu4", fn_path)
+    finally:
+        os.environ["PATH"] = path
+    assert os.getcwd() == cwd
+    assert not blasted
+    assert not os.path.exists(fn_path)
+    assert not os.path.exists(blast_jobs.tmp_path(fn_path))
+    assert scraper.blast_jobs.state(fn_path) == "failed"
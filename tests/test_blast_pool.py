@@ -0,0 +1,87 @@
+import sys
+import time
+import threading
+from physcraper import blast_pool
+
+if sys.version_info < (3,):
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urllib2 import urlopen
+else:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.request import urlopen
+
+
+sys.stdout.write("\ntests blast_pool\n")
+
+# tests the distribution of web blast queries over several endpoints, using local stand-in http servers
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def start_server(status):
+    """starts a http server that answers all requests with status, returns the server and its url"""
+    state = {"active": 0, "max_active": 0, "requests": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(status)
+            self.end_headers()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            with lock:
+                state["active"] += 1
+                state["requests"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            self.send_response(status)
+            self.end_headers()
+            self.wfile.write(b"hits")
+
+        def log_message(self, *args):
+            pass
+
+    server = StandInServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    server.state = state
+    return server, "http://127.0.0.1:{}/cgi-bin/blast.cgi".format(server.server_address[1])
+
+
+def search(url, query):
+    return urlopen(url, data=query.encode("ascii"), timeout=10).read()
+
+
+def test_parse_endpoints():
+    assert blast_pool.parse_endpoints("http://a/blast.cgi 4, http://b/blast.cgi") == [("http://a/blast.cgi", 4),
+                                                                                    ("http://b/blast.cgi", 1)]
+
+
+def test_blast_pool():
+    good, good_url = start_server(200)
+    bad, bad_url = start_server(500)
+    try:
+        pool = blast_pool.EndpointPool([(bad_url, 1), (good_url, 2)], health_interval=3600)
+        results = pool.map(search, [("ACGT",)] * 10)
+        assert all(error is None and result == b"hits" for result, error in results)
+        # the failing endpoint got at most one query, then it was retried on the other one
+        assert bad.state["requests"] <= 1
+        assert good.state["requests"] == 10
+        assert good.state["max_active"] <= 2
+        assert pool.endpoints[0].healthy is False
+
+        # no healthy endpoint left: error is reported per job
+        pool = blast_pool.EndpointPool([(bad_url, 1)], health_interval=3600)
+        results = pool.map(search, [("ACGT",)] * 2)
+        assert all(result is None and error is not None for result, error in results)
+    finally:
+        good.shutdown()
+        bad.shutdown()
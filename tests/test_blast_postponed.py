@@ -0,0 +1,112 @@
+import sys
+import os
+import shutil
+import datetime
+from physcraper import PhyscraperScrape, blast_jobs
+
+
+sys.stdout.write("\ntests blast_postponed\n")
+
+# tests that the OTUs that the blast budget postponed are blasted in the next rounds, before the run ends
+
+workdir = "tests/output/test_blast_postponed"
+
+
+class FakeConfig(object):
+    blast_loc = "local"
+    blast_endpoints = []
+    gb_id_filename = False
+    blast_max_queries = 1
+    blast_max_seconds = None
+
+
+class FakeTaxon(object):
+    def __init__(self, label):
+        self.label = label
+
+
+class FakeSeq(object):
+    def symbols_as_string(self):
+        return "ACGT"
+
+
+class FakeData(object):
+    def __init__(self, labels):
+        self.otu_dict = dict((label, {'^physcraper:last_blasted': "1900/01/01"}) for label in labels)
+
+    def checkpoint(self):
+        pass
+
+    def write_otus(self, filename, schema):
+        pass
+
+
+class FakeScraper(object):
+    """uses the blast and round logic of PhyscraperScrape, without alignment, tree and blast database"""
+    run_blast_wrapper = PhyscraperScrape.__dict__["run_blast_wrapper"]
+    run_blast_job = PhyscraperScrape.__dict__["run_blast_job"]
+    blast_result_done = PhyscraperScrape.__dict__["blast_result_done"]
+    generate_streamed_alignment = PhyscraperScrape.__dict__["generate_streamed_alignment"]
+
+    def __init__(self, labels, failing=()):
+        self.workdir = workdir
+        self.logfile = "{}/logfile".format(workdir)
+        self.blast_subdir = "{}/current_blast_run".format(workdir)
+        self.config = FakeConfig()
+        self.data = FakeData(labels)
+        self.blast_jobs = blast_jobs.BlastJobs("{}/blast_jobs.db".format(workdir))
+        self.unpublished = False
+        self.blacklist = []
+        self.new_seqs = {}
+        self.new_seqs_otu_id = {}
+        self.repeat = 1
+        self._blast_postponed = 0
+        self.failing = failing
+        self.bootstrapped = False
+
+    def blast_queue(self, delay=14):
+        today = str(datetime.date.today()).replace("-", "/")
+        return [{'otu_id': label, 'taxon': FakeTaxon(label), 'seq': FakeSeq()}
+                for label in sorted(self.data.otu_dict)
+                if self.data.otu_dict[label]['^physcraper:last_blasted'] != today]
+
+    def run_local_blast_cmd(self, query, taxon_label, fn_path):
+        if taxon_label in self.failing:
+            raise RuntimeError("blastn exited with status 2")
+        with open(fn_path, "w") as result:
+            result.write("")
+
+    def reset_markers(self):
+        self._blasted = 0
+
+    def calculate_bootstrap(self):
+        self.bootstrapped = True
+
+
+def run_rounds(scraper):
+    rounds = 0
+    while scraper.repeat == 1:
+        scraper.run_blast_wrapper(delay=14, max_queries=scraper.config.blast_max_queries,
+                                  max_seconds=scraper.config.blast_max_seconds)
+        # none of the searches finds a new sequence
+        scraper.generate_streamed_alignment()
+        rounds += 1
+    return rounds
+
+
+def test_blast_postponed():
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    scraper = FakeScraper(["otu1", "otu2", "otu3"])
+    assert run_rounds(scraper) == 3
+    assert scraper.bootstrapped
+    today = str(datetime.date.today()).replace("-", "/")
+    assert all(otu['^physcraper:last_blasted'] == today for otu in scraper.data.otu_dict.values())
+
+    # without a successful search, the remaining OTUs are not postponed forever
+    shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    scraper = FakeScraper(["otu1", "otu2"], failing=["otu1"])
+    assert run_rounds(scraper) == 1
+    assert scraper.bootstrapped
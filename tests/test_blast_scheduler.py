@@ -0,0 +1,22 @@
+import sys
+from physcraper import blast_scheduler
+
+
+sys.stdout.write("\ntests blast_scheduler\n")
+
+# tests if the blast queries are ordered by their expected yield
+
+
+def test_rank_queries():
+    candidates = [{"otu_id": "otu_dense", "age": 30, "last_yield": 5, "density": 10},
+                  {"otu_id": "otu_empty", "age": 30, "last_yield": 0, "density": 1},
+                  {"otu_id": "otu_rich", "age": 30, "last_yield": 5, "density": 1},
+                  {"otu_id": "otu_old", "age": 300, "last_yield": 0, "density": 1},
+                  {"otu_id": "otu_new", "age": 40000, "last_yield": None, "density": 1}]
+    ranked = [cand["otu_id"] for cand in blast_scheduler.rank_queries(candidates, delay=14)]
+    assert ranked[:2] == ["otu_new", "otu_rich"]
+    assert ranked.index("otu_old") < ranked.index("otu_empty")
+    assert ranked[-1] == "otu_dense"
+    # ties keep the alignment order
+    same = [{"otu_id": i, "age": 20, "last_yield": None, "density": 1} for i in range(5)]
+    assert [cand["otu_id"] for cand in blast_scheduler.rank_queries(same, delay=14)] == list(range(5))
@@ -0,0 +1,70 @@
+import os
+import sys
+import json
+import pickle
+import shutil
+from physcraper import ConfigObj, IdDicts, FilterBlast, checkpoint, records, seq_store
+
+sys.stdout.write("\ntests checkpoint\n")
+
+# tests that objects written as checkpoint directory are read back with the same content
+workdir = "tests/output/test_checkpoint"
+absworkdir = os.path.abspath(workdir)
+configfi = "tests/data/test.config"
+
+
+def test_encode():
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    stores = checkpoint._SeqStores()
+    store = seq_store.SeqStore("{}/seq_store.fasta".format(workdir), {"acc1": "ACGT", "acc2": "AAAA"})
+    value = {"set": set([1, 2]),
+             "tuple": ("a", 1),
+             "int_keys": {1: ["x"], 2: None},
+             "record": records.OtuRecord({"^ncbi:taxon": 5, "extra": "y"}),
+             "store": store,
+             "same_store": store}
+    encoded = json.loads(json.dumps(checkpoint.encode(value, stores)))
+    assert len(stores.stores) == 1
+    load_stores = checkpoint._SeqStores()
+    load_stores.number(seq_store.SeqStore(load_stores.seq_file(store.seq_file.path)))
+    load_stores.stores[0]._index.update(store._index)
+    decoded = checkpoint.decode(encoded, load_stores)
+    assert decoded["set"] == set([1, 2])
+    assert decoded["tuple"] == ("a", 1)
+    assert decoded["int_keys"] == {1: ["x"], 2: None}
+    assert isinstance(decoded["record"], records.OtuRecord)
+    assert decoded["record"] == value["record"]
+    assert decoded["store"] is decoded["same_store"]
+    assert decoded["store"]["acc1"] == "ACGT"
+
+
+def test_checkpoint():
+    conf = ConfigObj(configfi, interactive=False)
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    ids.acc_ncbi_dict = pickle.load(open("tests/data/precooked/tiny_acc_map.p", "rb"))
+    scraper = FilterBlast(data_obj, ids)
+    scraper.new_seqs["acc1"] = "ACGTACGT"
+    scraper.blacklist = ["acc2"]
+
+    path = "{}/scrape_checkpoint".format(absworkdir)
+    scraper.checkpoint()
+    assert checkpoint.exists(path)
+    # writing again replaces the checkpoint
+    scraper.checkpoint()
+
+    loaded = checkpoint.Checkpoint(path).scraper
+    assert isinstance(loaded, FilterBlast)
+    assert loaded.data.aln.as_string(schema="fasta") == scraper.data.aln.as_string(schema="fasta")
+    assert loaded.data.tre.as_string(schema="newick") == scraper.data.tre.as_string(schema="newick")
+    assert loaded.data.tre.taxon_namespace is loaded.data.aln.taxon_namespace
+    assert loaded.data.otu_dict == scraper.data.otu_dict
+    assert loaded.data.ott_mrca == scraper.data.ott_mrca
+    assert loaded.ids.acc_ncbi_dict == scraper.ids.acc_ncbi_dict
+    assert loaded.ids.ott_to_ncbi == scraper.ids.ott_to_ncbi
+    assert loaded.new_seqs["acc1"] == "ACGTACGT"
+    assert loaded.blacklist == ["acc2"]
+    assert loaded.repeat == scraper.repeat
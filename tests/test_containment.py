@@ -0,0 +1,139 @@
+import sys
+import pickle
+import random
+from physcraper import containment
+
+
+sys.stdout.write("\ntests containment\n")
+
+# tests that the containment index returns all sequences that contain, or are contained in, a query
+
+
+def brute_force(seqs, query):
+    """the comparisons of seq_dict_build without index"""
+    found = set()
+    for label, seq in seqs.items():
+        seq = seq.replace("-", "")
+        if len(seq) >= len(query) and seq.find(query) != -1:
+            found.add(label)
+        elif len(seq) < len(query) and query.find(seq) != -1:
+            found.add(label)
+    return found
+
+
+def test_containment():
+    rnd = random.Random(42)
+    seqs = containment.IndexedSeqDict()
+    bases = []
+    for num in range(30):
+        seq = "".join(rnd.choice("ACGT") for _ in range(rnd.randint(50, 400)))
+        bases.append(seq)
+        seqs["otu{}".format(num)] = seq
+    # sub sequences, some with gaps, and a few sequences shorter than one window
+    for num in range(30):
+        base = rnd.choice(bases)
+        start = rnd.randint(0, len(base) // 2)
+        sub = base[start:start + rnd.randint(5, len(base) - start)]
+        seqs["sub{}".format(num)] = "--" + sub[:3] + "-" + sub[3:]
+    queries = list(bases)
+    for base in bases:
+        start = rnd.randint(0, len(base) // 2)
+        queries.append(base[start:start + rnd.randint(5, len(base) - start)])
+        queries.append(rnd.choice("ACGT") * 3 + base + "TTGCA")
+    queries.append("".join(rnd.choice("ACGT") for _ in range(200)))
+    for query in queries:
+        expected = brute_force(seqs, query)
+        assert expected.issubset(seqs.candidates(query))
+
+    # index is updated when sequences are removed or replaced
+    del seqs["otu0"]
+    seqs["otu1"] = bases[2]
+    seqs.pop("sub0")
+    for query in queries:
+        assert brute_force(seqs, query).issubset(seqs.candidates(query))
+    assert "otu0" not in seqs.candidates(bases[0])
+
+    # seq_dict_build() compares the candidates in insertion order, re-inserted labels move to the end
+    seqs["otu0"] = bases[0]
+    for query in queries:
+        candidates = seqs.candidates(query)
+        in_order = seqs.in_order(candidates)
+        assert set(in_order) == candidates
+        assert in_order == sorted(candidates, key=seqs.positions.get)
+        if sys.version_info >= (3, 7):  # dicts keep the insertion order
+            assert in_order == [label for label in seqs if label in candidates]
+    assert seqs.in_order(["otu0", "otu1", "removed"]) == ["otu1", "otu0"]
+
+    # only few candidates for an unrelated sequence
+    assert len(seqs.candidates(queries[-1])) < len(seqs) / 2
+
+    copied = pickle.loads(pickle.dumps(seqs))
+    assert dict(copied) == dict(seqs)
+    assert copied.candidates(bases[3]) == seqs.candidates(bases[3])
+
+
+def test_digest_map():
+    digests = containment.DigestMap()
+    seq_dict = {"otu1": "AC-GTACGT", "otu2": "TTTT"}
+    digests.sync(seq_dict)
+    assert digests.duplicates("ACGTACGT", seq_dict) == ["otu1"]
+    assert digests.duplicates("acgtacgt", seq_dict) == []  # case sensitive, like str.find
+    assert digests.duplicates("ACGTACG", seq_dict) == []
+
+    # sequence changed by the alignment: the old digest does not match any more
+    seq_dict["otu1"] = "ACGTACGA"
+    assert digests.duplicates("ACGTACGT", seq_dict) == []
+    digests.sync(seq_dict)
+    assert digests.duplicates("ACGTACGA", seq_dict) == ["otu1"]
+
+    # removed from the alignment
+    del seq_dict["otu2"]
+    assert digests.duplicates("TTTT", seq_dict) == []
+    digests.sync(seq_dict)
+    assert "otu2" not in digests.digests
+    digests.add("otu3", "ACGTACGA")
+    seq_dict["otu3"] = "ACGTACGA"
+    assert digests.duplicates("ACGT-ACGA", seq_dict) == ["otu1", "otu3"]
+
+
+def test_same_species_copy():
+    digests = containment.DigestMap()
+    seq_dict = {"otu1": "AC-GTACGT", "otu2": "ACGTACGT", "otu3": "ACGTACGT", "otu4": "TTTT"}
+    digests.sync(seq_dict, species={"otu1": 10, "otu2": 11, "otu3": None, "otu4": 10})
+    assert digests.same_species_copy("ACGTACGT", seq_dict, 10) == "otu1"
+    assert digests.same_species_copy("ACGTACGT", seq_dict, 12) == "otu3"  # no int id: compared as same species
+    del seq_dict["otu3"]
+    assert digests.same_species_copy("ACGTACGT", seq_dict, 12) is None
+    assert digests.same_species_copy("TTTT", seq_dict, 11) is None
+
+    # only new rows and rows of a new length are hashed again
+    lengths = dict((label, containment.seq_length(seq)) for label, seq in seq_dict.items())
+    digests.sync(seq_dict, lengths)
+    hashed = []
+    add = digests.add
+    digests.add = lambda label, seq, sp_id=None, length=None: hashed.append(label) or add(label, seq, sp_id, length)
+    seq_dict["otu1"] = "--GTACGT"  # trimmed
+    seq_dict["otu5"] = "GGGG"
+    lengths = dict((label, containment.seq_length(seq)) for label, seq in seq_dict.items())
+    digests.sync(seq_dict, lengths, species={"otu1": 10, "otu2": 11, "otu4": 10, "otu5": 10})
+    assert sorted(hashed) == ["otu1", "otu5"]
+    assert digests.same_species_copy("GTACGT", seq_dict, 10) == "otu1"
+    assert digests.same_species_copy("ACGTACGT", seq_dict, 10) is None
+    assert "otu3" not in digests.species
+
+
+def test_precompute_related():
+    rnd = random.Random(7)
+    seqs = {}
+    for num in range(20):
+        seq = "".join(rnd.choice("ACGT") for _ in range(rnd.randint(100, 300)))
+        seqs[("aln", "otu{}".format(num))] = seq
+        seqs[("new", "AB{}.1".format(num))] = seq[rnd.randint(0, 20):]
+        seqs[("new", "AC{}.1".format(num))] = "-" + seq + "ACGT"
+    queries = [key for key in seqs if key[0] == "new"]
+    serial = containment.precompute_related(seqs, queries, 1)
+    parallel = containment.precompute_related(seqs, queries, 3)
+    assert serial == parallel
+    for query in queries:
+        expected = brute_force(seqs, seqs[query].replace("-", "")) - set([query])
+        assert serial[query] == expected
@@ -0,0 +1,40 @@
+import pickle
+import sys
+import os
+from physcraper import ConfigObj, PhyscraperScrape, IdDicts
+
+# tests that rejecting exact copies of a kept sequence of the same species by their digest, before the
+# containment search of seq_dict_build, keeps the same sequences as the containment search alone
+
+sys.stdout.write("\nRunning test digest_fast_path\n")
+workdir = "tests/data/tmp/owndata"
+absworkdir = os.path.abspath(workdir)
+conf = ConfigObj("tests/data/test.config", interactive=False)
+
+
+def run_remove_identical(fast_path):
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    ids.acc_ncbi_dict = pickle.load(open("tests/data/precooked/tiny_acc_map.p", "rb"))
+
+    scraper = PhyscraperScrape(data_obj, ids)
+    scraper.config.blast_loc = 'remote'
+    scraper.ids.otu_rank = {}
+    scraper.config.gifilename = False
+    scraper._blasted = 1
+    scraper.read_blast_wrapper(blast_dir="tests/data/precooked/fixed/tte_blast_files")
+    if not fast_path:
+        scraper.seq_digests.same_species_copy = lambda *args: None
+    scraper.remove_identical_seqs()
+    statuses = dict((otu, info.get('^physcraper:status')) for otu, info in scraper.data.otu_dict.items())
+    return set(scraper.new_seqs_otu_id.keys()), statuses
+
+
+def test_digest_fast_path():
+    fast_kept, fast_statuses = run_remove_identical(True)
+    kept, statuses = run_remove_identical(False)
+    assert fast_kept == kept
+    for otu, status in statuses.items():
+        # the search sets the status of the last comparison, the digest the one of the identical copy
+        assert fast_statuses[otu] == status or (fast_statuses[otu] == "subsequence, not added" and otu not in kept)
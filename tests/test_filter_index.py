@@ -0,0 +1,39 @@
+import sys
+import os
+from physcraper import ConfigObj, IdDicts, FilterBlast
+import pickle
+
+sys.stdout.write("\ntests filter index\n")
+
+# tests that the alignment rows per taxon name are the ones the loops over the alignment found
+workdir = "tests/output/test_filter_index"
+configfi = "tests/data/test.config"
+downtorank = None
+
+
+def test_filter_index():
+    absworkdir = os.path.abspath(workdir)
+    conf = ConfigObj(configfi, interactive=False)
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    ids.acc_ncbi_dict = pickle.load(open("tests/data/precooked/tiny_acc_map.p", "rb"))
+    filteredScrape = FilterBlast(data_obj, ids)
+    filteredScrape.read_blast_wrapper(blast_dir="tests/data/precooked/fixed/tte_blast_files")
+    filteredScrape.remove_identical_seqs()
+    filteredScrape.sp_dict(downtorank)
+    filteredScrape.make_sp_seq_dict()
+    index = filteredScrape._aln_name_index
+    assert index is not None
+
+    for otus in filteredScrape.sp_d.values():
+        for otu_id in otus:
+            tax_name = filteredScrape.ids.find_name(sp_dict=otu_id)
+            expected = [taxon for taxon in filteredScrape.data.aln
+                        if filteredScrape.ids.find_name(sp_dict=filteredScrape.data.otu_dict[taxon.label]) == tax_name]
+            assert filteredScrape.aln_taxa_of_name(tax_name) == expected
+    assert sum(len(taxa) for taxa in index.values()) == len(filteredScrape.data.aln)
+    # the index is built once per round
+    assert filteredScrape._aln_name_index is index
+    filteredScrape.sp_dict(downtorank)
+    assert filteredScrape._aln_name_index is None
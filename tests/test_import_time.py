@@ -0,0 +1,60 @@
+import os
+import sys
+import json
+import subprocess
+from physcraper import lazy_import
+
+sys.stdout.write("\ntests import time\n")
+
+# tests that `import physcraper` does not import the heavy dependencies.
+# The import time (after dendropy was imported) depends on the machine. By default it needs to stay below
+# DENDROPY_FACTOR times the import time of dendropy, or below DEFAULT_BUDGET seconds. The environment variable
+# PHYSCRAPER_IMPORT_BUDGET sets a budget in seconds instead, e.g. PHYSCRAPER_IMPORT_BUDGET=1.0
+HEAVY = ["peyotl", "ete2", "Bio", "pandas", "numpy"]
+DENDROPY_FACTOR = 3
+DEFAULT_BUDGET = 2.0
+
+BENCHMARK = """
+import sys, time, json
+start = time.time()
+import dendropy
+mid = time.time()
+import physcraper
+end = time.time()
+heavy = sorted(set(name.split(".")[0] for name in sys.modules) & set({heavy}))
+sys.stdout.write(json.dumps({{"dendropy": mid - start, "physcraper": end - mid, "heavy": heavy}}))
+"""
+
+
+def test_lazy_module():
+    lazy_json = lazy_import.module("json")
+    assert lazy_json.dumps([1]) == "[1]"
+    lazy_json.physcraper_test = 1
+    assert json.physcraper_test == 1
+    del json.physcraper_test
+    lazy_dumps = lazy_import.attribute("json", "dumps")
+    assert lazy_dumps({"a": 1}) == '{"a": 1}'
+
+
+def run_import():
+    """imports physcraper in a new interpreter, :return: dict of the import times and the heavy modules"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([os.getcwd()] + [path for path in [env.get("PYTHONPATH")] if path])
+    out = subprocess.check_output([sys.executable, "-c", BENCHMARK.format(heavy=repr(HEAVY))], env=env)
+    return json.loads(out.decode("ascii"))
+
+
+def test_no_heavy_imports():
+    assert run_import()["heavy"] == []
+
+
+def test_import_time():
+    timings = [run_import() for _ in range(3)]
+    physcraper_time = min(timing["physcraper"] for timing in timings)
+    budget = os.environ.get("PHYSCRAPER_IMPORT_BUDGET")
+    if budget:
+        budget = float(budget)
+    else:
+        budget = max(DENDROPY_FACTOR * min(timing["dendropy"] for timing in timings), DEFAULT_BUDGET)
+    sys.stdout.write("import physcraper: {:.3f}s, budget {:.3f}s\n".format(physcraper_time, budget))
+    assert physcraper_time < budget
@@ -0,0 +1,57 @@
+import pickle
+import sys
+import os
+from physcraper import ConfigObj, PhyscraperScrape, IdDicts
+
+# tests if blast hits outside of the ingroup are dropped while reading the local blast files
+
+sys.stdout.write("\ntests ingroup filter in read_local_blast_query\n")
+workdir = "tests/output/test_ingroup_filter"
+absworkdir = os.path.abspath(workdir)
+conf = ConfigObj("tests/data/test.config", interactive=False)
+
+
+class StubParser(object):
+    """ncbi taxonomy that knows none of the taxon ids"""
+    def __init__(self):
+        self.looked_up = []
+
+    def get_rank(self, ncbi_id):
+        return "genus"
+
+    def get_downtorank_id(self, ncbi_id, rank):
+        self.looked_up.append(ncbi_id)
+        raise IndexError(ncbi_id)
+
+
+def test_ingroup_filter():
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    scraper = PhyscraperScrape(data_obj, ids)
+    if os.path.exists("{}/blast_ingroup_rejected.csv".format(absworkdir)):
+        os.remove("{}/blast_ingroup_rejected.csv".format(absworkdir))
+    # taxon 1 is part of the ingroup, taxon 2 not; avoids loading the ncbi taxonomy
+    scraper._ingroup_cache = {1: True, 2: False}
+
+    fn_path = "{}/blast_hits.txt".format(workdir)
+    scraper.ids.ncbi_parser = StubParser()
+    with open(fn_path, "w") as fout:
+        fout.write("gi|11|gb|AB000001.1|\t1\tSenecio a\t99.0\t1e-100\t400\tACGTACGT\tSenecio a ITS\n")
+        fout.write("gi|12|gb|AB000002.1|\t2\tMus musculus\t99.0\t1e-100\t400\tACGTACGA\tMus musculus ITS\n")
+        # not in the local taxonomy: kept
+        fout.write("gi|13|gb|AB000003.1|\t3\tSenecio b\t99.0\t1e-100\t400\tACGTACGC\tSenecio b ITS\n")
+        # above the e-value threshold: no taxonomy lookup
+        fout.write("gi|14|gb|AB000004.1|\t4\tSenecio c\t99.0\t10\t40\tACGTACGG\tSenecio c ITS\n")
+    scraper.read_local_blast_query(fn_path)
+
+    assert "AB000001.1" in scraper.new_seqs
+    assert "AB000001.1" in scraper.data.gb_dict
+    assert "AB000002.1" not in scraper.new_seqs
+    assert "AB000002.1" not in scraper.data.gb_dict
+    assert "AB000003.1" in scraper.new_seqs
+    assert scraper.is_ingroup(3) is None
+    assert "AB000004.1" not in scraper.new_seqs
+    assert scraper.ids.ncbi_parser.looked_up == [3]
+    with open("{}/blast_ingroup_rejected.csv".format(absworkdir)) as rejected:
+        assert rejected.read() == "AB000002.1,2\n"
@@ -0,0 +1,53 @@
+import os
+import sys
+import shutil
+from physcraper import journal, records
+
+sys.stdout.write("\ntests journal\n")
+
+# tests that the otu_dict journal only appends the changes and reads back the same otu_dict
+workdir = "tests/output/test_journal"
+
+
+def test_journal():
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    otu_dict = records.compact_otu_dict(dict(("otu{}".format(num), {"^physcraper:status": "original",
+                                                                     "^ot:ottId": num}) for num in range(20)))
+    otu_journal = journal.OtuJournal(workdir)
+    first = otu_journal.flush(otu_dict)
+    assert first == (1, 0)
+    # nothing changed
+    assert otu_journal.flush(otu_dict) == first
+
+    otu_dict["otu3"]["^physcraper:status"] = "deleted"
+    otu_dict["otu20"] = records.OtuRecord({"^physcraper:status": "query", "^ot:ottId": 20})
+    del otu_dict["otu5"]
+    second = otu_journal.flush(otu_dict)
+    assert second[0] == 1
+    with open(os.path.join(workdir, "journal.1.jsonl")) as journal_file:
+        assert len(journal_file.readlines()) == 3
+
+    otu_dict["otu4"]["^physcraper:last_blasted"] = "2019/01/01"
+    otu_journal.flush(otu_dict)
+    loaded, loaded_journal = journal.load(workdir)
+    assert loaded == otu_dict
+    assert loaded_journal.position() == otu_journal.position()
+    # state of the second flush, e.g. as stored in a checkpoint
+    loaded, loaded_journal = journal.load(workdir, *second)
+    assert "^physcraper:last_blasted" not in loaded["otu4"]
+    assert loaded["otu3"]["^physcraper:status"] == "deleted"
+    assert "otu5" not in loaded
+
+    # continuing from the older position drops the later change
+    loaded["otu6"]["^physcraper:status"] = "deleted"
+    loaded_journal.flush(loaded)
+    assert journal.load(workdir)[0] == loaded
+
+    # many changes are written as new snapshot
+    otu_journal.pin("checkpoint", otu_journal.position())
+    for otu_id in loaded:
+        loaded[otu_id]["^physcraper:status"] = "deleted"
+    assert loaded_journal.flush(loaded) == (2, 0)
+    assert journal.load(workdir)[0] == loaded
+    assert os.path.exists(os.path.join(workdir, "snapshot.1.jsonl"))  # pinned
@@ -0,0 +1,81 @@
+import sys
+import os
+import random
+from physcraper import minhash, PhyscraperScrape, taxon_id_as_int
+
+
+sys.stdout.write("\ntests minhash\n")
+
+# tests that near-identical sequences of the same taxon are collapsed, and different ones are kept
+
+workdir = "tests/output/test_minhash"
+
+
+def mutate(rnd, seq, num):
+    seq = list(seq)
+    for pos in rnd.sample(range(len(seq)), num):
+        seq[pos] = "ACGT"["ACGT".index(seq[pos]) - 1]
+    return "".join(seq)
+
+
+def test_minhash():
+    rnd = random.Random(3)
+    base = "".join(rnd.choice("ACGT") for _ in range(800))
+    other = "".join(rnd.choice("ACGT") for _ in range(800))
+    assert minhash.similarity(minhash.sketch(base), minhash.sketch("--" + base.lower())) == 1.0
+    assert minhash.sketch("ACGT") is None
+
+    collapser = minhash.NearIdenticalCollapser(0.99)
+    collapser.add_representative("otu1", 1, base)
+    # 2 differences in 800 bp
+    assert collapser.assign("otu2", 1, mutate(rnd, base, 2)) == "otu1"
+    # same sequence, different taxon
+    assert collapser.assign("otu3", 2, mutate(rnd, base, 2)) is None
+    # 10% differences
+    assert collapser.assign("otu4", 1, mutate(rnd, base, 80)) is None
+    assert collapser.assign("otu5", 1, other) is None
+    assert collapser.assign("otu6", 1, mutate(rnd, other, 1)) == "otu5"
+    assert collapser.assign("otu7", 2, base) == "otu3"
+
+
+class FakeConfig(object):
+    near_identical = 0.99
+
+
+class FakeData(object):
+    def __init__(self, labels):
+        self.otu_dict = dict((label, {}) for label in labels)
+
+
+class FakeScraper(object):
+    """the attributes of PhyscraperScrape that collapse_near_identical uses"""
+    def __init__(self, taxon_ids):
+        self.taxon_ids = taxon_ids
+        self.config = FakeConfig()
+        self.data = FakeData(taxon_ids)
+        self.logfile = "{}/logfile".format(workdir)
+
+    def get_sp_id_of_otulabel(self, label):
+        return self.taxon_ids[label]
+
+
+def test_collapse_taxon_ids():
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    rnd = random.Random(5)
+    base = "".join(rnd.choice("ACGT") for _ in range(800))
+    seq_dict = {"aln1": base, "aln2": base}
+    taxon_ids = {"aln1": 1, "aln2": None}
+    # local blast hits store staxids as string, unknown taxa have no id
+    new = {"str1": ("1", 1), "str2": ("1;2", 2), "str3": ("2;1", 3), "none1": (None, 4), "none2": (None, 5),
+           "name": ("Senecio", 6)}
+    for label, (taxon_id, num) in new.items():
+        seq_dict[label] = mutate(rnd, base, num)
+        taxon_ids[label] = taxon_id
+    collapse_near_identical = PhyscraperScrape.__dict__["collapse_near_identical"]
+    scraper = FakeScraper(taxon_ids)
+    assert collapse_near_identical(scraper, seq_dict, new.keys()) == 2
+    assert sorted(seq_dict.keys()) == ["aln1", "aln2", "name", "none1", "none2", "str3"]
+    assert scraper.data.otu_dict["str1"]['^physcraper:status'] == "not added, near-identical to aln1"
+    assert taxon_id_as_int(" 12 ;3") == 12
+    assert taxon_id_as_int(True) is None
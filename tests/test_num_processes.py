@@ -0,0 +1,36 @@
+import pickle
+import sys
+import os
+from physcraper import ConfigObj, PhyscraperScrape, IdDicts
+
+# tests that remove_identical_seqs gives the same result if the comparisons are computed in several processes
+
+sys.stdout.write("\nRunning test num_processes\n")
+workdir = "tests/data/tmp/owndata"
+absworkdir = os.path.abspath(workdir)
+conf = ConfigObj("tests/data/test.config", interactive=False)
+
+
+def run_remove_identical(num_processes):
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    ids.acc_ncbi_dict = pickle.load(open("tests/data/precooked/tiny_acc_map.p", "rb"))
+
+    scraper = PhyscraperScrape(data_obj, ids)
+    scraper.config.blast_loc = 'remote'
+    scraper.config.num_processes = num_processes
+    scraper.ids.otu_rank = {}
+    scraper.config.gifilename = False
+    scraper._blasted = 1
+    scraper.read_blast_wrapper(blast_dir="tests/data/precooked/fixed/tte_blast_files")
+    # as in the wrappers
+    scraper.remove_identical_seqs(num_processes=scraper.config.num_processes)
+    statuses = dict((otu, info.get('^physcraper:status')) for otu, info in scraper.data.otu_dict.items())
+    return sorted(scraper.new_seqs_otu_id.keys()), statuses, sorted(scraper._to_be_pruned)
+
+
+def test_num_processes():
+    single = run_remove_identical(1)
+    assert len(single[0]) > 0
+    assert run_remove_identical(3) == single
@@ -0,0 +1,63 @@
+import pickle
+import sys
+import os
+import shutil
+from physcraper import ConfigObj, PhyscraperScrape, IdDicts, records, seq_store
+
+# tests that objects pickled by older physcraper versions, without the newer attributes, can still be used
+
+sys.stdout.write("\ntests loading old pickles\n")
+workdir = "tests/output/test_old_pickle"
+absworkdir = os.path.abspath(workdir)
+conf = ConfigObj("tests/data/test.config", interactive=False)
+
+NEW_CONFIG = ["near_identical", "num_processes", "aln_memmap", "blast_endpoints", "blast_max_queries",
+              "blast_max_seconds"]
+NEW_ATT = ["_aln_matrix", "aln_memmap", "_label_index", "_otu_journal"]
+NEW_SCRAPE = ["_to_be_pruned", "_ingroup_cache", "_ingroup_rejected", "_sp_id_cache", "seq_digests",
+              "seq_file", "blast_jobs", "unpubl_blast_fn", "_blast_postponed"]
+
+
+def test_old_pickle():
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    ids.acc_ncbi_dict = pickle.load(open("tests/data/precooked/tiny_acc_map.p", "rb"))
+    scraper = PhyscraperScrape(data_obj, ids)
+    scraper.config.blast_loc = 'remote'
+    scraper.ids.otu_rank = {}
+    scraper._blasted = 1
+    scraper.read_blast_wrapper(blast_dir="tests/data/precooked/fixed/tte_blast_files")
+    num_new_seqs = len(scraper.new_seqs)
+
+    # the state of an older version: no new attributes, plain dicts as sequence stores and otu_dict entries
+    for attr in NEW_CONFIG:
+        del scraper.config.__dict__[attr]
+    for attr in NEW_ATT:
+        del scraper.data.__dict__[attr]
+    for otu_id in scraper.data.otu_dict:
+        scraper.data.otu_dict[otu_id] = dict(scraper.data.otu_dict[otu_id].items())
+    for attr in NEW_SCRAPE:
+        del scraper.__dict__[attr]
+    scraper.new_seqs = dict(scraper.new_seqs.items())
+    scraper.new_seqs_otu_id = {}
+    shutil.rmtree(absworkdir)
+
+    loaded = pickle.loads(pickle.dumps(scraper))
+    for attr in NEW_CONFIG:
+        assert hasattr(loaded.config, attr)
+    assert loaded.config.near_identical is None
+    assert loaded.config.num_processes is None
+    for attr in NEW_ATT:
+        assert hasattr(loaded.data, attr)
+    assert all(isinstance(entry, records.OtuRecord) for entry in loaded.data.otu_dict.values())
+    for attr in NEW_SCRAPE:
+        assert hasattr(loaded, attr)
+    assert isinstance(loaded.new_seqs, seq_store.SeqStore)
+    assert len(loaded.new_seqs) == num_new_seqs
+
+    # resuming the run
+    loaded.remove_identical_seqs()
+    assert len(loaded.new_seqs_otu_id) > 0
@@ -0,0 +1,45 @@
+import sys
+import os
+from Bio.Blast import NCBIXML
+from physcraper import blast_parser
+
+
+sys.stdout.write("\ntests iter_blast_xml_hits\n")
+
+# tests if the streaming xml reader returns the same information as Bio.Blast.NCBIXML
+
+fn_path = "tests/data/precooked/fixed/tte_blast_files/otuSlopezii.xml"
+workdir = "tests/output/test_read_blast_xml"
+
+
+def test_read_blast_xml():
+    hits = list(blast_parser.iter_blast_xml_hits(fn_path))
+
+    expected = []
+    for record in NCBIXML.parse(open(fn_path)):
+        for alignment in record.alignments:
+            best = min(alignment.hsps, key=lambda hsp: (hsp.expect, -hsp.bits))
+            expected.append({"title": alignment.title, "accession": alignment.accession,
+                             "length": alignment.length, "evalue": best.expect, "sseq": best.sbjct})
+    assert len(hits) == len(expected) == 10
+    for hit, exp in zip(hits, expected):
+        for key in exp:
+            assert hit[key] == exp[key]
+        assert hit["^ncbi:gi"] == exp["title"].split("|")[1]
+        assert "hsps" not in hit
+
+
+def test_read_truncated_blast_xml():
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    truncated = "{}/truncated.xml".format(workdir)
+    with open(fn_path) as fin:
+        content = fin.read()
+    with open(truncated, "w") as fout:
+        fout.write(content[:len(content) // 2])
+    try:
+        list(blast_parser.iter_blast_xml_hits(truncated))
+        readable = True
+    except SyntaxError:
+        readable = False
+    assert readable is False
@@ -0,0 +1,39 @@
+import pickle
+import sys
+import os
+from physcraper import ConfigObj, PhyscraperScrape, IdDicts
+
+# tests if the batched tabular blast output of the unpublished sequences is read per query
+
+sys.stdout.write("\ntests read_unpublished_blast_query\n")
+workdir = "tests/output/test_read_unpublished_blast"
+absworkdir = os.path.abspath(workdir)
+conf = ConfigObj("tests/data/test.config", interactive=False)
+
+
+def test_read_unpublished_blast():
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    scraper = PhyscraperScrape(data_obj, ids)
+    scraper.unpublished = True
+    scraper.data.unpubl_otu_json = {"otu1": {"^ncbi:taxon": None, "^ot:ottTaxonName": "Senecio lopezii",
+                                             "^user:TaxonName": "Senecio_lopezii"},
+                                    "otu2": {"^ncbi:taxon": None, "^ot:ottTaxonName": "Senecio vulgaris",
+                                             "^user:TaxonName": "Senecio_vulgaris"}}
+    query1, query2 = list(scraper.data.otu_dict.keys())[:2]
+    if not os.path.exists("{}/blast".format(absworkdir)):
+        os.makedirs("{}/blast".format(absworkdir))
+    with open("{}/blast/{}".format(absworkdir, scraper.unpubl_blast_fn), "w") as fout:
+        fout.write("{}\tgnl|BL_ORD_ID|0\t1\t1e-100\t400\tACGT-ACGT\n".format(query1))
+        fout.write("{}\tgnl|BL_ORD_ID|1\t2\t1e-50\t300\tACGTTT\n".format(query1))
+        fout.write("{}\tgnl|BL_ORD_ID|0\t1\t1e-90\t350\tACG\n".format(query2))
+        fout.write("{}\tgnl|BL_ORD_ID|1\t2\t1\t10\tAC\n".format(query2))
+    scraper.read_unpublished_blast_query()
+
+    assert sorted(scraper.new_seqs.keys()) == ["unpubl_1", "unpubl_2"]
+    assert scraper.new_seqs["unpubl_1"] == "ACGTACGT"
+    assert scraper.data.gb_dict["unpubl_2"]["title"] == "unpublished"
+    assert scraper.data.gb_dict["unpubl_2"]["^ot:ottTaxonName"] == "Senecio vulgaris"
+    assert scraper.data.otu_dict[query1]["^physcraper:last_yield"] == 2
+    assert scraper.data.otu_dict[query2]["^physcraper:last_yield"] == 0
@@ -0,0 +1,49 @@
+import sys
+import json
+import pickle
+from copy import deepcopy
+from physcraper import records
+
+
+sys.stdout.write("\ntests records\n")
+
+# tests if the compact records can be used like the otu_dict entries (dicts) they replace
+
+otu_entry = {"^ncbi:taxon": None,
+             "^ot:ottTaxonName": "Senecio lopezii",
+             "^ot:ottId": 1058514,
+             "^ot:originalLabel": "S_lopezii",
+             "^user:TaxonName": "Senecio_lopezii",
+             "^physcraper:status": "original",
+             "^physcraper:last_blasted": "1900/01/01",
+             "^ot:treebaseOTUId": "Tl12345"}
+
+
+def test_records():
+    otu_dict = records.compact_otu_dict({"otuSlopezii": dict(otu_entry)})
+    rec = otu_dict["otuSlopezii"]
+    assert isinstance(rec, records.OtuRecord)
+    assert rec == otu_entry
+    assert "^ncbi:taxon" in rec and rec["^ncbi:taxon"] is None
+    assert "^ncbi:accession" not in rec
+    assert rec.get("^ncbi:accession") is None
+    assert rec.get("^ot:treebaseOTUId") == "Tl12345"
+    assert set(rec.keys()) == set(otu_entry.keys())
+    try:
+        rec["^ncbi:accession"]
+        raised = False
+    except KeyError:
+        raised = True
+    assert raised
+
+    rec["^physcraper:status"] = "deleted in prune short"
+    other = records.OtuRecord(rec)
+    assert other["^physcraper:status"] is rec["^physcraper:status"]  # interned
+
+    assert pickle.loads(pickle.dumps(otu_dict)) == otu_dict
+    assert deepcopy(otu_dict) == otu_dict
+    assert json.loads(json.dumps(otu_dict, default=records.to_dict))["otuSlopezii"] == rec
+
+    hit = records.HitRecord({"accession": "JX895264.1", "title": "unpublished"})
+    hit.update({"^ot:ottId": 1058514})
+    assert sorted(hit.keys()) == ["^ot:ottId", "accession", "title"]
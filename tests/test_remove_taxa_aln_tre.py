@@ -38,4 +38,30 @@ def test_remove_taxa_aln_tre():
     assert len_tre_before != len_tre_after
     assert namespace_before != namespace_after
     assert namespace_tre_before != namespace_tre_after
-   
\ No newline at end of file
+   
+
+def test_remove_taxa():
+    conf = ConfigObj(configfi, interactive=False)
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    filteredScrape = FilterBlast(data_obj, ids)
+
+    aln_labels = [tax.label for tax in filteredScrape.data.aln.taxon_namespace]
+    labels = aln_labels[:3]
+    not_in_aln = [otu for otu in filteredScrape.data.otu_dict if otu not in aln_labels]
+    namespace_before = len(filteredScrape.data.aln.taxon_namespace)
+    leaves_before = len(filteredScrape.data.tre.leaf_nodes())
+
+    filteredScrape.data.remove_taxa(labels + labels[:1], status="deleted in test")
+
+    assert len(filteredScrape.data.aln.taxon_namespace) == namespace_before - 3
+    assert len(filteredScrape.data.tre.leaf_nodes()) == leaves_before - 3
+    remaining = set(tax.label for tax in filteredScrape.data.aln)
+    for label in labels:
+        assert label not in remaining
+        assert filteredScrape.data.otu_dict[label]['^physcraper:status'] == "deleted in test"
+    if not_in_aln:
+        filteredScrape.data.remove_taxa(not_in_aln[:1])
+        assert filteredScrape.data.otu_dict[not_in_aln[0]]['^physcraper:status'] == \
+            "deleted, updated otu_dict but was never in tre or aln!"
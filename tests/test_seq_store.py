@@ -0,0 +1,49 @@
+import sys
+import os
+import pickle
+from copy import deepcopy
+from physcraper import seq_store
+
+
+sys.stdout.write("\ntests seq_store\n")
+
+# tests if the on-disk sequence store can be used like the sequence dictionaries it replaces
+
+workdir = "tests/output/test_seq_store"
+
+
+def test_seq_store():
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+    fn = "{}/seq_store.fasta".format(workdir)
+    if os.path.exists(fn):
+        os.remove(fn)
+    new_seqs = seq_store.SeqStore(fn)
+    new_seqs["JX895264.1"] = "ACGTACGTTT"
+    new_seqs["JX895265.1"] = "ACGTAAAA"
+    assert new_seqs["JX895264.1"] == "ACGTACGTTT"
+    assert "JX895265.1" in new_seqs and "JX0" not in new_seqs
+    assert len(new_seqs) == 2
+    assert new_seqs.seq_len("JX895265.1") == 8
+
+    # same sequence under the otu_id is not written a second time
+    size = os.path.getsize(fn)
+    new_seqs_otu_id = new_seqs.view({"otuPS1": "ACGTACGTTT"})
+    assert os.path.getsize(fn) == size
+    assert new_seqs_otu_id["otuPS1"] == new_seqs["JX895264.1"]
+    assert len(new_seqs_otu_id) == 1
+
+    sub = new_seqs.subset(["JX895265.1"])
+    assert sub.keys() == ["JX895265.1"]
+    new_seqs.clear()
+    assert len(new_seqs) == 0
+    assert sub["JX895265.1"] == "ACGTAAAA"
+
+    # checkpoints keep the positions, the file handle is reopened
+    loaded = pickle.loads(pickle.dumps(new_seqs_otu_id))
+    assert loaded.to_dict() == {"otuPS1": "ACGTACGTTT"}
+    copied = deepcopy(sub)
+    assert copied.seq_file is sub.seq_file
+    copied["JX895266.1"] = "TTTT"
+    assert "JX895266.1" not in sub
+    assert copied["JX895266.1"] == "TTTT"
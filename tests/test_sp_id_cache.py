@@ -0,0 +1,58 @@
+import pickle
+import sys
+import os
+from physcraper import ConfigObj, PhyscraperScrape, IdDicts
+
+# tests that the ncbi ids of the otus are resolved once and again after their taxonomy changed
+
+sys.stdout.write("\ntests sp id cache\n")
+workdir = "tests/output/test_sp_id_cache"
+absworkdir = os.path.abspath(workdir)
+conf = ConfigObj("tests/data/test.config", interactive=False)
+
+
+def test_sp_id_cache():
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    scraper = PhyscraperScrape(data_obj, ids)
+
+    calls = []
+
+    def resolve(label):
+        calls.append(label)
+        return len(calls)
+
+    scraper._resolve_sp_id = resolve
+    labels = list(scraper.data.otu_dict.keys())[:3]
+    for label in labels:
+        scraper.data.otu_dict[label]["^ot:ottTaxonName"] = "Senecio vulgaris"
+        scraper.data.otu_dict[label]["^ncbi:taxon"] = 1
+
+    # labels with the same taxonomy are resolved once
+    scraper.resolve_sp_ids(labels)
+    assert calls == [labels[0]]
+    assert scraper.get_sp_id_of_otulabel(labels[2]) == 1
+    assert len(calls) == 1
+
+    # changed taxonomy is resolved again
+    scraper.data.otu_dict[labels[1]]["^ncbi:taxon"] = 2
+    assert scraper.get_sp_id_of_otulabel(labels[1]) == 2
+    assert scraper.get_sp_id_of_otulabel(labels[1]) == 2
+    assert calls == [labels[0], labels[1]]
+
+    # resolving an accession fills in the name and ncbi id, as find_name() does, the label is not resolved again
+    def resolve_acc(label):
+        calls.append(label)
+        scraper.data.otu_dict[label]["^ot:ottTaxonName"] = "Senecio lautus"
+        scraper.data.otu_dict[label]["^ncbi:taxon"] = 3
+        return 3
+
+    scraper._resolve_sp_id = resolve_acc
+    acc_label = list(scraper.data.otu_dict.keys())[3]
+    for key in ["^ot:ottTaxonName", "^user:TaxonName", "^ncbi:taxon", "^ot:ottId"]:
+        scraper.data.otu_dict[acc_label].pop(key, None)
+    scraper.data.otu_dict[acc_label]["^ncbi:accession"] = "KX000001"
+    scraper.resolve_sp_ids([acc_label])
+    assert scraper.get_sp_id_of_otulabel(acc_label) == 3
+    assert calls == [labels[0], labels[1], acc_label]
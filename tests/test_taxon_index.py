@@ -0,0 +1,48 @@
+import pickle
+import sys
+import os
+from physcraper import ConfigObj, PhyscraperScrape, IdDicts
+
+# tests the label index of the taxon namespace of aln and tre
+
+sys.stdout.write("\ntests taxon index\n")
+workdir = "tests/output/test_taxon_index"
+absworkdir = os.path.abspath(workdir)
+conf = ConfigObj("tests/data/test.config", interactive=False)
+
+
+def test_taxon_index():
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    scraper = PhyscraperScrape(data_obj, ids)
+
+    labels = [tax.label for tax in scraper.data.aln.taxon_namespace]
+    index = scraper.data.taxa_by_label()
+    assert sorted(index.keys()) == sorted(labels)
+    assert scraper.data.get_taxon(labels[0]) is scraper.data.aln.taxon_namespace.get_taxon(labels[0])
+    assert scraper.data.has_taxon(labels[0])
+    assert not scraper.data.has_taxon("not_a_label")
+
+    # index follows removals and relabelling
+    scraper.data.remove_taxa(labels[:2])
+    assert scraper.data.get_taxon(labels[0]) is None
+    assert len(scraper.data.taxa_by_label()) == len(labels) - 2
+    tax = scraper.data.get_taxon(labels[2])
+    tax.label = "renamed"
+    assert scraper.data.get_taxon(labels[2]) is None
+    assert scraper.data.get_taxon("renamed") is tax
+    tax.label = labels[2]
+
+    # a relabelled taxon is found by its new label once the index was invalidated
+    scraper.data.taxa_by_label()
+    tax.label = "renamed_again"
+    scraper.data.invalidate_label_index()
+    assert scraper.data.get_taxon("renamed_again") is tax
+    tax.label = labels[2]
+    scraper.data.invalidate_label_index()
+    # write_labelled() relabels the taxa in place and restores them
+    scraper.data.taxa_by_label()
+    scraper.data.write_labelled(label="^ot:ottTaxonName", add_gb_id=True)
+    assert scraper.data.get_taxon(labels[2]) is tax
+    assert sorted(scraper.data.taxa_by_label().keys()) == sorted(labels[2:])
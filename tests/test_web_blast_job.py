@@ -0,0 +1,59 @@
+import sys
+import os
+import pickle
+import shutil
+from io import StringIO
+import physcraper
+from physcraper import ConfigObj, IdDicts, PhyscraperScrape, blast_parser
+
+sys.stdout.write("\ntests web blast job\n")
+
+# tests that a web blast search is recorded as done and its xml file is read, with a stubbed qblast
+workdir = "tests/output/test_web_blast_job"
+absworkdir = os.path.abspath(workdir)
+configfi = "tests/data/test.config"
+blast_xml = "tests/data/precooked/fixed/tte_blast_files/otuSlopezii.xml"
+
+
+class StubAWSWWW(object):
+    """returns a precooked blast result instead of asking ncbi"""
+    def __init__(self):
+        self.queries = []
+
+    def qblast(self, program, database, query, **kwargs):
+        self.queries.append(query)
+        with open(blast_xml) as infile:
+            return StringIO(u"{}".format(infile.read()))
+
+
+def test_web_blast_job():
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    conf = ConfigObj(configfi, interactive=False)
+    data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+    data_obj.workdir = absworkdir
+    ids = IdDicts(conf, workdir=data_obj.workdir)
+    ids.acc_ncbi_dict = pickle.load(open("tests/data/precooked/tiny_acc_map.p", "rb"))
+    scraper = PhyscraperScrape(data_obj, ids)
+    os.makedirs(scraper.blast_subdir)
+
+    taxon, seq = next(iter(scraper.data.aln.items()))
+    fn_path = "{}/{}.xml".format(scraper.blast_subdir, taxon.label)
+    query = seq.symbols_as_string().replace("-", "").replace("?", "")
+    stub = StubAWSWWW()
+    awswww = physcraper.AWSWWW
+    physcraper.AWSWWW = stub
+    try:
+        assert scraper.run_blast_job(taxon.label, fn_path, scraper.run_web_blast_query,
+                                     query, "txid1[orgn]", fn_path)
+    finally:
+        physcraper.AWSWWW = awswww
+    assert stub.queries == [query]
+    assert scraper.blast_jobs.state(fn_path) == "done"
+    assert scraper.blast_result_done(fn_path)
+
+    scraper.read_webbased_blast_query(fn_path)
+    for hit in blast_parser.iter_blast_xml_hits(blast_xml):
+        if hit["evalue"] < float(scraper.config.e_value_thresh):
+            assert hit["title"].split("|")[3] in scraper.data.gb_dict
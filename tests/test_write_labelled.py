@@ -36,4 +36,23 @@ def test_write_labelled():
 	h = filecmp.cmp(alnpath_ottid, expected_aln_path_ottid)
 
 	count = 0
-	assert a*b*c*d*e*f*g*h == 1
\ No newline at end of file
+	assert a*b*c*d*e*f*g*h == 1
+
+def test_write_labelled_unique():
+	data_obj = pickle.load(open("tests/data/precooked/tiny_dataobj.p", 'rb'))
+	labels_before = [tax.label for tax in data_obj.aln.taxon_namespace]
+	for otu in data_obj.otu_dict:
+		data_obj.otu_dict[otu]['^ot:ottTaxonName'] = "same name"
+		data_obj.otu_dict[otu]['^ncbi:accession'] = "same_acc"
+
+	treepath = 'tests/data/tmp/labelled_unique.tre'
+	alnpath = "tests/data/tmp/labelled_unique.fas"
+	data_obj.write_labelled(label='^ot:ottTaxonName', treepath=treepath, alnpath=alnpath, add_gb_id=True)
+
+	# original labels are restored
+	assert [tax.label for tax in data_obj.aln.taxon_namespace] == labels_before
+	with open(alnpath) as fasta:
+		written = [line.strip()[1:] for line in fasta if line.startswith(">")]
+	assert len(written) == len(set(written)) == len(labels_before)
+	assert "same_name_same_acc" in written
+	assert "same_name_same_acc_3" in written